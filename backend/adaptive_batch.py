@@ -0,0 +1,166 @@
+"""
+Artisan AI - OOM-Adaptive Batch Sizing
+Keeps batches as large as the device allows without crashing when prompt lengths
+or resolutions vary.
+
+A batch that runs out of memory is split in half and each half retried; a single
+item that still does not fit fails on its own. Every OOM lowers the remembered
+safe batch size for its size bucket (multiplicative decrease); full batches that
+succeed at the limit earn a probe one larger (additive increase), sooner if free
+device memory has grown since the OOM.
+
+Size keys are (family, size) tuples, e.g. ("text", 4096) for padded sequence
+length or ("image", 1048576) for pixels. A bucket seen for the first time starts
+no higher than the limit learned for any smaller bucket of the same family.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+PROBE_AFTER = 8        # full batches at the limit before trying one more
+COOLDOWN_S = 60.0      # probe anyway after this long without an OOM
+FREED_FRACTION = 0.1   # of total memory freed since the OOM that allows an early probe
+
+
+def is_oom(e: BaseException) -> bool:
+    if type(e).__name__ == "OutOfMemoryError":
+        return True
+    message = str(e).lower()
+    return "out of memory" in message or "cuda_error_out_of_memory" in message
+
+
+def release_memory():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+def cuda_memory() -> Optional[Tuple[int, int]]:
+    """(free, total) bytes on the current CUDA device, or None without one."""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return torch.cuda.mem_get_info()
+    except (ImportError, RuntimeError):
+        pass
+    return None
+
+
+def pow2_bucket(n: int) -> int:
+    return 1 << max(0, int(n) - 1).bit_length()
+
+
+class _Bucket:
+    __slots__ = ("limit", "clean", "oom_at", "free_at_oom", "ooms", "probes")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.clean = 0
+        self.oom_at: Optional[float] = None
+        self.free_at_oom: Optional[int] = None
+        self.ooms = 0
+        self.probes = 0
+
+
+class BatchSizeLimiter:
+    def __init__(self, max_batch: int, probe_after: int = PROBE_AFTER, cooldown_s: float = COOLDOWN_S,
+                 memory: Callable[[], Optional[Tuple[int, int]]] = cuda_memory):
+        self.max_batch = max_batch
+        self.probe_after = probe_after
+        self.cooldown_s = cooldown_s
+        self.memory = memory
+        self._buckets: Dict[Hashable, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: Hashable) -> _Bucket:
+        b = self._buckets.get(key)
+        if b is None:
+            start = self.max_batch
+            if isinstance(key, tuple) and len(key) == 2:
+                family, size = key
+                start = min([start] + [v.limit for (f, s), v in self._tuple_buckets() if f == family and s <= size])
+            b = self._buckets[key] = _Bucket(start)
+        return b
+
+    def _tuple_buckets(self):
+        return [(k, v) for k, v in self._buckets.items() if isinstance(k, tuple) and len(k) == 2]
+
+    def _memory_freed(self, b: _Bucket) -> bool:
+        if b.free_at_oom is None:
+            return False
+        mem = self.memory()
+        return mem is not None and mem[0] - b.free_at_oom > FREED_FRACTION * mem[1]
+
+    def limit(self, key: Hashable) -> int:
+        """Largest batch to attempt for this size bucket right now."""
+        with self._lock:
+            b = self._bucket(key)
+            if b.limit < self.max_batch and b.clean >= self.probe_after:
+                cooled = b.oom_at is None or time.monotonic() - b.oom_at >= self.cooldown_s
+                if cooled or self._memory_freed(b):
+                    b.limit += 1
+                    b.clean = 0
+                    b.probes += 1
+            return b.limit
+
+    def record_success(self, key: Hashable, size: int):
+        with self._lock:
+            b = self._bucket(key)
+            if size >= b.limit:
+                b.clean += 1
+
+    def record_oom(self, key: Hashable, size: int):
+        with self._lock:
+            b = self._bucket(key)
+            b.limit = max(1, min(b.limit, size // 2))
+            b.clean = 0
+            b.ooms += 1
+            b.oom_at = time.monotonic()
+            mem = self.memory()
+            b.free_at_oom = mem[0] if mem else None
+            # Larger inputs of the same family cannot be safe at a bigger batch
+            if isinstance(key, tuple) and len(key) == 2:
+                for (f, s), other in self._tuple_buckets():
+                    if f == key[0] and s > key[1]:
+                        other.limit = min(other.limit, b.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                str(k): {"limit": b.limit, "ooms": b.ooms, "probes": b.probes}
+                for k, b in sorted(self._buckets.items(), key=lambda kv: str(kv[0]))
+            }
+
+
+def run_splitting(run_batch: Callable[[List[Any]], List[Any]], items: List[Any], limiter: BatchSizeLimiter,
+                  size_key: Callable[[Sequence[Any]], Hashable], fail: Callable[[BaseException], Any]) -> List[Any]:
+    """
+    Run `items` in chunks no larger than the learned limit; on OOM split the batch
+    in half and retry. Returns one result per item, `fail(e)` for items that do
+    not fit even alone. Errors other than OOM propagate.
+    """
+    key = size_key(items)
+    cap = limiter.limit(key)
+    if len(items) > cap:
+        out: List[Any] = []
+        for start in range(0, len(items), cap):
+            out += run_splitting(run_batch, items[start:start + cap], limiter, size_key, fail)
+        return out
+    try:
+        results = run_batch(items)
+    except Exception as e:
+        if not is_oom(e):
+            raise
+        limiter.record_oom(key, len(items))
+        release_memory()
+        if len(items) == 1:
+            return [fail(e)]
+        mid = len(items) // 2
+        return (run_splitting(run_batch, items[:mid], limiter, size_key, fail)
+                + run_splitting(run_batch, items[mid:], limiter, size_key, fail))
+    limiter.record_success(key, len(items))
+    return results
@@ -3,9 +3,11 @@ Artisan AI - Industrial Agentic Backend 2.0
 Orchestrating 16 specialized agents for standard-shattering publishing.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, FileResponse
+from pydantic import BaseModel, Field, ValidationError
+import asyncio
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
 from diffusers import DiffusionPipeline
@@ -13,7 +15,32 @@ import base64
 from io import BytesIO
 import os
 import json
+import random
+import time
+import uuid
 from typing import Optional, List, Dict, Any
+from scheduler import FairScheduler, RateLimitExceeded, PRIORITY_INTERACTIVE, PRIORITY_BULK, estimate_prompt_tokens
+from adaptive_batch import pow2_bucket
+from chapter_cache import ChapterCache
+from preflight import run_preflight
+from pypdf.errors import PdfReadError
+from export_pipeline import EXPORT_DIR, ExportJob, export_path, sweep
+from kdp_rules import VALID_TRIM_SIZES
+from lineart import process_many as line_art_pages
+from image_index import ProjectImageIndex, dedupe
+from project_store import ProjectStore
+from royalty_grid import estimate as estimate_royalties
+import puzzles
+from niche_index import NicheIndex
+from semantic_cache import SemanticCache
+from lora import LoRABank, resolve_adapter, strip_persona
+from load_control import LoadController, LoadShed, request_level, LEVELS, NORMAL, APPROXIMATE, APPROXIMATE_SLACK
+from cost_model import CostModel, AdmissionController, CostRejected, request_estimates, request_share
+from tokenization import TokenService
+from profiling import ADMIN_TOKEN, admin_router, profiler
+from sim_engine import TimingLog
+from traffic import TrafficRecorder, count_output
+from tenancy import ANONYMOUS, get_tenant
 
 # Initialize FastAPI
 app = FastAPI(
@@ -34,6 +61,7 @@ app.add_middleware(
 # Model storage
 text_model = None
 text_tokenizer = None
+lora_bank = None
 image_model = None
 
 # --- MODELS ---
@@ -44,6 +72,7 @@ class AgentRequest(BaseModel):
 class NicheRequest(BaseModel):
     niche: str
     platforms: List[str] = ["amazon"]
+    narrate: bool = True
 
 class SEORequest(BaseModel):
     topic: str
@@ -52,64 +81,458 @@ class SEORequest(BaseModel):
 class ContentRequest(BaseModel):
     genre: str
     topic: str
-    chapters: Optional[int] = 10
-    target_words: Optional[int] = 10000
+    chapters: Optional[int] = Field(10, ge=1)
+    target_words: Optional[int] = Field(10000, ge=100)
+
+class EstimateRequest(BaseModel):
+    agent: str
+    payload: Dict[str, Any] = {}
+
+class BatchItem(BaseModel):
+    agent: str
+    payload: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=32)
+
+def validated(model, req: Dict[str, Any]):
+    """Parse a loose JSON body into `model`, as a 400 rather than a 500 when it does not fit."""
+    try:
+        return model(**req)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'body'}: {err['msg']}" for err in e.errors())
+        raise HTTPException(status_code=400, detail=problems)
 
 # --- CORE ENGINE ---
+# With ARTISAN_TIMING_LOG set, every model call is logged for fitting the simulator (sim_engine.py)
+timing_log = TimingLog()
+
 def load_text_model():
-    global text_model, text_tokenizer
+    global text_model, text_tokenizer, lora_bank
     if text_model is None:
+        loading = time.monotonic()
         model_name = "meta-llama/Llama-3-8B-Instruct"
         text_tokenizer = AutoTokenizer.from_pretrained(model_name)
         text_model = AutoModelForCausalLM.from_pretrained(
             model_name, torch_dtype=torch.float16, device_map="auto"
         )
+        lora_bank = LoRABank(text_model)
+        timing_log.write("cold", seconds=time.monotonic() - loading)
     return text_model, text_tokenizer
 
-def generate_ai_text(prompt: str, max_tokens: int = 4000):
+def generate_ai_text(prompt: str, max_tokens: int = 4000, adapter: Optional[str] = None):
     model, tokenizer = load_text_model()
     formatted = f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{prompt}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
-    inputs = tokenizer(formatted, return_tensors="pt").to(model.device)
-    with torch.no_grad():
-        outputs = model.generate(**inputs, max_new_tokens=max_tokens, temperature=0.7)
-    return tokenizer.decode(outputs[0], skip_special_tokens=True).split("assistant")[-1].strip()
+    with profiler.phase("tokenize"):
+        inputs = tokenizer(formatted, return_tensors="pt").to(model.device)
+    started = time.monotonic()
+    with torch.no_grad(), lora_bank.activate([adapter]), profiler.generation() as traced:
+        outputs = model.generate(**inputs, max_new_tokens=max_tokens, temperature=0.7, **traced)
+    load.observe_decode(time.monotonic() - started, outputs.shape[1] - inputs["input_ids"].shape[1])
+    timing_log.write("text", seconds=time.monotonic() - started, batch=1, prompt_tokens=inputs["input_ids"].shape[1],
+                     new_tokens=outputs.shape[1] - inputs["input_ids"].shape[1])
+    with profiler.phase("detokenize"):
+        return tokenizer.decode(outputs[0], skip_special_tokens=True).split("assistant")[-1].strip()
+
+def generate_ai_text_batch(prompts: List[str], max_tokens: int = 4000,
+                           adapters: Optional[List[Optional[str]]] = None) -> List[str]:
+    """Run several prompts, each with its own LoRA adapter (or None), through one padded model.generate call."""
+    adapters = adapters or [None] * len(prompts)
+    if len(prompts) == 1:
+        return [generate_ai_text(prompts[0], max_tokens, adapters[0])]
+    model, tokenizer = load_text_model()
+    chunks = lora_bank.plan(adapters)
+    if len(chunks) > 1:
+        results: List[str] = [""] * len(prompts)
+        for rows in chunks:
+            texts = generate_ai_text_batch([prompts[i] for i in rows], max_tokens, [adapters[i] for i in rows])
+            for i, text in zip(rows, texts):
+                results[i] = text
+        return results
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    formatted = [
+        f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{p}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
+        for p in prompts
+    ]
+    with profiler.phase("tokenize"):
+        inputs = tokenizer(formatted, return_tensors="pt", padding=True, add_special_tokens=False).to(model.device)
+    started = time.monotonic()
+    with torch.no_grad(), lora_bank.activate(adapters), profiler.generation() as traced:
+        outputs = model.generate(
+            **inputs, max_new_tokens=max_tokens, temperature=0.7, pad_token_id=tokenizer.pad_token_id, **traced
+        )
+    load.observe_decode(time.monotonic() - started, outputs.shape[1] - inputs["input_ids"].shape[1])
+    timing_log.write("text", seconds=time.monotonic() - started, batch=len(prompts),
+                     prompt_tokens=inputs["input_ids"].shape[1], new_tokens=outputs.shape[1] - inputs["input_ids"].shape[1])
+    new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+    with profiler.phase("detokenize"):
+        return [t.strip() for t in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+def load_image_model():
+    global image_model
+    if image_model is None:
+        image_model = DiffusionPipeline.from_pretrained(
+            "black-forest-labs/FLUX.1-schnell", torch_dtype=torch.bfloat16
+        ).to("cuda" if torch.cuda.is_available() else "cpu")
+    return image_model
+
+def generate_ai_images(prompts: List[str], width: int = 1024, height: int = 1024, steps: int = 4):
+    """Render several prompts in one pipeline call, returning PIL images."""
+    pipe = load_image_model()
+    started = time.monotonic()
+    with profiler.phase("diffusion"):
+        images = pipe(
+            prompt=list(prompts), width=width, height=height, num_inference_steps=steps, guidance_scale=0.0
+        ).images
+    timing_log.write("image", seconds=time.monotonic() - started, batch=len(prompts), width=width, height=height,
+                     steps=steps)
+    return images
+
+# --- SCHEDULER ---
+# Every LLM-backed agent goes through the fair scheduler so a long manuscript job
+# from one tenant cannot starve short interactive calls from everyone else.
+# Jobs queued together in the same class are dispatched as one padded batch, even
+# when they use different LoRA adapters. A batch that runs out of memory is split and
+# retried, and the batch size that fits is learned per padded sequence length.
+def run_text_jobs(jobs) -> List[str]:
+    texts = generate_ai_text_batch(
+        [job.prompt for job in jobs], max(job.max_tokens for job in jobs), [job.meta.get("adapter") for job in jobs]
+    )
+    prose = [(job, text) for job, text in zip(jobs, texts) if job.meta.get("words")]
+    if prose:
+        tokens.observe([text for _, text in prose], [job.meta.get("genre") for job, _ in prose],
+                       [job.max_tokens for job, _ in prose])
+    for job, n in zip(jobs, tokens.count_many(texts)):
+        cost_model.observe_output(job.meta.get("agent"), n)
+        if timing_log.path:
+            timing_log.write("output", agent=job.meta.get("agent"), tokens=n)
+    return texts
+
+scheduler = FairScheduler(
+    run_text_jobs,
+    max_batch=int(os.getenv("ARTISAN_MAX_BATCH", "16")),
+    size_key=lambda jobs: ("text", pow2_bucket(
+        max(estimate_prompt_tokens(job.prompt) for job in jobs) + max(job.max_tokens for job in jobs)
+    )),
+)
+
+# --- LOAD CONTROL ---
+# Under a spike, budgets shrink level by level (see load_control.py) rather than
+# every request queueing at full size. The level is fixed when a request arrives.
+load = LoadController(scheduler.queue_depth)
+
+# Every generation is costed before it runs (see cost_model.py) and admitted,
+# queued or rejected against the admitted backlog and the tenant's GPU budget.
+# Token counts are cached and word targets budgeted from learned ratios (see tokenization.py).
+tokens = TokenService()
+cost_model = CostModel(tokens=tokens)
+admission = AdmissionController(cost_model, parallelism=scheduler.max_batch, tenant_weight=scheduler.weight)
+
+# Anonymised traffic shape for replay (see traffic.py); off unless ARTISAN_TRAFFIC_LOG is set
+traffic = TrafficRecorder()
+
+# Admin-only profiling (see profiling.py); the endpoints exist only with ARTISAN_ADMIN_TOKEN set
+if ADMIN_TOKEN:
+    app.include_router(admin_router())
+
+@app.middleware("http")
+async def load_level_header(request: Request, call_next):
+    level = load.level
+    request_level.set(level)
+    estimates: List[Dict[str, Any]] = []
+    request_estimates.set(estimates)
+    recording = await traffic.begin(request)
+    trace = profiler.claim(request.url.path)
+    with profiler.running(trace):
+        response = await call_next(request)
+    if recording is not None:
+        traffic.finish(recording, response)
+    if trace is not None:
+        response.headers["X-Profile-Id"] = trace.id
+    response.headers["X-Load-Level"] = str(level)
+    response.headers["X-Load-Mode"] = LEVELS[level]
+    if estimates:
+        response.headers["X-Cost-Estimate"] = json.dumps({
+            "gpu_seconds": round(sum(e["gpu_seconds"] for e in estimates), 2),
+            "tflops": round(sum(e["tflops"] for e in estimates), 2),
+            "decision": "queue" if any(e["decision"] == "queue" for e in estimates) else "admit",
+        })
+    return response
+
+def cost_error(e: CostRejected) -> HTTPException:
+    headers = {"Retry-After": str(max(1, int(e.retry_after + 0.999)))} if e.retry_after else None
+    return HTTPException(status_code=e.status, detail=e.detail(), headers=headers)
+
+def admit(bulk: bool = False) -> int:
+    """Level for this request; raises 503 with Retry-After when it is being shed."""
+    level = request_level.get()
+    try:
+        load.admit(level, bulk)
+    except LoadShed as e:
+        raise HTTPException(
+            status_code=503, detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
+    return level
+
+async def run_agent(prompt: str, tenant: str, priority: str = PRIORITY_INTERACTIVE, max_tokens: int = 4000,
+                    agent: Optional[str] = None, genre: Optional[str] = None, words: Optional[int] = None,
+                    trim: bool = True):
+    """
+    Queue a prompt. When an adapter exists for the agent (or agent + genre), the persona line is dropped.
+    With `words`, the output is prose of that length: max_tokens is budgeted from the genre's learned
+    words-to-tokens ratio, and the output refines it.
+    A default max_tokens is trimmed to what fits one call. With `words`, or trim=False for a budget the
+    caller sized explicitly, a request that does not fit is a 413 with max_fitting instead.
+    """
+    level = admit(bulk=priority == PRIORITY_BULK)
+    if words:
+        max_tokens = tokens.budget(words, genre)
+    adapter = resolve_adapter(agent, genre) if agent else None
+    if adapter:
+        prompt = strip_persona(prompt)
+    max_tokens = load.max_tokens(max_tokens, level)
+    # Charged for what the agent usually generates; a word budget is already that estimate
+    expected = max_tokens if words else cost_model.expected_tokens(agent, max_tokens)
+    # Tokenizing happens off the event loop (the tokenizer loads on first use)
+    loop = asyncio.get_running_loop()
+    with profiler.phase("cost-estimate"):
+        estimate = await loop.run_in_executor(None, cost_model.text, prompt, max_tokens, expected)
+        limit = cost_model.text_limit(estimate)
+        if trim and not words and max_tokens > limit:
+            max_tokens = limit
+            estimate = await loop.run_in_executor(None, cost_model.text, prompt, max_tokens, min(expected, limit))
+    started = time.monotonic()
+    try:
+        with admission.admit(tenant, estimate, request_share.get()), profiler.phase("queue+generate"):
+            res = await scheduler.submit(prompt, tenant=tenant, priority=priority, max_tokens=max_tokens,
+                                         meta={"adapter": adapter, "agent": agent, "genre": genre, "words": words})
+    except CostRejected as e:
+        raise cost_error(e)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Token rate limit exceeded for tenant '{e.tenant}'",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
+    if priority == PRIORITY_INTERACTIVE:
+        load.observe_latency(time.monotonic() - started)
+    count_output(res)
+    return res
 
 # --- AGENT ENDPOINTS ---
 
+niche_index = NicheIndex()
+NARRATION_TOKENS = 300
+
 @app.post("/api/niche-analysis")
-async def agent_niche_radar(req: NicheRequest):
-    prompt = f"As 'NICHE RADAR AGENT', analyze market for '{req.niche}' on {req.platforms}. Return JSON with velocity, competition (Low/Med/High), profitPotential, and sentiment."
-    res = generate_ai_text(prompt)
-    return {"success": True, "agent": "Niche Radar", "data": res}
+async def agent_niche_radar(req: NicheRequest, tenant: str = Depends(get_tenant)):
+    """Metrics come from the local niche index; the LLM only narrates them."""
+    loop = asyncio.get_running_loop()
+    metrics = await loop.run_in_executor(None, niche_index.lookup, req.niche, req.platforms)
+    if metrics is None:
+        return {"success": True, "agent": "Niche Radar", "data": None, "grounded": False,
+                "message": f"No catalog or keyword data matches '{req.niche}'."}
+    narrative = None
+    # Under heavy load the computed metrics alone are the approximate answer
+    if req.narrate and request_level.get() < APPROXIMATE:
+        prompt = (
+            f"As 'NICHE RADAR AGENT', explain these computed market metrics for '{req.niche}' to a self-publisher "
+            f"in 3-4 sentences. Use only these numbers and do not invent new ones.\n{json.dumps(metrics)}"
+        )
+        narrative = await run_agent(prompt, tenant, max_tokens=NARRATION_TOKENS, agent="niche-analysis")
+    return {"success": True, "agent": "Niche Radar", "data": metrics, "narrative": narrative, "grounded": True}
 
 @app.post("/api/amazon-seo")
-async def agent_amazon_seo(req: SEORequest):
+async def agent_amazon_seo(req: SEORequest, tenant: str = Depends(get_tenant)):
     prompt = f"As 'SEO ARCHITECT', create KDP-optimized title, 7 bullets, and description for '{req.topic}' in '{req.genre}'."
-    res = generate_ai_text(prompt)
+    res = await run_agent(prompt, tenant, agent="amazon-seo", genre=req.genre)
     return {"success": True, "agent": "SEO Architect", "data": res}
 
+semantic_cache = SemanticCache()
+
+async def run_agent_cached(agent: str, namespace: str, query: str, prompt: str, tenant: str) -> Dict[str, Any]:
+    """Reuse the answer to a semantically equivalent earlier query, else generate and remember it."""
+    loop = asyncio.get_running_loop()
+    slack = APPROXIMATE_SLACK if request_level.get() >= APPROXIMATE else 0.0
+    res, similarity, vec = await loop.run_in_executor(None, semantic_cache.get, agent, namespace, query, slack)
+    if res is not None:
+        return {"data": res, "cached": True, "similarity": round(similarity, 4)}
+    res = await run_agent(prompt, tenant, agent=agent)
+    # Answers cut short under load are not kept, or one spike would serve them for the whole TTL
+    if request_level.get() == NORMAL:
+        semantic_cache.put(agent, namespace, vec, res)
+    return {"data": res, "cached": False}
+
 @app.post("/api/brand-intel")
-async def agent_brand_intel(req: Dict[str, Any]):
+async def agent_brand_intel(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
     prompt = f"As 'BRAND LEAD', analyze positioning for {req.get('brand')} in {req.get('niche')}. Provide SWOT and strategy."
-    res = generate_ai_text(prompt)
-    return {"success": True, "agent": "Brand Lead", "data": res}
+    # Brand strategy is tenant-specific, so brand-intel answers are never shared across tenants
+    res = await run_agent_cached("brand-intel", f"brand-intel:{tenant}", f"{req.get('brand')} in {req.get('niche')}", prompt, tenant)
+    return {"success": True, "agent": "Brand Lead", **res}
 
 @app.post("/api/trend-analysis")
-async def agent_trend_intel(req: Dict[str, Any]):
+async def agent_trend_intel(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
     prompt = f"As 'TREND AGENT', scan for 2026 publishing trends in {req.get('query')}. Provide velocity scores."
-    res = generate_ai_text(prompt)
-    return {"success": True, "agent": "Trend Intelligence", "data": res}
+    res = await run_agent_cached("trend-analysis", "trend-analysis", str(req.get("query")), prompt, tenant)
+    return {"success": True, "agent": "Trend Intelligence", **res}
+
+# Words of plan per chapter of manuscript architecture, so the token ask grows with the book.
+# The manuscript's own target_words is split across chapters in the plan, not written here.
+KDP_PLAN_WORDS_PER_CHAPTER = 200
+
+def kdp_prompt(req: ContentRequest) -> str:
+    return (f"As 'LAB AGENT', architect a {req.chapters}-chapter, {req.target_words}-word manuscript for "
+            f"'{req.topic}' ({req.genre}). For each chapter give its title, its share of the word count and "
+            f"about {KDP_PLAN_WORDS_PER_CHAPTER} words of plan.")
+
+def kdp_tokens(req: ContentRequest) -> int:
+    return tokens.budget(req.chapters * KDP_PLAN_WORDS_PER_CHAPTER, req.genre)
+
+def kdp_fitting(detail: Any, genre: Optional[str]):
+    """Add the largest chapter count that fits to a 413 detail's max_fitting."""
+    if isinstance(detail, dict) and (detail.get("max_fitting") or {}).get("new_tokens") is not None:
+        words = tokens.words_for(detail["max_fitting"]["new_tokens"], genre)
+        detail["max_fitting"]["chapters"] = words // KDP_PLAN_WORDS_PER_CHAPTER
 
 @app.post("/api/kdp-generate")
-async def agent_kdp_lab(req: ContentRequest):
-    prompt = f"As 'LAB AGENT', architect a {req.chapters}-chapter manuscript for '{req.topic}' ({req.genre})."
-    res = generate_ai_text(prompt, max_tokens=4000)
+async def agent_kdp_lab(req: ContentRequest, tenant: str = Depends(get_tenant)):
+    try:
+        # The budget follows the chapter count, so a plan that does not fit is a 413, never truncated
+        res = await run_agent(kdp_prompt(req), tenant, PRIORITY_BULK, max_tokens=kdp_tokens(req),
+                              agent="kdp-generate", genre=req.genre, trim=False)
+    except HTTPException as e:
+        if e.status_code == 413:
+            kdp_fitting(e.detail, req.genre)
+        raise
     return {"success": True, "agent": "KDP Book Lab", "data": res}
 
+MAX_COLORING_PAGES = 100
+
+class ColoringRequest(BaseModel):
+    theme: str = Field("animals", max_length=200)
+    pages: int = Field(1, ge=1, le=MAX_COLORING_PAGES)
+    format: str = "png"
+    trim_size: Optional[str] = None
+    audience: str = Field("kids", max_length=100)
+    project_id: Optional[str] = None
+image_index = ProjectImageIndex()
+DEDUP_RETRIES = int(os.getenv("ARTISAN_DEDUP_RETRIES", "2"))
+COLORING_BATCH = int(os.getenv("ARTISAN_COLORING_BATCH", "4"))
+
 @app.post("/api/coloring-generate")
-async def agent_coloring_gen(req: Dict[str, Any]):
-    # Placeholder for actual image generation loop
-    return {"success": True, "agent": "Coloring Gen", "message": f"Generating {req.get('pages')} pages for {req.get('theme')}."}
+async def agent_coloring_gen(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    """Generate coloring pages and convert each to print-ready line art (1-bit PNG or SVG)."""
+    p = validated(ColoringRequest, req)
+    theme, pages, fmt, audience = p.theme or "animals", p.pages, p.format, p.audience
+    if fmt not in ("png", "svg"):
+        raise HTTPException(status_code=400, detail="format must be png or svg")
+    trim = VALID_TRIM_SIZES.get(p.trim_size or "", VALID_TRIM_SIZES['8.5" x 11" (Letter)'])
+    width, height, steps = load.image_params(1024, 1024, 4, admit(bulk=True))
+    prompts = [
+        f"Coloring book page for {audience}, {theme}, scene {i + 1} of {pages}, clean bold black outlines "
+        f"on a white background, no shading, no grey, no colour fill"
+        for i in range(pages)
+    ]
+
+    project_id = p.project_id
+    loop = asyncio.get_running_loop()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    results: List[Dict[str, Any]] = []
+    dedupe_info: List[Dict[str, Any]] = []
+    pending = None
+    try:
+        with admission.admit(tenant, cost_model.image(width, height, steps, pages)):
+            # Pipeline the GPU and CPU stages: render batch n+1 while batch n is post-processed
+            for start in range(0, pages, COLORING_BATCH):
+                batch_prompts = prompts[start:start + COLORING_BATCH]
+                images = await loop.run_in_executor(None, generate_ai_images, batch_prompts, width, height, steps)
+                if project_id:
+                    regenerate = lambda positions, attempt, bp=batch_prompts: generate_ai_images(
+                        [f"{bp[i]}, alternative composition #{attempt}" for i in positions], width, height, steps
+                    )
+                    dedupe_info += await loop.run_in_executor(
+                        None, dedupe, image_index, f"{tenant}:{project_id}", images, lambda img: img, regenerate,
+                        DEDUP_RETRIES
+                    )
+                if pending is not None:
+                    results += await pending
+                pending = loop.run_in_executor(None, lambda imgs=images: line_art_pages(imgs, fmt, trim))
+            results += await pending
+    except CostRejected as e:
+        raise cost_error(e)
+
+    files = []
+    for number, page in enumerate(results, start=1):
+        file_id = f"{uuid.uuid4().hex}.{page['format']}"
+        with open(os.path.join(EXPORT_DIR, file_id), "wb") as f:
+            f.write(page["data"])
+        files.append({
+            "page": number, "file_id": file_id, "url": f"/api/export/files/{file_id}",
+            "format": page["format"], "bytes": len(page["data"]), "dpi": page["dpi"],
+            **(dedupe_info[number - 1] if dedupe_info else {}),
+        })
+    return {"success": True, "agent": "Coloring Gen", "theme": theme, "pages": files}
+
+MAX_PUZZLE_WORDS = 500
+
+class PuzzleRequest(BaseModel):
+    type: str = "sudoku"
+    difficulty: str = "MEDIUM"
+    count: int = Field(1, ge=1, le=puzzles.MAX_PUZZLES)
+    seed: Optional[int] = Field(None, ge=0, lt=2 ** 63)
+    include_solution: bool = True
+    words: List[str] = Field([], max_length=MAX_PUZZLE_WORDS)
+    size: int = Field(15, ge=8, le=30)
+    words_per_puzzle: Optional[int] = Field(None, ge=1, le=MAX_PUZZLE_WORDS)
+
+@app.post("/api/puzzle-generate")
+async def agent_puzzle_engine(req: Dict[str, Any]):
+    """Stream a puzzle book as NDJSON: a meta line, one line per puzzle (with SVG), then a summary."""
+    p = validated(PuzzleRequest, req)
+    kind, difficulty, count = p.type, p.difficulty.upper(), p.count
+    if kind not in puzzles.PUZZLE_TYPES:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(puzzles.PUZZLE_TYPES)}")
+    if difficulty not in puzzles.SUDOKU_DIFFICULTIES:
+        raise HTTPException(status_code=400, detail=f"Unknown difficulty '{difficulty}'")
+    spec = {
+        "type": kind,
+        "difficulty": difficulty,
+        "seed": p.seed if p.seed is not None else random.getrandbits(31),
+        "include_solution": p.include_solution,
+    }
+    if kind == "word-search":
+        spec["words"] = p.words
+        spec["size"] = p.size
+        spec["words_per_puzzle"] = p.words_per_puzzle
+        if not spec["words"]:
+            raise HTTPException(status_code=400, detail="words are required for word-search")
+
+    loop = asyncio.get_running_loop()
+    pool = puzzles.get_pool()
+    futures = [loop.run_in_executor(pool, puzzles.generate_batch, spec, b) for b in puzzles.batches(count)]
+
+    async def stream():
+        started, cpu_s = time.perf_counter(), 0.0
+        yield json.dumps({"type": "meta", "puzzleType": kind, "difficulty": difficulty, "count": count, "seed": spec["seed"]}) + "\n"
+        try:
+            for done in asyncio.as_completed(futures):
+                for puzzle in await done:
+                    cpu_s += puzzle.pop("cpu_s")
+                    yield json.dumps(puzzle) + "\n"
+        finally:
+            for future in futures:
+                future.cancel()
+        yield json.dumps({
+            "type": "summary",
+            "count": count,
+            "elapsed_s": round(time.perf_counter() - started, 3),
+            "puzzles_per_second_per_core": round(count / cpu_s, 1) if cpu_s else None,
+        }) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 @app.post("/api/pod-generate")
 async def agent_pod_designer(req: Dict[str, Any]):
@@ -119,16 +542,58 @@ async def agent_pod_designer(req: Dict[str, Any]):
 async def agent_cover_artist(req: Dict[str, Any]):
     return {"success": True, "agent": "Cover Artist", "data": f"Creating cover for {req.get('title')}."}
 
+chapter_cache = ChapterCache()
+
+class ChapterRequest(BaseModel):
+    target_words: Optional[int] = Field(None, ge=1)
+
+def chapter_words(req: Dict[str, Any], default: int = 2000) -> int:
+    return validated(ChapterRequest, req).target_words or default
+
+async def expand_chapter_incremental(req: Dict[str, Any], tenant: str):
+    """Regenerate only the outline sections that changed since the last expansion."""
+    outline = req.get("chapter_outline") or ""
+    target_words = chapter_words(req, 1000)
+    plan = chapter_cache.plan(tenant, str(req["chapter_id"]), outline)
+    total_chars = sum(len(s) for s in plan.sections) or 1
+
+    async def write_section(i: int):
+        words = max(50, int(target_words * len(plan.sections[i]) / total_chars))
+        before, after = plan.context(i)
+        prompt = f"As 'COPYWRITER AGENT', write about {words} words of finished prose for this beat of a chapter: {plan.sections[i]}"
+        if before:
+            prompt += f"\n\nIt must continue seamlessly from this existing text:\n...{before}"
+        if after:
+            prompt += f"\n\nIt must lead naturally into this existing text:\n{after}..."
+        prompt += "\n\nReturn only the new passage. NO AI WORDS like 'delve' or 'tapestry'."
+        return i, await run_agent(prompt, tenant, PRIORITY_BULK, agent="expand-chapter", genre=req.get("genre"),
+                                  words=words)
+
+    # Sections are queued together and decoded in one batch
+    request_share.set(len(plan.regenerate))
+    generated = dict(await asyncio.gather(*(write_section(i) for i in plan.regenerate)))
+    patch = chapter_cache.commit(plan, generated)
+    return {
+        "success": True,
+        "agent": "Copywriter",
+        "text": chapter_cache.text(tenant, str(req["chapter_id"])),
+        "patch": patch,
+        "sections": {"total": len(plan.sections), "regenerated": len(plan.regenerate), "reused": len(plan.reused)},
+    }
+
 @app.post("/api/expand-chapter")
-async def agent_copywriter(req: Dict[str, Any]):
-    prompt = f"As 'COPYWRITER AGENT', expand: {req.get('chapter_outline')} into {req.get('target_words')} words. NO AI WORDS like 'delve' or 'tapestry'."
-    res = generate_ai_text(prompt, max_tokens=3000)
+async def agent_copywriter(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    if req.get("incremental") and req.get("chapter_id"):
+        return await expand_chapter_incremental(req, tenant)
+    words = chapter_words(req)
+    prompt = f"As 'COPYWRITER AGENT', expand: {req.get('chapter_outline')} into {words} words. NO AI WORDS like 'delve' or 'tapestry'."
+    res = await run_agent(prompt, tenant, PRIORITY_BULK, agent="expand-chapter", genre=req.get("genre"), words=words)
     return {"success": True, "agent": "Copywriter", "text": res}
 
 @app.post("/api/aplus-generate")
-async def agent_marketing_lead(req: Dict[str, Any]):
+async def agent_marketing_lead(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
     prompt = f"As 'MARKETING LEAD', create 4 A+ Content modules for: {req.get('book_description')}."
-    res = generate_ai_text(prompt)
+    res = await run_agent(prompt, tenant, agent="aplus-generate", genre=req.get("genre"))
     return {"success": True, "agent": "Marketing Lead", "data": res}
 
 @app.post("/api/visual-plate")
@@ -137,29 +602,321 @@ async def agent_visual_lead(req: Dict[str, Any]):
 
 @app.post("/api/profit-estimate")
 async def agent_finance(req: Dict[str, Any]):
-    # Logic for royalty calculation
-    price = req.get('price', 9.99)
-    royalty = price * 0.7 if price >= 2.99 else price * 0.35
-    return {"success": True, "agent": "Finance Agent", "royalty": royalty, "margin": "High"}
+    """Royalty grid over prices x pages x marketplaces x paper types, with break-even and optimal prices."""
+    try:
+        result = estimate_royalties(req)
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "agent": "Finance Agent", **result}
+
+UPLOAD_DIR = os.path.realpath(os.getenv("ARTISAN_UPLOAD_DIR", "uploads"))
+MAX_UPLOAD_MB = float(os.getenv("ARTISAN_MAX_UPLOAD_MB", "650"))  # KDP's interior file limit
+UPLOAD_TTL_S = float(os.getenv("ARTISAN_UPLOAD_TTL_H", "24")) * 3600
+
+@app.post("/api/uploads")
+async def upload_interior(request: Request):
+    """Raw PDF body, streamed to disk; returns the file_path to pass to /api/validate-kdp."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    sweep(UPLOAD_DIR, UPLOAD_TTL_S)
+    name = f"{uuid.uuid4().hex}.pdf"
+    path = os.path.join(UPLOAD_DIR, name)
+    limit = int(MAX_UPLOAD_MB * 1024 * 1024)
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_UPLOAD_MB:g} MB")
+                if f.tell() == 0 and chunk and not chunk.startswith(b"%PDF-"):
+                    raise HTTPException(status_code=400, detail="Upload is not a PDF")
+                f.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+    except BaseException:
+        os.remove(path)
+        raise
+    return {"success": True, "file_path": name, "bytes": size}
+
+def resolve_upload(file_path: str) -> str:
+    """Resolve a client-supplied path inside the upload directory."""
+    path = os.path.realpath(os.path.join(UPLOAD_DIR, file_path or ""))
+    if os.path.commonpath([path, UPLOAD_DIR]) != UPLOAD_DIR or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    return path
 
 @app.post("/api/validate-kdp")
 async def agent_compliance(req: Dict[str, Any]):
-    return {"success": True, "agent": "Compliance Agent", "status": "Compliant", "checks": ["Margin: PASS", "Bleed: PASS"]}
+    path = resolve_upload(req.get("file_path"))
+    loop = asyncio.get_running_loop()
+    try:
+        report = await loop.run_in_executor(None, run_preflight, path, req.get("reading_direction", "LTR"))
+    except (PdfReadError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Could not read PDF: {e}")
+    status = "Compliant" if report["canExport"] else "Non-Compliant"
+    return {"success": True, "agent": "Compliance Agent", "status": status, **report}
+
+EXPORT_MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "epub": "application/epub+zip",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+def start_export(meta: Dict[str, Any]) -> ExportJob:
+    try:
+        return ExportJob(
+            meta.get("format"),
+            title=meta.get("title") or "Untitled",
+            author=meta.get("author") or "",
+            trim_size=meta.get("trim_size") or '6" x 9" (Standard)',
+            estimated_pages=meta.get("estimated_pages"),
+            total_words=meta.get("total_words"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def export_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "agent": "DevOps Agent",
+        "status": "Ready for download",
+        "download": f"/api/export/files/{result['file_id']}",
+        **result,
+    }
+
+async def abort_export(loop, job: ExportJob):
+    await asyncio.shield(loop.run_in_executor(None, job.abort))
 
 @app.post("/api/export")
 async def agent_devops(req: Dict[str, Any]):
-    return {"success": True, "agent": "DevOps Agent", "format": req.get('format'), "status": "Ready for download"}
+    chapters = req.get("chapters") or []
+    if not chapters:
+        raise HTTPException(status_code=400, detail="No chapters supplied; send chapters or use /api/export/stream")
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, start_export, req)
+    try:
+        for chapter in chapters:
+            await loop.run_in_executor(None, job.add_chapter, chapter)
+        result = await loop.run_in_executor(None, job.finish)
+    except BaseException as e:
+        await abort_export(loop, job)
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    return export_response(result)
+
+@app.post("/api/export/stream")
+async def agent_devops_stream(request: Request):
+    """
+    NDJSON body: the first line is export metadata ({format, title, author, trim_size,
+    total_words}), every following line is one chapter ({chapter, title, content, image}).
+    Chapters are laid out and written to disk as they arrive.
+    """
+    loop = asyncio.get_running_loop()
+    job: Optional[ExportJob] = None
+    buffer = b""
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if job is None:
+                    job = await loop.run_in_executor(None, start_export, record)
+                else:
+                    await loop.run_in_executor(None, job.add_chapter, record)
+        if buffer.strip():
+            record = json.loads(buffer)
+            if job is None:
+                job = await loop.run_in_executor(None, start_export, record)
+            else:
+                await loop.run_in_executor(None, job.add_chapter, record)
+        if job is None:
+            raise HTTPException(status_code=400, detail="Empty export stream")
+        result = await loop.run_in_executor(None, job.finish)
+    except BaseException as e:
+        # Disconnects and bad chapters alike: close the writer and drop the partial file
+        if job is not None:
+            await abort_export(loop, job)
+        if isinstance(e, json.JSONDecodeError):
+            raise HTTPException(status_code=400, detail=f"Invalid NDJSON line: {e}")
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    return export_response(result)
+
+@app.get("/api/export/files/{file_id}")
+async def export_download(file_id: str):
+    path = export_path(file_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    ext = file_id.rsplit(".", 1)[-1]
+    filename = file_id if ext in ("png", "svg") else f"manuscript.{ext}"
+    return FileResponse(path, media_type=EXPORT_MEDIA_TYPES.get(ext), filename=filename)
+
+project_store = ProjectStore()
 
 @app.post("/api/cloud-save")
-async def agent_db_admin(req: Dict[str, Any]):
-    return {"success": True, "agent": "DB Admin", "action": req.get('action'), "status": "Data persistence confirmed"}
+async def agent_db_admin(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    """save / load / history for a project. Saves only write chunks the store has not seen."""
+    if tenant == ANONYMOUS:
+        # Every keyless caller shares this tenant, so its projects would be readable by anyone
+        raise HTTPException(status_code=401, detail="Cloud save requires an API key")
+    action = req.get("action") or "save"
+    project_id = req.get("project_id")
+    if not project_id:
+        raise HTTPException(status_code=400, detail="project_id is required")
+    project_id = str(project_id)
+    loop = asyncio.get_running_loop()
+
+    if action == "save":
+        data = req.get("data")
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="data must be an object")
+        result = await loop.run_in_executor(None, project_store.save, tenant, project_id, data)
+        return {"success": True, "agent": "DB Admin", "action": action, "status": "Data persistence confirmed", **result}
+    if action == "load":
+        snapshot = await loop.run_in_executor(None, project_store.load, tenant, project_id, req.get("snapshot_id"))
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        return {"success": True, "agent": "DB Admin", "action": action, **snapshot}
+    if action == "history":
+        snapshots = await loop.run_in_executor(None, project_store.history, tenant, project_id)
+        return {"success": True, "agent": "DB Admin", "action": action, "snapshots": snapshots}
+    raise HTTPException(status_code=400, detail=f"Unknown action '{action}'")
 
 @app.post("/api/humanize")
-async def agent_humanity_pro(req: Dict[str, Any]):
+async def agent_humanity_pro(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
     prompt = f"As 'HUMANITY PRO', sanitize this text, removing all AI markers and improving emotional resonance: {req.get('text')}"
-    res = generate_ai_text(prompt)
+    res = await run_agent(prompt, tenant, agent="humanize", genre=req.get("genre"))
     return {"success": True, "agent": "Humanity Pro", "text": res}
 
+# --- BATCH ---
+# Route slug -> (request model or None for raw dict, handler). LLM-backed handlers
+# all land in the scheduler at once and get dispatched as a single batch.
+BATCH_AGENTS = {
+    "niche-analysis": (NicheRequest, agent_niche_radar),
+    "amazon-seo": (SEORequest, agent_amazon_seo),
+    "brand-intel": (None, agent_brand_intel),
+    "trend-analysis": (None, agent_trend_intel),
+    "kdp-generate": (ContentRequest, agent_kdp_lab),
+    "coloring-generate": (None, agent_coloring_gen),
+    "pod-generate": (None, agent_pod_designer),
+    "cover-generate": (None, agent_cover_artist),
+    "expand-chapter": (None, agent_copywriter),
+    "aplus-generate": (None, agent_marketing_lead),
+    "visual-plate": (None, agent_visual_lead),
+    "profit-estimate": (None, agent_finance),
+    "validate-kdp": (None, agent_compliance),
+    "export": (None, agent_devops),
+    "cloud-save": (None, agent_db_admin),
+    "humanize": (None, agent_humanity_pro),
+}
+LLM_AGENTS = {
+    "niche-analysis", "amazon-seo", "brand-intel", "trend-analysis",
+    "kdp-generate", "expand-chapter", "aplus-generate", "humanize",
+}
+TENANT_AGENTS = LLM_AGENTS | {"cloud-save", "coloring-generate"}
+BULK_AGENTS = {"kdp-generate", "expand-chapter"}
+
+async def _run_batch_item(index: int, item: BatchItem, tenant: str, share: int = 1):
+    request_share.set(share)
+    entry = BATCH_AGENTS.get(item.agent)
+    if entry is None:
+        return {"index": index, "agent": item.agent, "success": False, "error": f"Unknown agent '{item.agent}'"}
+    model, handler = entry
+    try:
+        payload = model(**item.payload) if model else item.payload
+        if item.agent in TENANT_AGENTS:
+            result = await handler(payload, tenant)
+        else:
+            result = await handler(payload)
+        return {"index": index, "agent": item.agent, "result": result}
+    except ValidationError as e:
+        return {"index": index, "agent": item.agent, "success": False, "error": str(e)}
+    except HTTPException as e:
+        return {"index": index, "agent": item.agent, "success": False, "status": e.status_code, "error": e.detail}
+    except Exception as e:
+        # One bad item must not end the stream for the rest of the batch
+        return {"index": index, "agent": item.agent, "success": False, "status": 500,
+                "error": f"{type(e).__name__}: {e}"}
+
+@app.post("/api/batch")
+async def agent_batch(req: BatchRequest, tenant: str = Depends(get_tenant)):
+    """Run many agent calls in one round-trip, streaming NDJSON results as they finish."""
+    # Cheap agents resolve immediately; LLM agents are queued together before the
+    # scheduler worker wakes up, so they share one model dispatch.
+    # LLM items of one priority class run in the same batch, so they split the GPU charge
+    classes = [(item.agent in BULK_AGENTS) if item.agent in LLM_AGENTS else None for item in req.items]
+    shares = {c: classes.count(c) for c in set(classes) if c is not None}
+    tasks = [asyncio.ensure_future(_run_batch_item(i, item, tenant, shares.get(c, 1)))
+             for i, (item, c) in enumerate(zip(req.items, classes))]
+
+    async def stream():
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield json.dumps(await done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/api/estimate")
+async def estimate_cost(req: EstimateRequest, tenant: str = Depends(get_tenant)):
+    """Dry run: what a request would cost and whether it would be admitted now, without running it."""
+    p = req.payload
+    loop = asyncio.get_running_loop()
+    try:
+        if req.agent == "kdp-generate":
+            content = ContentRequest(**p)
+            max_tokens = kdp_tokens(content)
+            estimate = await loop.run_in_executor(
+                None, cost_model.text, kdp_prompt(content), max_tokens,
+                cost_model.expected_tokens(req.agent, max_tokens)
+            )
+        elif req.agent == "expand-chapter":
+            estimate = await loop.run_in_executor(
+                None, cost_model.text, str(p.get("chapter_outline") or ""),
+                tokens.budget(chapter_words(p), p.get("genre"))
+            )
+        elif req.agent == "coloring-generate":
+            estimate = cost_model.image(1024, 1024, 4, ColoringRequest(**p).pages)
+        elif req.agent == "image":
+            estimate = cost_model.image(int(p.get("width", 1024)), int(p.get("height", 1024)),
+                                        int(p.get("steps", 4)), int(p.get("count", 1)))
+        else:
+            prompt, max_tokens = str(p.get("prompt") or ""), int(p.get("max_tokens", 4000))
+            estimate = await loop.run_in_executor(
+                None, cost_model.text, prompt, max_tokens, cost_model.expected_tokens(req.agent, max_tokens)
+            )
+            # Same trim as run_agent applies to a cap that does not fit one call
+            limit = cost_model.text_limit(estimate)
+            if max_tokens > limit:
+                estimate = cost_model.text(prompt, limit, min(estimate["expected_tokens"], limit))
+    except (ValidationError, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return {"success": True, "admissible": True, **admission.decide(tenant, estimate, charge=False)}
+    except CostRejected as e:
+        detail = e.detail()
+        if req.agent == "kdp-generate" and e.status == 413:
+            kdp_fitting(detail, p.get("genre"))
+        return {"success": True, "admissible": False, "status": e.status, "retry_after": e.retry_after, **detail}
+
+@app.get("/api/scheduler/stats")
+async def scheduler_stats():
+    return {"success": True, "scheduler": scheduler.stats(), "load": load.stats(), "admission": admission.stats(),
+            "lora": lora_bank.stats() if lora_bank else None, "traffic": traffic.stats(), "tokens": tokens.stats()}
+
+@app.get("/api/semantic-cache/stats")
+async def semantic_cache_stats():
+    return {"success": True, "semantic_cache": semantic_cache.stats()}
+
 @app.get("/health")
 async def health():
     return {"status": "healthy", "gpu": torch.cuda.is_available()}
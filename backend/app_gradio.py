@@ -5,148 +5,481 @@ Provides text and image generation for all Artisan AI tools
 
 import gradio as gr
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from diffusers import DiffusionPipeline
 import spaces
 import json
+import os
+import random
+import uuid
+import uvicorn
 import base64
 from io import BytesIO
 from PIL import Image
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from gpu_batching import GPUBatcher
+from adaptive_batch import pow2_bucket
+from lineart import process_many as line_art_pages, decode_data_uri, encode_data_uri
+from image_index import ProjectImageIndex, dedupe
+from model_registry import ModelRegistry
+from cost_model import CostModel, CostRejected
+import image_cache
+from image_cache import TensorLRU, embed_key, EMBED_CACHE_MB, LATENT_CACHE_MB, MB
+from profiling import ADMIN_TOKEN, admin_router, profiler, require_admin
 
-# Model storage
-text_model = None
-text_tokenizer = None
-image_model = None
-
-def load_text_model():
-    """Load Llama 3 8B Instruct model"""
-    global text_model, text_tokenizer
-    if text_model is None:
-        print("🔄 Loading Llama 3 8B model...")
-        model_name = "meta-llama/Llama-3-8B-Instruct"
-        
-        text_tokenizer = AutoTokenizer.from_pretrained(model_name)
-        text_model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            torch_dtype=torch.float16,
-            device_map="auto",
-        )
-        print("✅ Text model loaded!")
-    return text_model, text_tokenizer
-
-def load_image_model():
-    """Load FLUX.1-schnell image model"""
-    global image_model
-    if image_model is None:
-        print("🔄 Loading FLUX.1-schnell model...")
-        image_model = DiffusionPipeline.from_pretrained(
-            "black-forest-labs/FLUX.1-schnell",
-            torch_dtype=torch.float16,
-        ).to("cuda")
-        print("✅ Image model loaded!")
-    return image_model
-
-@spaces.GPU(duration=60)
-def generate_text(prompt, max_tokens=2000, temperature=0.7):
-    """Generate text using Llama 3 8B with ZeroGPU"""
-    try:
-        model, tokenizer = load_text_model()
-        
-        # Format prompt for Llama 3
-        formatted_prompt = f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{prompt}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
-        
-        # Tokenize
-        inputs = tokenizer(formatted_prompt, return_tensors="pt").to(model.device)
-        
-        # Generate
-        with torch.no_grad():
+# Models are loaded by config name (ARTISAN_TEXT_MODEL / ARTISAN_IMAGE_MODEL) and
+# offloaded to CPU or disk when the other workload needs the device
+models = ModelRegistry()
+
+def _format_prompt(prompt):
+    """Wrap a user prompt in the Llama 3 chat template"""
+    return f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{prompt}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
+
+def _run_text_batch(prompts, max_tokens=2000, temperature=0.7):
+    """Generate completions for several prompts in one padded forward pass; returns (texts, model label)"""
+    with models.use("text") as handle:
+        model, tokenizer = handle.model, handle.tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+
+        with profiler.phase("tokenize"):
+            inputs = tokenizer(
+                [_format_prompt(p) for p in prompts],
+                return_tensors="pt",
+                padding=True,
+                add_special_tokens=False,
+            ).to(model.device)
+
+        with torch.no_grad(), profiler.generation() as traced:
             outputs = model.generate(
                 **inputs,
                 max_new_tokens=max_tokens,
                 temperature=temperature,
                 top_p=0.9,
                 do_sample=True,
-                pad_token_id=tokenizer.eos_token_id
+                pad_token_id=tokenizer.pad_token_id,
+                **traced
             )
-        
-        # Decode
-        generated = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Remove prompt from output
-        if formatted_prompt in generated:
-            generated = generated.replace(formatted_prompt, "")
-        
-        return {
-            "success": True,
-            "text": generated.strip(),
-            "model": "Llama-3-8B-Instruct"
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e)
-        }
 
-@spaces.GPU(duration=30)
-def generate_image(prompt, negative_prompt="", width=1024, height=1024, steps=4):
-    """Generate image using FLUX.1-schnell with ZeroGPU"""
+        # Only decode the newly generated tokens
+        new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+        with profiler.phase("detokenize"):
+            return [t.strip() for t in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)], handle.label
+
+def _run_image_batch(prompts, negative_prompt="", width=1024, height=1024, steps=4, model=None, embeds=None,
+                     init_latents=None, strength=None, seeds=None):
+    """
+    Render several prompts in one pipeline call; returns (base64 data URIs, model label, newly encoded
+    prompt embeddings per row, final latents per row). `embeds` are cached encoder outputs for `model`
+    (None rows are encoded here); with `init_latents` and `strength` the call is img2img from them.
+    """
+    with models.use("image") as handle:
+        pipe = handle.model
+        kwargs = dict(width=width, height=height, num_inference_steps=steps, **handle.spec.get("call", {}))
+        fresh, latents = [None] * len(prompts), []
+        if seeds:
+            kwargs["generator"] = [torch.Generator().manual_seed(s) for s in seeds]
+        if image_cache.supports(pipe):
+            # Embeddings cached for another model (swapped since) are re-encoded
+            embeds = list(embeds) if embeds and model == handle.name else [None] * len(prompts)
+            missing = list(dict.fromkeys(prompts[i] for i, e in enumerate(embeds) if e is None))
+            if missing:
+                with profiler.phase("text-encode"):
+                    encoded = dict(zip(missing, image_cache.encode_prompts(pipe, missing, negative_prompt,
+                                                                           handle.spec.get("call", {}))))
+                for i, p in enumerate(prompts):
+                    if embeds[i] is None:
+                        embeds[i] = fresh[i] = encoded[p]
+            kwargs.update(image_cache.embed_kwargs(pipe, embeds))
+            capture = image_cache.LatentCapture()
+            runner = pipe
+            if init_latents is not None:
+                runner = image_cache.img2img(pipe)
+                kwargs = image_cache.variant_kwargs(pipe, kwargs, init_latents, strength)
+            with profiler.phase("diffusion"):
+                images = runner(**kwargs, callback_on_step_end=capture).images
+            latents = capture.rows(pipe, width, height)
+        else:
+            with profiler.phase("diffusion"):
+                images = pipe(prompt=list(prompts), negative_prompt=[negative_prompt] * len(prompts), **kwargs).images
+        label = handle.label
+
+    encoded = []
+    with profiler.phase("encode"):
+        for image in images:
+            buffered = BytesIO()
+            image.save(buffered, format="PNG")
+            encoded.append(f"data:image/png;base64,{base64.b64encode(buffered.getvalue()).decode()}")
+    return encoded, label, fresh, latents or [None] * len(encoded)
+
+# --- ZEROGPU SLOT BUDGETING ---
+# Requests are queued and packed into as few @spaces.GPU invocations as fit the
+# duration budget; see gpu_batching.py. Per-token/step costs are tunable via env.
+TEXT_DECODE_S = float(os.getenv("ARTISAN_GPU_DECODE_S", "0.03"))
+TEXT_PREFILL_S = float(os.getenv("ARTISAN_GPU_PREFILL_S", "0.0005"))
+IMAGE_STEP_S = float(os.getenv("ARTISAN_GPU_STEP_S", "0.35"))
+
+def _estimate_text(items):
+    """GPU seconds for one padded batch: decode steps dominate, batch adds a little"""
+    decode = max(i["max_tokens"] for i in items) * TEXT_DECODE_S * (1 + 0.05 * (len(items) - 1))
+    prefill = sum(len(i["prompt"]) // 4 for i in items) * TEXT_PREFILL_S
+    return decode + prefill
+
+def _estimate_image(items):
+    """GPU seconds: denoising steps (only the tail for variants) scaled by pixel count relative to 1024x1024"""
+    return sum(
+        (image_cache.denoised_steps(i["steps"], i["strength"]) if i.get("strength") else i["steps"])
+        * IMAGE_STEP_S * (i["width"] * i["height"]) / (1024 * 1024)
+        for i in items
+    )
+
+def _text_group(item):
+    # Same temperature and a similar token budget can share one generate call
+    return (item["temperature"], max(256, 1 << (item["max_tokens"] - 1).bit_length()))
+
+def _image_group(item):
+    # Variants (img2img) only batch with variants at the same strength
+    return (item["negative_prompt"], item["width"], item["height"], item["steps"], item.get("strength"))
+
+# Memory grows with batch x padded length (text) or batch x pixels (image); batches
+# that run out of memory are split and the size that fits is learned per bucket
+def _text_size(items):
+    return ("text", pow2_bucket(max(len(i["prompt"]) // 4 for i in items) + max(i["max_tokens"] for i in items)))
+
+def _image_size(items):
+    return ("image", max(i["width"] * i["height"] for i in items))
+
+def _run_text_items(items):
+    texts, label = _run_text_batch(
+        [i["prompt"] for i in items],
+        max(i["max_tokens"] for i in items),
+        items[0]["temperature"],
+    )
+    return [{"success": True, "text": t, "model": label} for t in texts]
+
+def _run_image_items(items):
+    first = items[0]
+    images, label, fresh, latents = _run_image_batch(
+        [i["prompt"] for i in items],
+        first["negative_prompt"], first["width"], first["height"], first["steps"],
+        model=first.get("model"),
+        embeds=[i.get("embeds") for i in items],
+        init_latents=[i["latents"] for i in items] if first.get("strength") else None,
+        strength=first.get("strength"),
+        seeds=[i["seed"] for i in items] if all(i.get("seed") is not None for i in items) else None,
+    )
+    # Tensors ride back to the calling process for its caches, see _render_images
+    return [{"success": True, "image": img, "model": label, "_embeds": e, "_latents": l}
+            for img, e, l in zip(images, fresh, latents)]
+
+text_batcher = GPUBatcher(_run_text_items, _estimate_text, spaces.GPU, group_key=_text_group, size_key=_text_size)
+image_batcher = GPUBatcher(_run_image_items, _estimate_image, spaces.GPU, group_key=_image_group, max_batch=4,
+                           size_key=_image_size)
+
+# Requests are costed before they reach the GPU; ones that could never fit are refused with
+# the estimate and the largest size that would, instead of taking the worker down
+cost_model = CostModel(models.configs[models.resolve("text")]["repo"], models.configs[models.resolve("image")]["repo"])
+
+# Text-encoder outputs are reused for repeated prompts, and every image's final latents are
+# kept for cheap variants (see image_cache.py). Both live here, not in the GPU worker.
+embed_cache = TensorLRU(EMBED_CACHE_MB * MB)
+latent_cache = TensorLRU(LATENT_CACHE_MB * MB)
+
+def _render_images(items):
+    """Run image items with their cached prompt embeddings; caches what the GPU call computed"""
+    model = models.resolve("image")
+    keys = [embed_key(model, i["prompt"], i["negative_prompt"]) for i in items]
+    sent = [dict(item, model=model, embeds=embed_cache.get(key)) for item, key in zip(items, keys)]
+    results = image_batcher.run_many(sent)
+    for item, key, result in zip(sent, keys, results):
+        embeds, latents = result.pop("_embeds", None), result.pop("_latents", None)
+        if embeds is not None:
+            embed_cache.put(key, embeds)
+        if latents is not None:
+            image_id = uuid.uuid4().hex
+            latent_cache.put(image_id, {"latents": latents, "model": model, **{
+                k: item[k] for k in ("prompt", "negative_prompt", "width", "height", "steps")}})
+            result["image_id"] = image_id
+    return results
+
+def _reject_oversized(estimate):
+    """None if the request fits one worker, else the error response to return"""
     try:
-        pipe = load_image_model()
-        
-        # Generate
-        image = pipe(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
-            width=width,
-            height=height,
-            num_inference_steps=steps,
-            guidance_scale=0.0
-        ).images[0]
-        
-        # Convert to base64
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        
-        return {
-            "success": True,
-            "image": f"data:image/png;base64,{img_str}",
-            "model": "FLUX.1-schnell"
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e)
-        }
+        cost_model.check(estimate)
+        return None
+    except CostRejected as e:
+        return {"success": False, **e.detail()}
+
+def generate_text(prompt, max_tokens=2000, temperature=0.7):
+    """Generate text with the model assigned to the "text" role, on ZeroGPU"""
+    rejected = _reject_oversized(cost_model.text(prompt, max_tokens))
+    if rejected:
+        return rejected
+    return text_batcher.run({"prompt": prompt, "max_tokens": max_tokens, "temperature": temperature})
+
+def generate_text_batch(prompts, max_tokens=2000, temperature=0.7):
+    """Generate text for a list of prompts, packed into as few GPU slots as fit"""
+    rejected = _reject_oversized(cost_model.text(max(prompts, key=len), max_tokens))
+    if rejected:
+        return rejected
+    results = text_batcher.run_many(
+        [{"prompt": p, "max_tokens": max_tokens, "temperature": temperature} for p in prompts]
+    )
+    return {
+        "success": all(r.get("success") for r in results),
+        "results": results,
+        "model": models.label("text")
+    }
 
-# API-style functions for frontend integration
+def _apply_line_art(results, fmt):
+    """Coloring-page post-processing on CPU, after the GPU slot has been released"""
+    done = [r for r in results if r.get("success")]
+    pages = line_art_pages([decode_data_uri(r["image"]) for r in done], fmt)
+    for result, page in zip(done, pages):
+        result["image"] = encode_data_uri(page)
+        result["line_art"] = {k: page[k] for k in ("format", "width", "height", "dpi")}
+        result["line_art"]["bytes"] = len(page["data"])
+    return results
+
+# Near-duplicates of a project's earlier images are regenerated before they are returned
+image_index = ProjectImageIndex()
+DEDUP_RETRIES = int(os.getenv("ARTISAN_DEDUP_RETRIES", "2"))
+
+def _dedupe_images(results, items, project_id):
+    def regenerate(positions, attempt):
+        varied = [dict(items[i], prompt=f"{items[i]['prompt']}, alternative composition #{attempt}") for i in positions]
+        return _render_images(varied)
+
+    info = dedupe(
+        image_index, project_id, results,
+        lambda r: decode_data_uri(r["image"]) if r.get("success") else None,
+        regenerate, DEDUP_RETRIES,
+    )
+    for result, entry in zip(results, info):
+        result.update(entry)
+    return results
+
+def generate_image(prompt, negative_prompt="", width=1024, height=1024, steps=4, line_art=None, project_id=None):
+    """Generate image with the model assigned to the "image" role, on ZeroGPU; line_art="png"/"svg" for coloring pages"""
+    rejected = _reject_oversized(cost_model.image(width, height, steps))
+    if rejected:
+        return rejected
+    item = {
+        "prompt": prompt, "negative_prompt": negative_prompt,
+        "width": width, "height": height, "steps": steps
+    }
+    results = _render_images([item])
+    if project_id:
+        _dedupe_images(results, [item], project_id)
+    return _apply_line_art(results, line_art)[0] if line_art else results[0]
+
+def generate_image_batch(prompts, negative_prompt="", width=1024, height=1024, steps=4, line_art=None, project_id=None):
+    """Generate one image per prompt, packed into as few GPU slots as fit"""
+    rejected = _reject_oversized(cost_model.image(width, height, steps, len(prompts)))
+    if rejected:
+        return rejected
+    items = [
+        {"prompt": p, "negative_prompt": negative_prompt, "width": width, "height": height, "steps": steps}
+        for p in prompts
+    ]
+    results = _render_images(items)
+    if project_id:
+        _dedupe_images(results, items, project_id)
+    if line_art:
+        _apply_line_art(results, line_art)
+    return {
+        "success": all(r.get("success") for r in results),
+        "results": results,
+        "model": models.label("image")
+    }
+
+def generate_variants(image_id, count=8, strength=0.5, prompt=None, line_art=None):
+    """
+    More images like an earlier one (by its image_id): img2img from its kept latents, re-noised to
+    `strength`, so each costs about `strength` of a full generation. `prompt` may change a word or two.
+    Variants are near-duplicates of their source by design, so they are not deduplicated.
+    Raises KeyError for an unknown or evicted image, ValueError if the image model changed since.
+    """
+    source = latent_cache.get(image_id)
+    if source is None:
+        raise KeyError(f"Image '{image_id}' is not cached (unknown or evicted); generate it again")
+    if source["model"] != models.resolve("image"):
+        raise ValueError(f"Image '{image_id}' was made with '{source['model']}', not the current image model")
+    width, height = source["width"], source["height"]
+    steps = image_cache.variant_steps(source["steps"], strength)
+    rejected = _reject_oversized(cost_model.image(width, height, image_cache.denoised_steps(steps, strength), count))
+    if rejected:
+        return rejected
+    items = [
+        {"prompt": prompt or source["prompt"], "negative_prompt": source["negative_prompt"], "width": width,
+         "height": height, "steps": steps, "latents": source["latents"], "strength": strength,
+         "seed": random.randrange(2 ** 31)}
+        for _ in range(count)
+    ]
+    results = _render_images(items)
+    if line_art:
+        _apply_line_art(results, line_art)
+    return {
+        "success": all(r.get("success") for r in results),
+        "results": results,
+        "source": image_id,
+        "model": models.label("image")
+    }
+
+# API-style functions for the Gradio UI (gr.JSON takes dicts directly)
 def api_text(request_json):
     """API endpoint for text generation"""
     try:
         data = json.loads(request_json) if isinstance(request_json, str) else request_json
-        result = generate_text(
+        return generate_text(
             data.get("prompt", ""),
             data.get("max_tokens", 2000),
             data.get("temperature", 0.7)
         )
-        return json.dumps(result, indent=2)
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)})
+        return {"success": False, "error": str(e)}
 
 def api_image(request_json):
     """API endpoint for image generation"""
     try:
         data = json.loads(request_json) if isinstance(request_json, str) else request_json
-        result = generate_image(
+        return generate_image(
             data.get("prompt", ""),
             data.get("negative_prompt", ""),
             data.get("width", 1024),
             data.get("height", 1024),
-            data.get("num_inference_steps", 4)
+            data.get("num_inference_steps", 4),
+            data.get("line_art"),
+            data.get("project_id")
         )
-        return json.dumps(result, indent=2)
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)})
+        return {"success": False, "error": str(e)}
+
+# --- TYPED REST API ---
+# Mounted next to the Gradio UI on the same process and models. These skip the
+# Gradio queue and the JSON-string round-trip, and serialize with orjson.
+class TextRequest(BaseModel):
+    prompt: str
+    max_tokens: int = Field(2000, ge=1, le=8192)
+    temperature: float = Field(0.7, ge=0.0, le=2.0)
+
+class TextBatchRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=32)
+    max_tokens: int = Field(2000, ge=1, le=8192)
+    temperature: float = Field(0.7, ge=0.0, le=2.0)
+
+class ImageRequest(BaseModel):
+    prompt: str
+    negative_prompt: str = ""
+    width: int = Field(1024, ge=256, le=2048)
+    height: int = Field(1024, ge=256, le=2048)
+    num_inference_steps: int = Field(4, ge=1, le=100)
+    line_art: Optional[Literal["png", "svg"]] = None
+    project_id: Optional[str] = None
+
+class ImageBatchRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=8)
+    negative_prompt: str = ""
+    width: int = Field(1024, ge=256, le=2048)
+    height: int = Field(1024, ge=256, le=2048)
+    num_inference_steps: int = Field(4, ge=1, le=100)
+    line_art: Optional[Literal["png", "svg"]] = None
+    project_id: Optional[str] = None
+
+class VariantRequest(BaseModel):
+    image_id: str
+    count: int = Field(8, ge=1, le=8)
+    strength: float = Field(0.5, gt=0.0, le=1.0)
+    prompt: Optional[str] = None
+    line_art: Optional[Literal["png", "svg"]] = None
+
+class ModelSwapRequest(BaseModel):
+    role: Literal["text", "image"]
+    name: str
+
+class ModelPinRequest(BaseModel):
+    name: str
+    pinned: bool = True
+
+app = FastAPI(title="Artisan AI Creative Studio API", default_response_class=ORJSONResponse)
+
+# Admin-only profiling (see profiling.py). Only installed with ARTISAN_ADMIN_TOKEN set, so
+# the REST path carries no middleware otherwise. Phases inside a ZeroGPU worker process
+# are not visible to the trace; run without ZeroGPU to see tokenize/prefill/decode/encode.
+if ADMIN_TOKEN:
+    app.include_router(admin_router())
+
+    @app.middleware("http")
+    async def profile_requests(request, call_next):
+        trace = profiler.claim(request.url.path)
+        with profiler.running(trace):
+            response = await call_next(request)
+        if trace is not None:
+            response.headers["X-Profile-Id"] = trace.id
+        return response
+
+@app.post("/api/text")
+def rest_text(req: TextRequest):
+    return generate_text(req.prompt, req.max_tokens, req.temperature)
+
+@app.post("/api/text/batch")
+def rest_text_batch(req: TextBatchRequest):
+    return generate_text_batch(req.prompts, req.max_tokens, req.temperature)
+
+@app.post("/api/image")
+def rest_image(req: ImageRequest):
+    return generate_image(req.prompt, req.negative_prompt, req.width, req.height, req.num_inference_steps, req.line_art, req.project_id)
+
+@app.post("/api/image/batch")
+def rest_image_batch(req: ImageBatchRequest):
+    return generate_image_batch(req.prompts, req.negative_prompt, req.width, req.height, req.num_inference_steps, req.line_art, req.project_id)
+
+@app.post("/api/image/variants")
+def rest_image_variants(req: VariantRequest):
+    try:
+        return generate_variants(req.image_id, req.count, req.strength, req.prompt, req.line_art)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/api/models")
+def rest_models():
+    return models.stats()
+
+# Swapping and pinning change what every caller gets, so they need the admin token
+# (X-Admin-Token); with ARTISAN_ADMIN_TOKEN unset they always answer 401
+@app.post("/api/models/swap", dependencies=[Depends(require_admin)])
+def rest_models_swap(req: ModelSwapRequest):
+    """Point a role at another configured model; the next request loads it, the old one is released when idle"""
+    try:
+        previous = models.assign(req.role, req.name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "role": req.role, "model": req.name, "previous": previous}
+
+@app.post("/api/models/pin", dependencies=[Depends(require_admin)])
+def rest_models_pin(req: ModelPinRequest):
+    try:
+        models.pin(req.name, req.pinned)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    return {"success": True, "model": req.name, "pinned": req.pinned}
+
+@app.get("/health")
+def health():
+    return {
+        "status": "healthy",
+        "gpu_available": torch.cuda.is_available(),
+        "gpu_budget": {"text": text_batcher.stats(), "image": image_batcher.stats()},
+        "image_index": image_index.stats(),
+        "image_cache": {"embeddings": embed_cache.stats(), "latents": latent_cache.stats()},
+        "models": models.stats(),
+    }
 
 # Gradio Interface
 with gr.Blocks(title="Artisan AI Creative Studio", theme=gr.themes.Soft()) as demo:
@@ -259,10 +592,36 @@ with gr.Blocks(title="Artisan AI Creative Studio", theme=gr.themes.Soft()) as de
         {
           "success": true,
           "image": "data:image/png;base64,...",
-          "model": "FLUX.1-schnell"
+          "model": "FLUX.1-schnell",
+          "image_id": "3f2a..."
         }
         ```
-        
+
+        ### Variants
+        **POST** `/api/image/variants` with `{"image_id": "3f2a...", "count": 8, "strength": 0.5}`
+        returns `count` images like an earlier one. They start from its kept latents and rerun only
+        the last `strength` of the denoising, so 8 variants cost about 4 full images at 0.5.
+        An optional `prompt` can change a word or two. Unknown or evicted ids return 404.
+        Variants are close to their source by design, so they skip the project duplicate check.
+
+        ### Batch Endpoints
+        **POST** `/api/text/batch` and `/api/image/batch`
+
+        Same fields as above, but `prompt` becomes `prompts` (an array). All prompts
+        share one GPU slot and one forward pass; results come back in order:
+        ```json
+        {
+          "success": true,
+          "results": [{"success": true, "text": "..."}]
+        }
+        ```
+
+        ### Model Registry
+        **GET** `/api/models` lists configured models, role assignments, memory per tier.
+        **POST** `/api/models/swap` with `{"role": "text", "name": "llama-3.1-8b"}` switches
+        versions without a restart; **POST** `/api/models/pin` keeps a model on the GPU.
+        Both require `X-Admin-Token` (set `ARTISAN_ADMIN_TOKEN`).
+
         ## Integration with Artisan AI Frontend
         
         Use the Gradio API client to call these functions from your React app:
@@ -285,13 +644,17 @@ with gr.Blocks(title="Artisan AI Creative Studio", theme=gr.themes.Soft()) as de
         - **Text Generation**: 5-15 seconds (varies by length)
         - **Image Generation**: 2-5 seconds
         - **Cold Start**: ~20-30 seconds (first request only)
-        - **GPU Time**: 60s for text, 30s for images (ZeroGPU limits)
+        - **GPU Time**: queued requests are packed into one ZeroGPU call sized
+          from their estimated cost (15-120s buckets); see `/health` for quota use
         
         ## Rate Limits
         
         Free tier ZeroGPU has generous limits for personal use.
         """)
 
+# Serve the REST routes and the Gradio UI from one app
+app = gr.mount_gradio_app(app, demo, path="/")
+
 # Launch
 if __name__ == "__main__":
-    demo.launch(server_name="0.0.0.0", server_port=7860)
+    uvicorn.run(app, host="0.0.0.0", port=7860)
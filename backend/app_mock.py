@@ -1,16 +1,36 @@
 """
 Artisan AI - Industrial Agentic Backend 2.0 (Simulation Mode)
 Orchestrating 16 specialized agents for standard-shattering publishing.
+
+Answers are canned, but timing is not: LLM agents go through the same fair
+scheduler as app.py and are held for as long as the simulated engine
+(sim_engine.py) says the real batch would take, so load tests against this
+server exercise real queueing and batching behaviour without a GPU. Requests
+also pass the same load shedding (load_control.py) and cost admission
+(cost_model.py) as app.py, so its 429s and 503s are the ones production would
+return. With ARTISAN_SIM_SPEED > 1, rate limits, GPU budgets and the latency SLO
+are compressed by the same factor as the simulated engine.
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+import asyncio
 import base64
 from io import BytesIO
 import os
 import json
+import random
+import time
 from typing import Optional, List, Dict, Any
+from scheduler import FairScheduler, RateLimitExceeded, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from sim_engine import SimEngine
+from tokenization import TokenService
+from tenancy import get_tenant
+import puzzles
+from load_control import LoadController, LoadShed, request_level, LEVELS, SLO_P95_S
+from cost_model import CostModel, AdmissionController, CostRejected, request_estimates, request_share
 
 # Initialize FastAPI
 app = FastAPI(
@@ -36,6 +56,7 @@ class AgentRequest(BaseModel):
 class NicheRequest(BaseModel):
     niche: str
     platforms: List[str] = ["amazon"]
+    narrate: bool = True
 
 class SEORequest(BaseModel):
     topic: str
@@ -47,14 +68,128 @@ class ContentRequest(BaseModel):
     chapters: Optional[int] = 10
     target_words: Optional[int] = 10000
 
-# --- CORE ENGINE (MOCKED) ---
-def generate_ai_text(prompt: str, max_tokens: int = 4000):
-    return f"[MOCK AI OUTPUT] Processed prompt: {prompt[:50]}..."
+class BatchItem(BaseModel):
+    agent: str
+    payload: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=32)
+
+class ChapterRequest(BaseModel):
+    target_words: Optional[int] = Field(None, ge=1)
+
+MAX_PUZZLE_WORDS = 500
+
+class PuzzleRequest(BaseModel):
+    type: str = "sudoku"
+    difficulty: str = "MEDIUM"
+    count: int = Field(1, ge=1, le=puzzles.MAX_PUZZLES)
+    seed: Optional[int] = Field(None, ge=0, lt=2 ** 63)
+    include_solution: bool = True
+    words: List[str] = Field([], max_length=MAX_PUZZLE_WORDS)
+    size: int = Field(15, ge=8, le=30)
+    words_per_puzzle: Optional[int] = Field(None, ge=1, le=MAX_PUZZLE_WORDS)
+
+def validated(model, req: Dict[str, Any]):
+    """Parse a loose JSON body into `model`, as a 400 rather than a 500 when it does not fit."""
+    try:
+        return model(**req)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'body'}: {err['msg']}" for err in e.errors())
+        raise HTTPException(status_code=400, detail=problems)
+
+# --- CORE ENGINE (SIMULATED) ---
+# Parameters are fitted from real runs (see sim_engine.py); ARTISAN_SIM_SPEED compresses time
+engine = SimEngine()
+scheduler = FairScheduler(engine.run_text, max_batch=int(os.getenv("ARTISAN_MAX_BATCH", "16")))
+# Token buckets refill at simulated speed; the burst is the same number of tokens as in production
+scheduler.tokens_per_minute *= engine.speed
+COLORING_BATCH = int(os.getenv("ARTISAN_COLORING_BATCH", "4"))
+MAX_COLORING_PAGES = 100
+KDP_PLAN_WORDS_PER_CHAPTER = 200
+# Word targets are budgeted like app.py, at the default ratio (no tokenizer, nothing to learn from)
+tokens = TokenService(None)
+
+# --- LOAD CONTROL & ADMISSION (as in app.py) ---
+# Latencies are measured in wall-clock seconds, so the SLO is compressed to match
+load = LoadController(scheduler.queue_depth, slo_p95_s=SLO_P95_S / engine.speed)
+cost_model = CostModel(tokens=tokens)
+admission = AdmissionController(cost_model, parallelism=scheduler.max_batch, tenant_weight=scheduler.weight,
+                                speed=engine.speed)
+
+@app.middleware("http")
+async def load_level_header(request: Request, call_next):
+    level = load.level
+    request_level.set(level)
+    estimates: List[Dict[str, Any]] = []
+    request_estimates.set(estimates)
+    response = await call_next(request)
+    response.headers["X-Load-Level"] = str(level)
+    response.headers["X-Load-Mode"] = LEVELS[level]
+    if estimates:
+        response.headers["X-Cost-Estimate"] = json.dumps({
+            "gpu_seconds": round(sum(e["gpu_seconds"] for e in estimates), 2),
+            "tflops": round(sum(e["tflops"] for e in estimates), 2),
+            "decision": "queue" if any(e["decision"] == "queue" for e in estimates) else "admit",
+        })
+    return response
+
+def cost_error(e: CostRejected) -> HTTPException:
+    headers = {"Retry-After": str(max(1, int(e.retry_after + 0.999)))} if e.retry_after else None
+    return HTTPException(status_code=e.status, detail=e.detail(), headers=headers)
+
+def admit(bulk: bool = False) -> int:
+    """Level for this request; raises 503 with Retry-After when it is being shed."""
+    level = request_level.get()
+    try:
+        load.admit(level, bulk)
+    except LoadShed as e:
+        raise HTTPException(
+            status_code=503, detail=str(e),
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
+    return level
+
+async def run_agent(prompt: str, tenant: str, priority: str = PRIORITY_INTERACTIVE, max_tokens: int = 4000,
+                    agent: Optional[str] = None, genre: Optional[str] = None,
+                    words: Optional[int] = None) -> Dict[str, Any]:
+    """Wait as long as the real engine would for this prompt; same budgets, 429s and 503s as app.py."""
+    level = admit(bulk=priority == PRIORITY_BULK)
+    if words:
+        max_tokens = tokens.budget(words, genre)
+    max_tokens = load.max_tokens(max_tokens, level)
+    expected = max_tokens if words else cost_model.expected_tokens(agent, max_tokens)
+    # No tokenizer to load here, so the estimate is cheap enough to make on the event loop
+    estimate = cost_model.text(prompt, max_tokens, expected)
+    limit = cost_model.text_limit(estimate)
+    if not words and max_tokens > limit:
+        max_tokens = limit
+        estimate = cost_model.text(prompt, max_tokens, min(expected, limit))
+    started = time.monotonic()
+    try:
+        with admission.admit(tenant, estimate, request_share.get()):
+            res = await scheduler.submit(prompt, tenant=tenant, priority=priority, max_tokens=max_tokens,
+                                         meta={"agent": agent})
+    except CostRejected as e:
+        raise cost_error(e)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Token rate limit exceeded for tenant '{e.tenant}'",
+            headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))},
+        )
+    if priority == PRIORITY_INTERACTIVE:
+        load.observe_latency(time.monotonic() - started)
+    cost_model.observe_output(agent, res["tokens"])
+    return res
 
 # --- AGENT ENDPOINTS ---
 
 @app.post("/api/niche-analysis")
-async def agent_niche_radar(req: NicheRequest):
+async def agent_niche_radar(req: NicheRequest, tenant: str = Depends(get_tenant)):
+    if req.narrate:
+        await run_agent(f"As 'NICHE RADAR AGENT', explain these computed market metrics for '{req.niche}' to a "
+                        f"self-publisher in 3-4 sentences.", tenant, max_tokens=300, agent="niche-analysis")
     res = {
         "velocity": "High (85/100)",
         "competition": "Medium",
@@ -64,27 +199,50 @@ async def agent_niche_radar(req: NicheRequest):
     return {"success": True, "agent": "Niche Radar", "data": json.dumps(res)}
 
 @app.post("/api/amazon-seo")
-async def agent_amazon_seo(req: SEORequest):
+async def agent_amazon_seo(req: SEORequest, tenant: str = Depends(get_tenant)):
+    await run_agent(f"As 'SEO ARCHITECT', create KDP-optimized title, 7 bullets, and description for '{req.topic}' "
+                    f"in '{req.genre}'.", tenant, agent="amazon-seo")
     res = f"Title: {req.topic} Masterclass\nBullets: \n- Feature 1\n- Feature 2"
     return {"success": True, "agent": "SEO Architect", "data": res}
 
 @app.post("/api/brand-intel")
-async def agent_brand_intel(req: Dict[str, Any]):
+async def agent_brand_intel(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    await run_agent(f"As 'BRAND LEAD', analyze positioning for {req.get('brand')} in {req.get('niche')}. "
+                    f"Provide SWOT and strategy.", tenant, agent="brand-intel")
     res = "SWOT Analysis: Strengths (High), Weaknesses (Null)"
     return {"success": True, "agent": "Brand Lead", "data": res}
 
 @app.post("/api/trend-analysis")
-async def agent_trend_intel(req: Dict[str, Any]):
+async def agent_trend_intel(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    await run_agent(f"As 'TREND AGENT', scan for 2026 publishing trends in {req.get('query')}. "
+                    f"Provide velocity scores.", tenant, agent="trend-analysis")
     res = "Trend Velocity: 9.8/10. Emerging sector detected."
     return {"success": True, "agent": "Trend Intelligence", "data": res}
 
 @app.post("/api/kdp-generate")
-async def agent_kdp_lab(req: ContentRequest):
+async def agent_kdp_lab(req: ContentRequest, tenant: str = Depends(get_tenant)):
+    await run_agent(f"As 'LAB AGENT', architect a {req.chapters}-chapter, {req.target_words}-word manuscript for "
+                    f"'{req.topic}' ({req.genre}). For each chapter give its title, its share of the word count and "
+                    f"about {KDP_PLAN_WORDS_PER_CHAPTER} words of plan.", tenant, PRIORITY_BULK, agent="kdp-generate",
+                    genre=req.genre, words=req.chapters * KDP_PLAN_WORDS_PER_CHAPTER)
     res = f"Generated {req.chapters} chapters for {req.topic}."
     return {"success": True, "agent": "KDP Book Lab", "data": res}
 
 @app.post("/api/coloring-generate")
-async def agent_coloring_gen(req: Dict[str, Any]):
+async def agent_coloring_gen(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    try:
+        pages = int(req.get("pages") or 1)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="pages must be an integer")
+    if not 1 <= pages <= MAX_COLORING_PAGES:
+        raise HTTPException(status_code=400, detail=f"pages must be between 1 and {MAX_COLORING_PAGES}")
+    width, height, steps = load.image_params(1024, 1024, 4, admit(bulk=True))
+    try:
+        with admission.admit(tenant, cost_model.image(width, height, steps, pages)):
+            for start in range(0, pages, COLORING_BATCH):
+                await engine.run_images(min(COLORING_BATCH, pages - start), width, height, steps)
+    except CostRejected as e:
+        raise cost_error(e)
     return {"success": True, "agent": "Coloring Gen", "message": f"Generating {req.get('pages')} pages for {req.get('theme')}."}
 
 @app.post("/api/pod-generate")
@@ -96,12 +254,18 @@ async def agent_cover_artist(req: Dict[str, Any]):
     return {"success": True, "agent": "Cover Artist", "data": f"Creating cover for {req.get('title')}."}
 
 @app.post("/api/expand-chapter")
-async def agent_copywriter(req: Dict[str, Any]):
-    res = f"Expanded chapter content ({req.get('target_words')} words)..."
+async def agent_copywriter(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    words = validated(ChapterRequest, req).target_words or 2000
+    await run_agent(f"As 'COPYWRITER AGENT', expand: {req.get('chapter_outline')} into {words} words. "
+                    f"NO AI WORDS like 'delve' or 'tapestry'.", tenant, PRIORITY_BULK, agent="expand-chapter",
+                    genre=req.get("genre"), words=words)
+    res = f"Expanded chapter content ({words} words)..."
     return {"success": True, "agent": "Copywriter", "text": res}
 
 @app.post("/api/aplus-generate")
-async def agent_marketing_lead(req: Dict[str, Any]):
+async def agent_marketing_lead(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    await run_agent(f"As 'MARKETING LEAD', create 4 A+ Content modules for: {req.get('book_description')}.",
+                    tenant, agent="aplus-generate")
     res = "Module 1: Banner. Module 2: Comparison Chart."
     return {"success": True, "agent": "Marketing Lead", "data": res}
 
@@ -128,13 +292,122 @@ async def agent_db_admin(req: Dict[str, Any]):
     return {"success": True, "agent": "DB Admin", "action": req.get('action'), "status": "Data persistence confirmed"}
 
 @app.post("/api/humanize")
-async def agent_humanity_pro(req: Dict[str, Any]):
+async def agent_humanity_pro(req: Dict[str, Any], tenant: str = Depends(get_tenant)):
+    await run_agent(f"As 'HUMANITY PRO', sanitize this text, removing all AI markers and improving emotional "
+                    f"resonance: {req.get('text')}", tenant, agent="humanize")
     res = f"Sanitized text: {req.get('text')}"
     return {"success": True, "agent": "Humanity Pro", "text": res}
 
+@app.post("/api/puzzle-generate")
+async def agent_puzzle_engine(req: Dict[str, Any]):
+    """Puzzles need no GPU, so the mock generates them for real (same NDJSON stream as app.py)."""
+    p = validated(PuzzleRequest, req)
+    kind, difficulty, count = p.type, p.difficulty.upper(), p.count
+    if kind not in puzzles.PUZZLE_TYPES:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(puzzles.PUZZLE_TYPES)}")
+    if difficulty not in puzzles.SUDOKU_DIFFICULTIES:
+        raise HTTPException(status_code=400, detail=f"Unknown difficulty '{difficulty}'")
+    spec = {"type": kind, "difficulty": difficulty, "include_solution": p.include_solution,
+            "seed": p.seed if p.seed is not None else random.getrandbits(31)}
+    if kind == "word-search":
+        if not p.words:
+            raise HTTPException(status_code=400, detail="words are required for word-search")
+        spec.update(words=p.words, size=p.size, words_per_puzzle=p.words_per_puzzle)
+
+    loop = asyncio.get_running_loop()
+    futures = [loop.run_in_executor(puzzles.get_pool(), puzzles.generate_batch, spec, b)
+               for b in puzzles.batches(count)]
+
+    async def stream():
+        started = time.perf_counter()
+        yield json.dumps({"type": "meta", "puzzleType": kind, "difficulty": difficulty, "count": count,
+                          "seed": spec["seed"]}) + "\n"
+        try:
+            for done in asyncio.as_completed(futures):
+                for puzzle in await done:
+                    puzzle.pop("cpu_s")
+                    yield json.dumps(puzzle) + "\n"
+        finally:
+            for future in futures:
+                future.cancel()
+        yield json.dumps({"type": "summary", "count": count,
+                          "elapsed_s": round(time.perf_counter() - started, 3)}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# --- BATCH ---
+BATCH_AGENTS = {
+    "niche-analysis": (NicheRequest, agent_niche_radar),
+    "amazon-seo": (SEORequest, agent_amazon_seo),
+    "brand-intel": (None, agent_brand_intel),
+    "trend-analysis": (None, agent_trend_intel),
+    "kdp-generate": (ContentRequest, agent_kdp_lab),
+    "coloring-generate": (None, agent_coloring_gen),
+    "pod-generate": (None, agent_pod_designer),
+    "cover-generate": (None, agent_cover_artist),
+    "expand-chapter": (None, agent_copywriter),
+    "aplus-generate": (None, agent_marketing_lead),
+    "visual-plate": (None, agent_visual_lead),
+    "profit-estimate": (None, agent_finance),
+    "validate-kdp": (None, agent_compliance),
+    "export": (None, agent_devops),
+    "cloud-save": (None, agent_db_admin),
+    "humanize": (None, agent_humanity_pro),
+}
+LLM_AGENTS = {
+    "niche-analysis", "amazon-seo", "brand-intel", "trend-analysis",
+    "kdp-generate", "expand-chapter", "aplus-generate", "humanize",
+}
+TENANT_AGENTS = LLM_AGENTS | {"coloring-generate"}
+BULK_AGENTS = {"kdp-generate", "expand-chapter"}
+
+async def _run_batch_item(index: int, item: BatchItem, tenant: str, share: int = 1):
+    request_share.set(share)
+    entry = BATCH_AGENTS.get(item.agent)
+    if entry is None:
+        return {"index": index, "agent": item.agent, "success": False, "error": f"Unknown agent '{item.agent}'"}
+    model, handler = entry
+    try:
+        payload = model(**item.payload) if model else item.payload
+        if item.agent in TENANT_AGENTS:
+            result = await handler(payload, tenant)
+        else:
+            result = await handler(payload)
+        return {"index": index, "agent": item.agent, "result": result}
+    except ValidationError as e:
+        return {"index": index, "agent": item.agent, "success": False, "error": str(e)}
+    except HTTPException as e:
+        return {"index": index, "agent": item.agent, "success": False, "status": e.status_code, "error": e.detail}
+    except Exception as e:
+        return {"index": index, "agent": item.agent, "success": False, "status": 500,
+                "error": f"{type(e).__name__}: {e}"}
+
+@app.post("/api/batch")
+async def agent_batch(req: BatchRequest, tenant: str = Depends(get_tenant)):
+    """Same NDJSON stream, batching and GPU-charge sharing as app.py's /api/batch."""
+    classes = [(item.agent in BULK_AGENTS) if item.agent in LLM_AGENTS else None for item in req.items]
+    shares = {c: classes.count(c) for c in set(classes) if c is not None}
+    tasks = [asyncio.ensure_future(_run_batch_item(i, item, tenant, shares.get(c, 1)))
+             for i, (item, c) in enumerate(zip(req.items, classes))]
+
+    async def stream():
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield json.dumps(await done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/api/scheduler/stats")
+async def scheduler_stats():
+    return {"success": True, "scheduler": scheduler.stats(), "load": load.stats(), "admission": admission.stats(),
+            "simulator": engine.stats()}
+
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "gpu": False, "mode": "simulation"}
+    return {"status": "healthy", "gpu": False, "mode": "simulation", "speed": engine.speed}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,349 @@
+"""
+Artisan AI - Async Python Client
+One pooled HTTP client for the agent API (app.py) and the Gradio REST API
+(app_gradio.py), for scripts that make thousands of calls from one process.
+
+- Keep-alive connection pool shared by every call
+- Bounded concurrency: at most `max_concurrency` requests in flight, so callers can
+  asyncio.gather() as many calls as they like
+- 429 / 503 retried with jittered exponential backoff, never sooner than Retry-After
+- NDJSON responses (batch results, puzzle pages) consumed as async iterators, and
+  export chapters uploaded as a stream
+
+    async with ArtisanClient("http://localhost:7860", api_key="ak_...") as client:
+        seo = await client.amazon_seo("Mindfulness Journal", "Self-Help")
+        async for result in client.batch_agents(items):
+            ...
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Union
+
+import httpx
+
+RETRY_STATUSES = (429, 503)
+BATCH_LIMIT = 32   # items per /api/batch call (BatchRequest max_length)
+
+
+class ArtisanError(Exception):
+    """A request that failed for good: non-retryable status, or retries exhausted."""
+
+    def __init__(self, status: int, detail: Any, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}: {detail}")
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _detail(response: httpx.Response) -> Any:
+    try:
+        body = response.json()
+    except ValueError:
+        return response.text
+    return body.get("detail", body) if isinstance(body, dict) else body
+
+
+def _compact(**fields) -> Dict[str, Any]:
+    return {k: v for k, v in fields.items() if v is not None}
+
+
+class ArtisanClient:
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        gradio_url: Optional[str] = None,
+        tenant: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_connections: int = 64,
+        max_concurrency: int = 32,
+        timeout: float = 300.0,
+        retries: int = 5,
+        backoff_s: float = 0.5,
+        max_backoff_s: float = 60.0,
+    ):
+        self.base_url = (base_url or os.getenv("ARTISAN_API_URL", "http://localhost:7860")).rstrip("/")
+        self.gradio_url = (gradio_url or os.getenv("ARTISAN_GRADIO_URL") or self.base_url).rstrip("/")
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        # The server derives the tenant from the API key; X-Tenant-ID is only honoured behind a trusted gateway
+        api_key = api_key or os.getenv("ARTISAN_API_KEY")
+        headers = _compact(**{"X-API-Key": api_key, "X-Tenant-ID": tenant})
+        self._http = httpx.AsyncClient(
+            headers=headers or None,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.metrics = {"requests": 0, "retries": 0, "errors": 0}
+
+    async def __aenter__(self) -> "ArtisanClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    # --- TRANSPORT ---
+    def _delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter, but never earlier than the server asked for
+        jitter = random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt))
+        return retry_after + random.uniform(0, self.backoff_s) if retry_after is not None else jitter
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send with retries and return the response with its body unread; the caller closes it."""
+        for attempt in range(self.retries + 1):
+            self.metrics["requests"] += 1
+            try:
+                response = await self._http.send(self._http.build_request(method, url, **kwargs), stream=True)
+            except (httpx.ConnectError, httpx.PoolTimeout) as e:
+                # Nothing reached the server, so any request is safe to resend
+                if attempt == self.retries:
+                    self.metrics["errors"] += 1
+                    raise ArtisanError(0, str(e))
+                self.metrics["retries"] += 1
+                await asyncio.sleep(self._delay(attempt, None))
+                continue
+            if response.status_code < 400:
+                return response
+            await response.aread()
+            await response.aclose()
+            retry_after = _retry_after(response)
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                self.metrics["errors"] += 1
+                raise ArtisanError(response.status_code, _detail(response), retry_after)
+            self.metrics["retries"] += 1
+            await asyncio.sleep(self._delay(attempt, retry_after))
+        raise AssertionError("unreachable")
+
+    async def request(self, method: str, path: str, payload: Any = None, gradio: bool = False) -> Dict[str, Any]:
+        url = (self.gradio_url if gradio else self.base_url) + path
+        async with self._slots:
+            response = await self._send(method, url, json=payload)
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+        return response.json()
+
+    async def stream(self, path: str, payload: Any = None) -> AsyncIterator[Dict[str, Any]]:
+        """POST and yield each NDJSON line of the response as it arrives."""
+        async with self._slots:
+            response = await self._send("POST", self.base_url + path, json=payload)
+            try:
+                async for line in response.aiter_lines():
+                    if line.strip():
+                        yield json.loads(line)
+            finally:
+                await response.aclose()
+
+    async def agent(self, slug: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Call any agent endpoint by its route slug, e.g. agent("amazon-seo", {...})."""
+        return await self.request("POST", f"/api/{slug}", payload)
+
+    # --- AGENTS ---
+    async def niche_analysis(self, niche: str, platforms: Sequence[str] = ("amazon",), narrate: bool = True) -> Dict[str, Any]:
+        return await self.agent("niche-analysis", {"niche": niche, "platforms": list(platforms), "narrate": narrate})
+
+    async def amazon_seo(self, topic: str, genre: str) -> Dict[str, Any]:
+        return await self.agent("amazon-seo", {"topic": topic, "genre": genre})
+
+    async def brand_intel(self, brand: str, niche: str) -> Dict[str, Any]:
+        return await self.agent("brand-intel", {"brand": brand, "niche": niche})
+
+    async def trend_analysis(self, query: str) -> Dict[str, Any]:
+        return await self.agent("trend-analysis", {"query": query})
+
+    async def kdp_generate(self, topic: str, genre: str, chapters: int = 10, target_words: int = 10000) -> Dict[str, Any]:
+        return await self.agent("kdp-generate", {"topic": topic, "genre": genre, "chapters": chapters,
+                                                 "target_words": target_words})
+
+    async def coloring_generate(self, theme: str, pages: int = 1, format: str = "png", audience: str = "kids",
+                                trim_size: Optional[str] = None, project_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self.agent("coloring-generate", _compact(theme=theme, pages=pages, format=format, audience=audience,
+                                                              trim_size=trim_size, project_id=project_id))
+
+    async def pod_generate(self, product: str, style: Optional[str] = None, **extra) -> Dict[str, Any]:
+        return await self.agent("pod-generate", _compact(product=product, style=style, **extra))
+
+    async def cover_generate(self, title: str, genre: Optional[str] = None, **extra) -> Dict[str, Any]:
+        return await self.agent("cover-generate", _compact(title=title, genre=genre, **extra))
+
+    async def expand_chapter(self, chapter_outline: str, target_words: int = 2000, genre: Optional[str] = None,
+                             chapter_id: Optional[str] = None, incremental: bool = False) -> Dict[str, Any]:
+        return await self.agent("expand-chapter", _compact(
+            chapter_outline=chapter_outline, target_words=target_words, genre=genre, chapter_id=chapter_id,
+            incremental=incremental or None,
+        ))
+
+    async def aplus_generate(self, book_description: str, genre: Optional[str] = None) -> Dict[str, Any]:
+        return await self.agent("aplus-generate", _compact(book_description=book_description, genre=genre))
+
+    async def visual_plate(self, chapter_summary: str, **extra) -> Dict[str, Any]:
+        return await self.agent("visual-plate", {"chapter_summary": chapter_summary, **extra})
+
+    async def profit_estimate(self, **grid) -> Dict[str, Any]:
+        """Royalty grid; keyword arguments are the /api/profit-estimate fields (price, pages, ...)."""
+        return await self.agent("profit-estimate", grid)
+
+    async def upload(self, path: str, chunk_size: int = 1 << 20) -> str:
+        """Stream a local PDF to /api/uploads; returns the file_path validate_kdp takes."""
+        async def body():
+            with open(path, "rb") as f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+
+        async with self._slots:
+            # A streamed body cannot be replayed, so this call is not retried
+            response = await self._http.post(self.base_url + "/api/uploads", content=body(),
+                                             headers={"Content-Type": "application/pdf"})
+        if response.status_code >= 400:
+            raise ArtisanError(response.status_code, _detail(response), _retry_after(response))
+        return response.json()["file_path"]
+
+    async def validate_kdp(self, file_path: str, reading_direction: str = "LTR") -> Dict[str, Any]:
+        return await self.agent("validate-kdp", {"file_path": file_path, "reading_direction": reading_direction})
+
+    async def export(self, format: str, chapters: List[Dict[str, Any]], title: Optional[str] = None,
+                     author: Optional[str] = None, trim_size: Optional[str] = None) -> Dict[str, Any]:
+        return await self.agent("export", _compact(format=format, chapters=chapters, title=title, author=author,
+                                                   trim_size=trim_size))
+
+    async def export_stream(self, meta: Dict[str, Any],
+                            chapters: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Upload chapters one NDJSON line at a time, so a long manuscript is never held in one body."""
+        async def body():
+            yield (json.dumps(meta) + "\n").encode()
+            if hasattr(chapters, "__aiter__"):
+                async for chapter in chapters:
+                    yield (json.dumps(chapter) + "\n").encode()
+            else:
+                for chapter in chapters:
+                    yield (json.dumps(chapter) + "\n").encode()
+
+        async with self._slots:
+            # A streamed body cannot be replayed, so this call is not retried
+            response = await self._http.post(self.base_url + "/api/export/stream", content=body(),
+                                             headers={"Content-Type": "application/x-ndjson"})
+        if response.status_code >= 400:
+            raise ArtisanError(response.status_code, _detail(response), _retry_after(response))
+        return response.json()
+
+    async def download(self, url_or_file_id: str) -> bytes:
+        path = url_or_file_id if url_or_file_id.startswith("/") else f"/api/export/files/{url_or_file_id}"
+        async with self._slots:
+            response = await self._send("GET", self.base_url + path)
+            try:
+                return await response.aread()
+            finally:
+                await response.aclose()
+
+    async def cloud_save(self, project_id: str, action: str = "save", data: Optional[Dict[str, Any]] = None,
+                         snapshot_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self.agent("cloud-save", _compact(project_id=project_id, action=action, data=data,
+                                                       snapshot_id=snapshot_id))
+
+    async def humanize(self, text: str, genre: Optional[str] = None) -> Dict[str, Any]:
+        return await self.agent("humanize", _compact(text=text, genre=genre))
+
+    async def estimate(self, agent: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return await self.request("POST", "/api/estimate", {"agent": agent, "payload": payload or {}})
+
+    # --- STREAMS ---
+    def puzzles(self, type: str = "sudoku", count: int = 1, difficulty: str = "MEDIUM", seed: Optional[int] = None,
+                **options) -> AsyncIterator[Dict[str, Any]]:
+        """Puzzle pages as they are generated: a meta line, one line per puzzle, then a summary."""
+        return self.stream("/api/puzzle-generate", _compact(type=type, count=count, difficulty=difficulty, seed=seed,
+                                                            **options))
+
+    async def batch_agents(self, items: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run {"agent", "payload"} items through /api/batch, BATCH_LIMIT per call with the
+        calls in flight concurrently. Results are yielded as they finish; "index" refers
+        to the position in `items`.
+        """
+        items = list(items)
+        results: "asyncio.Queue[Any]" = asyncio.Queue()
+
+        async def run_chunk(offset: int):
+            try:
+                async for result in self.stream("/api/batch", {"items": items[offset:offset + BATCH_LIMIT]}):
+                    result["index"] += offset
+                    await results.put(result)
+            except Exception as e:
+                await results.put(e)
+            await results.put(None)
+
+        tasks = [asyncio.ensure_future(run_chunk(o)) for o in range(0, len(items), BATCH_LIMIT)]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                result = await results.get()
+                if result is None:
+                    remaining -= 1
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # --- GRADIO REST API ---
+    async def text(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7) -> Dict[str, Any]:
+        return await self.request("POST", "/api/text", {"prompt": prompt, "max_tokens": max_tokens,
+                                                        "temperature": temperature}, gradio=True)
+
+    async def text_batch(self, prompts: List[str], max_tokens: int = 2000, temperature: float = 0.7) -> Dict[str, Any]:
+        return await self.request("POST", "/api/text/batch", {"prompts": prompts, "max_tokens": max_tokens,
+                                                              "temperature": temperature}, gradio=True)
+
+    async def image(self, prompt: str, negative_prompt: str = "", width: int = 1024, height: int = 1024,
+                    num_inference_steps: int = 4, line_art: Optional[str] = None,
+                    project_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self.request("POST", "/api/image", _compact(
+            prompt=prompt, negative_prompt=negative_prompt, width=width, height=height,
+            num_inference_steps=num_inference_steps, line_art=line_art, project_id=project_id,
+        ), gradio=True)
+
+    async def image_batch(self, prompts: List[str], negative_prompt: str = "", width: int = 1024, height: int = 1024,
+                          num_inference_steps: int = 4, line_art: Optional[str] = None,
+                          project_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self.request("POST", "/api/image/batch", _compact(
+            prompts=prompts, negative_prompt=negative_prompt, width=width, height=height,
+            num_inference_steps=num_inference_steps, line_art=line_art, project_id=project_id,
+        ), gradio=True)
+
+    async def image_variants(self, image_id: str, count: int = 8, strength: float = 0.5, prompt: Optional[str] = None,
+                             line_art: Optional[str] = None, project_id: Optional[str] = None) -> Dict[str, Any]:
+        return await self.request("POST", "/api/image/variants", _compact(
+            image_id=image_id, count=count, strength=strength, prompt=prompt, line_art=line_art,
+            project_id=project_id,
+        ), gradio=True)
+
+    async def models(self) -> Dict[str, Any]:
+        return await self.request("GET", "/api/models", gradio=True)
+
+    async def health(self, gradio: bool = False) -> Dict[str, Any]:
+        return await self.request("GET", "/health", gradio=gradio)
@@ -0,0 +1,125 @@
+"""
+Artisan AI - LoRA Serving Benchmark
+Compares three ways of serving a mixed batch of agent requests on one base model,
+using a tiny randomly initialised Llama on CPU (no download needed):
+
+  persona   - base model, persona line in every prompt (current behaviour)
+  grouped   - one adapter at a time, so the batch is split per agent
+  mixed     - multi-adapter LoRA, the whole batch in one forward pass
+
+Reports prompt tokens and generated tokens per second for each.
+
+Usage: python bench_lora.py [--requests 32] [--agents 8] [--new-tokens 32] [--rank 8]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import List, Optional
+
+import torch
+from safetensors.torch import save_file
+from transformers import LlamaConfig, LlamaForCausalLM
+
+from lora import LoRABank, TARGET_MODULES, strip_persona
+
+PERSONAS = ["SEO ARCHITECT", "HUMANITY PRO", "TREND AGENT", "BRAND LEAD", "LAB AGENT",
+            "COPYWRITER", "MARKETING LEAD", "NICHE RADAR AGENT"]
+TASKS = ["create KDP-optimized title and bullets for cozy mysteries",
+         "sanitize this text and improve emotional resonance: the rain fell on the harbor",
+         "scan for 2026 publishing trends in dark academia", "analyze positioning for Moonlit Press in romance"]
+
+
+def tiny_model() -> LlamaForCausalLM:
+    torch.manual_seed(0)
+    config = LlamaConfig(vocab_size=256, hidden_size=512, intermediate_size=1376, num_hidden_layers=4,
+                         num_attention_heads=8, num_key_value_heads=8, max_position_embeddings=512)
+    return LlamaForCausalLM(config).eval()
+
+
+def encode(prompts: List[str]) -> dict:
+    """Byte-level ids, left padded, so no tokenizer download is needed."""
+    ids = [list(p.encode("utf-8"))[:400] for p in prompts]
+    width = max(len(i) for i in ids)
+    input_ids = torch.tensor([[0] * (width - len(i)) + i for i in ids])
+    mask = torch.tensor([[0] * (width - len(i)) + [1] * len(i) for i in ids])
+    return {"input_ids": input_ids, "attention_mask": mask}
+
+
+def write_adapters(model: LlamaForCausalLM, root: str, names: List[str], rank: int):
+    for n, name in enumerate(names):
+        g = torch.Generator().manual_seed(n + 1)
+        weights = {}
+        for path, module in model.named_modules():
+            if path.split(".")[-1] in TARGET_MODULES:
+                weights[f"base_model.model.{path}.lora_A.weight"] = torch.randn(rank, module.in_features, generator=g) * 0.01
+                weights[f"base_model.model.{path}.lora_B.weight"] = torch.randn(module.out_features, rank, generator=g) * 0.01
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+        save_file(weights, os.path.join(root, name, "adapter_model.safetensors"))
+        with open(os.path.join(root, name, "adapter_config.json"), "w") as f:
+            json.dump({"r": rank, "lora_alpha": 2 * rank, "target_modules": list(TARGET_MODULES)}, f)
+
+
+def run(model, prompts: List[str], new_tokens: int, bank: Optional[LoRABank] = None,
+        adapters: Optional[List[Optional[str]]] = None) -> int:
+    inputs = encode(prompts)
+    with torch.inference_mode():
+        if bank is not None:
+            with bank.activate(adapters):
+                model.generate(**inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+                               do_sample=False, pad_token_id=0)
+        else:
+            model.generate(**inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+                           do_sample=False, pad_token_id=0)
+    return int(inputs["attention_mask"].sum())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--agents", type=int, default=8)
+    parser.add_argument("--new-tokens", type=int, default=32)
+    parser.add_argument("--rank", type=int, default=8)
+    args = parser.parse_args()
+    torch.set_num_threads(os.cpu_count() or 1)
+
+    rng = random.Random(7)
+    agents = [rng.randrange(args.agents) for _ in range(args.requests)]
+    persona_prompts = [f"As '{PERSONAS[a % len(PERSONAS)]}', {rng.choice(TASKS)}." for a in agents]
+    names = [f"agent-{a}" for a in agents]
+    generated = args.requests * args.new_tokens
+
+    model = tiny_model()
+    run(model, persona_prompts[:2], 2)   # warm-up
+    start = time.perf_counter()
+    prompt_tokens = run(model, persona_prompts, args.new_tokens)
+    results = {"persona": (prompt_tokens, time.perf_counter() - start)}
+
+    with tempfile.TemporaryDirectory() as root:
+        write_adapters(model, root, [f"agent-{a}" for a in range(args.agents)], args.rank)
+        bank = LoRABank(model, root, slots=args.agents + 1, max_rank=args.rank)
+        plain = [strip_persona(p) for p in persona_prompts]
+        bank.slots_for(sorted(set(names)))   # load every adapter before timing
+
+        start = time.perf_counter()
+        prompt_tokens = 0
+        for agent in sorted(set(names)):
+            rows = [i for i, n in enumerate(names) if n == agent]
+            prompt_tokens += run(model, [plain[i] for i in rows], args.new_tokens, bank, [agent] * len(rows))
+        results["grouped"] = (prompt_tokens, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        prompt_tokens = run(model, plain, args.new_tokens, bank, names)
+        results["mixed"] = (prompt_tokens, time.perf_counter() - start)
+
+    print(f"{args.requests} requests over {args.agents} agents, {args.new_tokens} new tokens each, rank {args.rank}")
+    print(f"{'mode':<10}{'prompt tok':>12}{'seconds':>10}{'gen tok/s':>12}")
+    for mode, (tokens, seconds) in results.items():
+        print(f"{mode:<10}{tokens:>12}{seconds:>10.2f}{generated / seconds:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
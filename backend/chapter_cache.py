@@ -0,0 +1,112 @@
+"""
+Artisan AI - Incremental Chapter Cache
+Keeps prior chapter expansions by outline-section hash so an edit to one beat of
+an outline only regenerates that beat.
+
+An outline is split into sections (blank-line separated paragraphs, or lines if
+there are no blank lines). Each section's expansion is stored under the hash of
+its normalized text. On re-expansion the old and new hash sequences are diffed;
+unchanged sections are reused, changed or new ones are regenerated with the
+neighbouring unchanged prose passed in as context, and the caller gets a patch.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Tuple
+
+CONTEXT_CHARS = 600
+
+
+def split_sections(outline: str) -> List[str]:
+    """Split an outline into beats: paragraphs if present, otherwise lines."""
+    outline = (outline or "").strip()
+    if not outline:
+        return []
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", outline) if p.strip()]
+    if len(paragraphs) > 1:
+        return paragraphs
+    return [line.strip() for line in outline.splitlines() if line.strip()]
+
+
+def section_hash(text: str) -> str:
+    normalized = " ".join(text.split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class ChapterPlan:
+    """Which sections to keep and which to regenerate for one re-expansion."""
+
+    def __init__(self, key: Tuple[str, str], sections: List[str], hashes: List[str],
+                 reused: Dict[int, str], regenerate: List[int], opcodes: List[Tuple[str, int, int, int, int]]):
+        self.key = key
+        self.sections = sections
+        self.hashes = hashes
+        self.reused = reused          # new index -> previously generated text
+        self.regenerate = regenerate  # new indices that need the model
+        self.opcodes = opcodes        # difflib opcodes, old sections -> new sections
+
+    def context(self, index: int) -> Tuple[str, str]:
+        """Closest unchanged prose before and after `index`, trimmed for the prompt."""
+        before = after = ""
+        for i in range(index - 1, -1, -1):
+            if i in self.reused:
+                before = self.reused[i][-CONTEXT_CHARS:]
+                break
+        for i in range(index + 1, len(self.sections)):
+            if i in self.reused:
+                after = self.reused[i][:CONTEXT_CHARS]
+                break
+        return before, after
+
+
+class ChapterCache:
+    """Bounded LRU of chapter states keyed by (tenant, chapter_id)."""
+
+    def __init__(self, max_chapters: int = 2000):
+        self.max_chapters = max_chapters
+        self._chapters: "OrderedDict[Tuple[str, str], List[Tuple[str, str]]]" = OrderedDict()
+
+    def plan(self, tenant: str, chapter_id: str, outline: str) -> ChapterPlan:
+        key = (tenant, chapter_id)
+        sections = split_sections(outline)
+        hashes = [section_hash(s) for s in sections]
+        previous = self._chapters.get(key, [])
+        old_hashes = [h for h, _ in previous]
+
+        reused: Dict[int, str] = {}
+        regenerate: List[int] = []
+        opcodes = SequenceMatcher(a=old_hashes, b=hashes, autojunk=False).get_opcodes()
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == "equal":
+                for offset in range(j2 - j1):
+                    reused[j1 + offset] = previous[i1 + offset][1]
+            else:
+                regenerate.extend(range(j1, j2))
+        return ChapterPlan(key, sections, hashes, reused, regenerate, opcodes)
+
+    def commit(self, plan: ChapterPlan, generated: Dict[int, str]) -> List[Dict[str, Any]]:
+        """
+        Store the new chapter state and return a patch against the previous one.
+        Each entry replaces old sections [old_start, old_end) with `sections`.
+        """
+        state = [(h, plan.reused.get(i, generated.get(i, ""))) for i, h in enumerate(plan.hashes)]
+        patch: List[Dict[str, Any]] = [
+            {
+                "op": tag,
+                "old_start": i1, "old_end": i2,
+                "new_start": j1, "new_end": j2,
+                "sections": [state[j][1] for j in range(j1, j2)],
+            }
+            for tag, i1, i2, j1, j2 in plan.opcodes if tag != "equal"
+        ]
+
+        self._chapters[plan.key] = state
+        self._chapters.move_to_end(plan.key)
+        while len(self._chapters) > self.max_chapters:
+            self._chapters.popitem(last=False)
+        return patch
+
+    def text(self, tenant: str, chapter_id: str) -> str:
+        return "\n\n".join(t for _, t in self._chapters.get((tenant, chapter_id), []) if t)
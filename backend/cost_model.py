@@ -0,0 +1,300 @@
+"""
+Artisan AI - Cost Model & Admission Control
+Estimates what a request will cost before it runs, and admits, queues or rejects
+it against current capacity and the tenant's budget.
+
+Text:  tokens from the model's tokenizer (tokenization.py); FLOPs = 2 * params * tokens plus the
+       attention term; memory = KV cache (2 * layers * kv_heads * head_dim * bytes
+       per token) at max_tokens; GPU seconds = prefill + the decode steps the agent is
+       expected to take (its learned mean output, not max_tokens).
+Image: latent tokens = (w / patch) * (h / patch); FLOPs per step from the
+       transformer dimensions; memory = activations + VAE decode; GPU seconds
+       scaled from the measured 1024x1024 step time by FLOPs.
+
+Rejections carry the estimate and the largest request that would fit, so the
+client can split the work itself. No single request may need more than the largest
+ZeroGPU slot. Requests queued together share decode steps, so each one is charged
+its share of the batch (see `share` in AdmissionController.decide).
+"""
+
+import math
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from gpu_batching import DEFAULT_BUCKETS
+from scheduler import TokenBucket
+from tokenization import TokenService
+
+MB = 1024 ** 2
+GB = 1024 ** 3
+
+TEXT_DIMS: Dict[str, Dict[str, Any]] = {
+    "meta-llama/Llama-3-8B-Instruct": {"params": 8.03e9, "layers": 32, "hidden": 4096, "kv_heads": 8,
+                                       "head_dim": 128, "bytes": 2, "context": 8192},
+    "meta-llama/Llama-3.1-8B-Instruct": {"params": 8.03e9, "layers": 32, "hidden": 4096, "kv_heads": 8,
+                                         "head_dim": 128, "bytes": 2, "context": 131072},
+}
+IMAGE_DIMS: Dict[str, Dict[str, Any]] = {
+    "black-forest-labs/FLUX.1-schnell": {"params": 11.9e9, "layers": 57, "hidden": 3072, "patch": 16,
+                                         "text_tokens": 256, "bytes": 2},
+    "stabilityai/stable-diffusion-xl-base-1.0": {"params": 2.6e9, "layers": 70, "hidden": 1280, "patch": 16,
+                                                 "text_tokens": 77, "bytes": 2},
+}
+
+ACTIVATION_FACTOR = 40         # live activation tensors per latent token, in units of hidden * bytes
+VAE_BYTES_PER_PIXEL = 512      # decoder feature maps at full resolution
+
+DECODE_S = float(os.getenv("ARTISAN_GPU_DECODE_S", "0.03"))
+PREFILL_S = float(os.getenv("ARTISAN_GPU_PREFILL_S", "0.0005"))
+IMAGE_STEP_S = float(os.getenv("ARTISAN_GPU_STEP_S", "0.35"))      # at 1024x1024
+MAX_REQUEST_GB = float(os.getenv("ARTISAN_MAX_REQUEST_GB", "8"))
+MAX_REQUEST_GPU_S = float(os.getenv("ARTISAN_MAX_REQUEST_GPU_S", str(max(DEFAULT_BUCKETS))))
+MAX_BACKLOG_S = float(os.getenv("ARTISAN_MAX_BACKLOG_S", "300"))
+TENANT_GPU_S_PER_MIN = float(os.getenv("ARTISAN_TENANT_GPU_S_PER_MIN", "600"))
+EXPECTED_TOKENS = int(os.getenv("ARTISAN_EXPECTED_TOKENS", "1024"))   # until an agent's outputs are observed
+OUTPUT_ALPHA = 0.1             # EWMA weight of each observed output
+OUTPUT_MARGIN = 1.25           # charge a little above the mean output
+MIN_OUTPUT_SAMPLES = 5
+
+# Admission decisions made while serving the current request; the app middleware
+# installs a fresh list per request and reports them in a response header
+request_estimates: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("request_estimates", default=None)
+# Number of generations the current request submits together (batch items, chapter sections)
+request_share: ContextVar[int] = ContextVar("request_share", default=1)
+
+
+class CostRejected(Exception):
+    """Raised when a request does not fit. `status` is 413 (too big ever), 429 (tenant budget) or 503 (capacity)."""
+
+    def __init__(self, status: int, reason: str, estimate: Dict[str, Any], retry_after: Optional[float] = None,
+                 fits: Optional[Dict[str, Any]] = None):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.estimate = estimate
+        self.retry_after = retry_after
+        self.fits = fits
+
+    def detail(self) -> Dict[str, Any]:
+        out = {"error": self.reason, "estimate": self.estimate}
+        if self.fits:
+            out["max_fitting"] = self.fits
+        return out
+
+
+class CostModel:
+    def __init__(self, text_model: str = "meta-llama/Llama-3-8B-Instruct",
+                 image_model: str = "black-forest-labs/FLUX.1-schnell", tokens: Optional[TokenService] = None):
+        self.text_model = text_model
+        self.image_model = image_model
+        # Unknown repos are costed as the closest default rather than refused
+        self.text_dims = TEXT_DIMS.get(text_model, TEXT_DIMS["meta-llama/Llama-3-8B-Instruct"])
+        self.image_dims = IMAGE_DIMS.get(image_model, IMAGE_DIMS["black-forest-labs/FLUX.1-schnell"])
+        self.tokens = tokens or TokenService(text_model)
+        self._outputs: Dict[str, List[float]] = {}   # agent -> [mean output tokens, samples]
+        self._lock = threading.Lock()
+
+    # --- TEXT ---
+    def count_tokens(self, text: str) -> int:
+        return self.tokens.count(text)
+
+    def observe_output(self, agent: Optional[str], tokens: int):
+        """Learn how many tokens an agent really generates; most stop well before max_tokens."""
+        with self._lock:
+            entry = self._outputs.setdefault(agent or "*", [float(tokens), 0])
+            entry[0] += OUTPUT_ALPHA * (tokens - entry[0])
+            entry[1] += 1
+
+    def expected_tokens(self, agent: Optional[str], max_tokens: int) -> int:
+        with self._lock:
+            entry = self._outputs.get(agent or "*")
+        if entry is None or entry[1] < MIN_OUTPUT_SAMPLES:
+            return min(max_tokens, EXPECTED_TOKENS)
+        return min(max_tokens, math.ceil(entry[0] * OUTPUT_MARGIN))
+
+    def text(self, prompt: str, new_tokens: int, expected_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Cost of one generation capped at `new_tokens`; time and FLOPs at `expected_tokens` (default: the cap)."""
+        d = self.text_dims
+        p = self.count_tokens(prompt) + 16   # chat template
+        n = min(new_tokens, expected_tokens or new_tokens)
+        dense = 2 * d["params"] * (p + n)
+        # Attention: prefill is quadratic in the prompt, each decode step reads the whole context
+        attention = 4 * d["layers"] * d["hidden"] * (p * p / 2 + n * p + n * n / 2)
+        # Memory is reserved for the cap: the KV cache must be able to reach it
+        kv_bytes = 2 * d["layers"] * d["kv_heads"] * d["head_dim"] * d["bytes"] * (p + new_tokens)
+        return {
+            "kind": "text",
+            "prompt_tokens": p,
+            "new_tokens": new_tokens,
+            "expected_tokens": n,
+            "context": d["context"],
+            "tflops": round((dense + attention) / 1e12, 2),
+            "memory_mb": round(kv_bytes / MB, 1),
+            "gpu_seconds": round(p * PREFILL_S + n * DECODE_S, 2),
+        }
+
+    def text_limit(self, estimate: Dict[str, Any]) -> int:
+        """Most new tokens a single request may ask for with this prompt."""
+        d = self.text_dims
+        per_token = 2 * d["layers"] * d["kv_heads"] * d["head_dim"] * d["bytes"]
+        by_memory = int(MAX_REQUEST_GB * GB / per_token) - estimate["prompt_tokens"]
+        by_time = int((MAX_REQUEST_GPU_S - estimate["prompt_tokens"] * PREFILL_S) / DECODE_S)
+        by_context = d["context"] - estimate["prompt_tokens"]
+        return max(0, min(by_memory, by_time, by_context))
+
+    # --- IMAGE ---
+    def _step_flops(self, width: int, height: int) -> float:
+        d = self.image_dims
+        tokens = (width // d["patch"]) * (height // d["patch"]) + d["text_tokens"]
+        return 2 * d["params"] * tokens + 4 * d["layers"] * d["hidden"] * tokens * tokens
+
+    def image(self, width: int, height: int, steps: int, count: int = 1) -> Dict[str, Any]:
+        d = self.image_dims
+        latent = (width // d["patch"]) * (height // d["patch"])
+        flops = self._step_flops(width, height)
+        memory = (latent + d["text_tokens"]) * d["hidden"] * d["bytes"] * ACTIVATION_FACTOR + width * height * VAE_BYTES_PER_PIXEL
+        return {
+            "kind": "image",
+            "images": count,
+            "width": width,
+            "height": height,
+            "latent_tokens": latent,
+            "steps": steps,
+            "tflops": round(flops * steps * count / 1e12, 2),
+            "memory_mb": round(memory / MB, 1),   # per image; batches are split to fit
+            "gpu_seconds": round(IMAGE_STEP_S * steps * count * flops / self._step_flops(1024, 1024), 2),
+        }
+
+    def image_limit(self, width: int, height: int) -> Dict[str, int]:
+        """Largest width x height (multiples of 64, same aspect ratio) that fits the per-request memory cap."""
+        side = 64
+        while True:
+            nxt = side + 64
+            w, h = nxt, max(64, int(nxt * height / width) // 64 * 64)
+            if self.image(w, h, 1)["memory_mb"] * MB > MAX_REQUEST_GB * GB:
+                break
+            side = nxt
+        return {"width": side, "height": max(64, int(side * height / width) // 64 * 64)}
+
+    # --- PER-REQUEST CAPS ---
+    def check(self, estimate: Dict[str, Any]) -> None:
+        """Raise CostRejected(413) if no amount of waiting would let this request run."""
+        if estimate["kind"] == "text":
+            limit = self.text_limit(estimate)
+            if estimate["new_tokens"] > limit:
+                raise CostRejected(413, f"Request needs {estimate['new_tokens']} new tokens; at most {limit} fit "
+                                        f"in one call", estimate, fits={"new_tokens": limit})
+            return
+        if estimate["memory_mb"] * MB > MAX_REQUEST_GB * GB:
+            raise CostRejected(413, f"Image needs ~{estimate['memory_mb'] / 1024:.1f} GB; limit is "
+                                    f"{MAX_REQUEST_GB:g} GB per request", estimate,
+                               fits=self.image_limit(estimate["width"], estimate["height"]))
+        per_image = estimate["gpu_seconds"] / max(1, estimate["images"])
+        if per_image > MAX_REQUEST_GPU_S:
+            steps = max(1, int(MAX_REQUEST_GPU_S / per_image * estimate["steps"]))
+            raise CostRejected(413, f"Image needs ~{per_image:.0f} GPU seconds; limit is {MAX_REQUEST_GPU_S:g}",
+                               estimate, fits={"steps": steps})
+
+
+class AdmissionController:
+    """
+    Tracks the GPU seconds already admitted and charges each tenant's GPU-second
+    bucket. Admit when nothing is waiting, queue while the backlog stays under
+    MAX_BACKLOG_S, otherwise reject with Retry-After.
+
+    `speed` is for the simulator (app_mock.py), whose GPU seconds pass `speed` times
+    faster than wall-clock seconds: budgets refill and Retry-After shrinks to match.
+    """
+
+    def __init__(self, cost_model: CostModel, parallelism: int = 1, max_backlog_s: float = MAX_BACKLOG_S,
+                 tenant_gpu_s_per_min: float = TENANT_GPU_S_PER_MIN,
+                 tenant_weight: Optional[Callable[[str], float]] = None, speed: float = 1.0):
+        self.cost_model = cost_model
+        self.parallelism = max(1, parallelism)
+        self.max_backlog_s = max_backlog_s
+        self.tenant_gpu_s_per_min = tenant_gpu_s_per_min
+        self.tenant_weight = tenant_weight or (lambda tenant: 1.0)
+        self.speed = speed
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._backlog_s = 0.0
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {413: 0, 429: 0, 503: 0}
+
+    @property
+    def backlog_s(self) -> float:
+        """Wall-clock seconds of admitted work, given `parallelism` requests share one batch."""
+        return self._backlog_s / self.parallelism
+
+    def _bucket(self, tenant: str) -> TokenBucket:
+        if tenant not in self._buckets:
+            rate = self.tenant_gpu_s_per_min * self.tenant_weight(tenant)
+            self._buckets[tenant] = TokenBucket(rate * self.speed / 60.0, rate)
+        return self._buckets[tenant]
+
+    def _sweep(self):
+        # A full bucket is the same as a new one, so idle tenants cost nothing to forget
+        if len(self._buckets) > 1024:
+            for tenant in [t for t, b in self._buckets.items() if b.full()]:
+                del self._buckets[tenant]
+
+    def decide(self, tenant: str, estimate: Dict[str, Any], charge: bool = True, share: int = 1) -> Dict[str, Any]:
+        """
+        Admission decision for one estimate. With charge=False nothing is reserved (dry run).
+        `share` is how many requests are submitted together to run in one batch: they share
+        decode steps, so the tenant is charged 1/share of each one's GPU seconds.
+        """
+        charged = estimate["gpu_seconds"] / max(1, min(share, self.parallelism))
+        try:
+            self.cost_model.check(estimate)
+            with self._lock:
+                wait = self.backlog_s
+                if wait + estimate["gpu_seconds"] / self.parallelism > self.max_backlog_s and wait > 0:
+                    raise CostRejected(503, "Server is at capacity", estimate,
+                                       retry_after=max(1.0, (wait - self.max_backlog_s / 2) / self.speed))
+                self._sweep()
+                bucket = self._bucket(tenant)
+                retry = bucket.try_consume(charged) if charge else bucket.peek(charged)
+                if retry > 0:
+                    raise CostRejected(429, f"GPU budget exhausted for tenant '{tenant}'", estimate, retry_after=retry)
+                if charge:
+                    self._backlog_s += estimate["gpu_seconds"]
+                    if wait > 0:
+                        self.queued += 1
+                    else:
+                        self.admitted += 1
+        except CostRejected as e:
+            if charge:
+                self.rejected[e.status] += 1
+            raise
+        decision = {"decision": "queue" if wait > 0 else "admit", "estimated_wait_s": round(wait, 1),
+                    "charged_gpu_seconds": round(charged, 2), **estimate}
+        if charge and request_estimates.get() is not None:
+            request_estimates.get().append(decision)
+        return decision
+
+    @contextmanager
+    def admit(self, tenant: str, estimate: Dict[str, Any], share: int = 1) -> Iterator[Dict[str, Any]]:
+        """Reserve capacity for the duration of the request."""
+        decision = self.decide(tenant, estimate, share=share)
+        try:
+            yield decision
+        finally:
+            with self._lock:
+                # Rounded so float residue does not leave an idle server looking busy
+                self._backlog_s = max(0.0, round(self._backlog_s - estimate["gpu_seconds"], 6))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backlog_s": round(self.backlog_s, 1),
+            "max_backlog_s": self.max_backlog_s,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "limits": {"request_gb": MAX_REQUEST_GB, "request_gpu_s": MAX_REQUEST_GPU_S,
+                       "tenant_gpu_s_per_min": self.tenant_gpu_s_per_min},
+        }
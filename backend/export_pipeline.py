@@ -0,0 +1,605 @@
+"""
+Artisan AI - Streaming Manuscript Export
+Server-side PDF / EPUB / DOCX assembly with memory that does not grow with book length.
+
+Chapters are fed in one at a time and written straight to disk:
+- PDF: objects are streamed to the file as pages fill; only byte offsets and page
+  ids are kept for the final xref. Text is laid out with the embedded font's
+  metrics, gutter and margins follow kdp_rules.py.
+- EPUB / DOCX: zip entries are written per chapter; the DOCX body is spooled to a
+  temp file and copied in at the end.
+
+Fonts (parsed TrueType programs) and images (normalized to JPEG) are cached
+across exports: fonts in-process, images on disk keyed by content hash. Finished
+exports are deleted ARTISAN_EXPORT_TTL_H hours after they were last written, and
+cached images the same time after they were last used.
+"""
+
+import base64
+import hashlib
+import html
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from kdp_rules import KDP_LIMITS, VALID_TRIM_SIZES, get_gutter, is_left_page
+
+EXPORT_DIR = os.getenv("ARTISAN_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "artisan_exports"))
+CACHE_DIR = os.getenv("ARTISAN_EXPORT_CACHE", os.path.join(tempfile.gettempdir(), "artisan_export_cache"))
+FONT_CANDIDATES = [
+    os.getenv("ARTISAN_EXPORT_FONT", ""),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSerif-Regular.ttf",
+]
+SUPPORTED_FORMATS = ("pdf", "epub", "docx")
+EXPORT_TTL_S = float(os.getenv("ARTISAN_EXPORT_TTL_H", "24")) * 3600
+SWEEP_INTERVAL_S = 600.0
+# What a malformed chapter (bad base64, undecodable image, wrong field types) raises
+CHAPTER_ERRORS = (ValueError, TypeError, AttributeError, UnidentifiedImageError, Image.DecompressionBombError)
+
+# Helvetica AFM advance widths for 32..126, used only when no TrueType font is found
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+
+
+# --- SHARED CACHES ---
+class FontProgram:
+    """Metrics (and, for TrueType, the font file) for a WinAnsi simple font."""
+
+    def __init__(self, name: str, widths: List[int], data: Optional[bytes] = None,
+                 bbox: Tuple[int, int, int, int] = (-166, -225, 1000, 931),
+                 ascent: int = 718, descent: int = -207, cap_height: int = 718):
+        self.name = name
+        self.widths = widths  # 256 entries, 1/1000 em
+        self.data = data
+        self.bbox = bbox
+        self.ascent = ascent
+        self.descent = descent
+        self.cap_height = cap_height
+
+    def text_width(self, encoded: bytes, size: float) -> float:
+        w = self.widths
+        return sum(w[b] for b in encoded) * size / 1000.0
+
+
+_font_cache: Dict[str, FontProgram] = {}
+_font_lock = threading.Lock()
+
+
+def load_font() -> FontProgram:
+    """First available TrueType font, parsed once per process."""
+    with _font_lock:
+        for path in FONT_CANDIDATES:
+            if not path or not os.path.isfile(path):
+                continue
+            if path not in _font_cache:
+                _font_cache[path] = _parse_truetype(path)
+            return _font_cache[path]
+        if "Helvetica" not in _font_cache:
+            widths = [0] * 32 + _HELVETICA_WIDTHS + [556] * (256 - 127)
+            _font_cache["Helvetica"] = FontProgram("Helvetica", widths)
+        return _font_cache["Helvetica"]
+
+
+def _parse_truetype(path: str) -> FontProgram:
+    from fontTools.ttLib import TTFont
+
+    with open(path, "rb") as f:
+        data = f.read()
+    font = TTFont(BytesIO(data))
+    scale = 1000.0 / font["head"].unitsPerEm
+    cmap = font.getBestCmap()
+    hmtx = font["hmtx"]
+    widths = []
+    for code in range(256):
+        try:
+            char = bytes([code]).decode("cp1252")
+        except UnicodeDecodeError:
+            widths.append(0)
+            continue
+        glyph = cmap.get(ord(char))
+        widths.append(int(round(hmtx[glyph][0] * scale)) if glyph else 0)
+    head, hhea = font["head"], font["hhea"]
+    os2 = font["OS/2"] if "OS/2" in font else None
+    name = font["name"].getDebugName(6) or os.path.splitext(os.path.basename(path))[0]
+    return FontProgram(
+        name.replace(" ", ""),
+        widths,
+        data,
+        bbox=tuple(int(v * scale) for v in (head.xMin, head.yMin, head.xMax, head.yMax)),
+        ascent=int(hhea.ascent * scale),
+        descent=int(hhea.descent * scale),
+        cap_height=int(getattr(os2, "sCapHeight", hhea.ascent) * scale) if os2 else int(hhea.ascent * scale),
+    )
+
+
+class ImageCache:
+    """Disk-backed cache of images normalized to RGB JPEG, keyed by source hash."""
+
+    def __init__(self, root: str = CACHE_DIR):
+        self.root = os.path.join(root, "images")
+        os.makedirs(self.root, exist_ok=True)
+        self._sizes: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, source: str) -> Optional[Tuple[str, str, int, int]]:
+        """Accepts a data URI or bare base64 string. Returns (key, jpeg_path, w, h)."""
+        if not source:
+            return None
+        raw = base64.b64decode(source.split(",", 1)[-1])
+        key = hashlib.sha1(raw).hexdigest()
+        path = os.path.join(self.root, f"{key}.jpg")
+        with self._lock:
+            if key in self._sizes and os.path.isfile(path):
+                try:
+                    # The sweep ages cached images by last use, not by when they were made
+                    os.utime(path)
+                    return key, path, *self._sizes[key]
+                except FileNotFoundError:
+                    pass
+        img = Image.open(BytesIO(raw))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        img.save(tmp, format="JPEG", quality=90, dpi=(300, 300))
+        os.replace(tmp, path)
+        with self._lock:
+            self._sizes[key] = img.size
+        return key, path, *img.size
+
+    def sweep(self, max_age_s: float = EXPORT_TTL_S) -> int:
+        removed = sweep(self.root, max_age_s)
+        if removed:
+            with self._lock:
+                for key in [k for k in self._sizes if not os.path.isfile(os.path.join(self.root, f"{k}.jpg"))]:
+                    del self._sizes[key]
+        return removed
+
+
+image_cache = ImageCache()
+
+
+# --- PDF ---
+class StreamingPDFWriter:
+    """Minimal PDF 1.4 writer that flushes every object as soon as it is complete."""
+
+    FONT_SIZE = 11.0
+    LEADING = 15.0
+    TITLE_SIZE = 20.0
+
+    def __init__(self, path: str, title: str, author: str, trim_size: str, estimated_pages: int):
+        self.f = open(path, "wb")
+        self.offsets: Dict[int, int] = {}
+        self.next_id = 3  # 1 = catalog, 2 = page tree, written at close
+        self.page_ids: List[int] = []
+        self.images: Dict[str, Tuple[int, str]] = {}
+        self.title, self.author = title, author
+        w, h = VALID_TRIM_SIZES.get(trim_size, VALID_TRIM_SIZES['6" x 9" (Standard)'])
+        self.page_w, self.page_h = w * 72, h * 72
+        self.gutter = get_gutter(estimated_pages) * 72
+        self.outer = max(0.5, KDP_LIMITS["SAFETY_MARGIN"]) * 72
+        self.top = self.bottom = 0.75 * 72
+        self.font = load_font()
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.font_id = self._write_font()
+        self._lines: List[bytes] = []
+        self._page_images: Dict[str, int] = {}
+        self._y = 0.0
+        self._new_page()
+
+    def _alloc(self) -> int:
+        oid = self.next_id
+        self.next_id += 1
+        return oid
+
+    def _obj(self, oid: int, body: bytes, stream: Optional[bytes] = None):
+        self.offsets[oid] = self.f.tell()
+        self.f.write(f"{oid} 0 obj\n".encode())
+        self.f.write(body)
+        if stream is not None:
+            self.f.write(b"\nstream\n")
+            self.f.write(stream)
+            self.f.write(b"\nendstream")
+        self.f.write(b"\nendobj\n")
+
+    def _write_font(self) -> int:
+        font = self.font
+        font_id = self._alloc()
+        widths = " ".join(str(w) for w in font.widths[32:])
+        if font.data is None:
+            self._obj(font_id, f"<< /Type /Font /Subtype /Type1 /BaseFont /{font.name} "
+                               f"/Encoding /WinAnsiEncoding >>".encode())
+            return font_id
+        desc_id, file_id = self._alloc(), self._alloc()
+        self._obj(font_id, (f"<< /Type /Font /Subtype /TrueType /BaseFont /{font.name} /FirstChar 32 "
+                            f"/LastChar 255 /Widths [{widths}] /FontDescriptor {desc_id} 0 R "
+                            f"/Encoding /WinAnsiEncoding >>").encode())
+        bbox = " ".join(str(v) for v in font.bbox)
+        self._obj(desc_id, (f"<< /Type /FontDescriptor /FontName /{font.name} /Flags 34 /FontBBox [{bbox}] "
+                            f"/ItalicAngle 0 /Ascent {font.ascent} /Descent {font.descent} "
+                            f"/CapHeight {font.cap_height} /StemV 80 /FontFile2 {file_id} 0 R >>").encode())
+        packed = zlib.compress(font.data)
+        self._obj(file_id, f"<< /Length {len(packed)} /Length1 {len(font.data)} /Filter /FlateDecode >>".encode(),
+                  packed)
+        return font_id
+
+    # --- page assembly ---
+    def _page_number(self) -> int:
+        return len(self.page_ids) + 1
+
+    def _margins(self) -> Tuple[float, float]:
+        """(left, right) for the current page; the gutter sits on the spine side."""
+        if is_left_page(self._page_number()):
+            return self.outer, self.gutter
+        return self.gutter, self.outer
+
+    def _new_page(self):
+        self._lines = []
+        self._page_images = {}
+        self._y = self.page_h - self.top
+
+    def _flush_page(self):
+        left, right = self._margins()
+        footer = str(self._page_number()).encode("cp1252")
+        fx = left + (self.page_w - left - right - self.font.text_width(footer, 9)) / 2
+        self._lines.append(f"BT /F1 9 Tf {fx:.2f} {self.bottom / 2:.2f} Td (".encode() + footer + b") Tj ET")
+        content = zlib.compress(b"\n".join(self._lines))
+        content_id, page_id = self._alloc(), self._alloc()
+        self._obj(content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>".encode(), content)
+        xobjects = " ".join(f"/Im{oid} {oid} 0 R" for oid in self._page_images.values())
+        self._obj(page_id, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.page_w:.2f} {self.page_h:.2f}] "
+                            f"/Contents {content_id} 0 R /Resources << /Font << /F1 {self.font_id} 0 R >> "
+                            f"/XObject << {xobjects} >> >> >>").encode())
+        self.page_ids.append(page_id)
+        self._new_page()
+
+    def _ensure_space(self, height: float):
+        if self._y - height < self.bottom:
+            self._flush_page()
+
+    def _text_line(self, encoded: bytes, size: float, x: float):
+        escaped = encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        self._lines.append(f"BT /F1 {size:g} Tf {x:.2f} {self._y:.2f} Td (".encode() + escaped + b") Tj ET")
+
+    def _wrap(self, text: str, size: float, width: float, indent: float = 0.0) -> List[bytes]:
+        space = self.font.text_width(b" ", size)
+        lines, current, current_w = [], [], indent
+        for word in text.split():
+            enc = word.encode("cp1252", errors="replace")
+            ww = self.font.text_width(enc, size)
+            if current and current_w + space + ww > width:
+                lines.append(b" ".join(current))
+                current, current_w = [enc], ww
+            else:
+                current_w += (space if current else 0) + ww
+                current.append(enc)
+        if current:
+            lines.append(b" ".join(current))
+        return lines
+
+    def _image(self, source: str):
+        cached = image_cache.get(source)
+        if cached is None:
+            return
+        key, path, w, h = cached
+        if key not in self.images:
+            oid = self._alloc()
+            with open(path, "rb") as f:
+                data = f.read()
+            self._obj(oid, (f"<< /Type /XObject /Subtype /Image /Width {w} /Height {h} /ColorSpace /DeviceRGB "
+                            f"/BitsPerComponent 8 /Filter /DCTDecode /Length {len(data)} >>").encode(), data)
+            self.images[key] = (oid, key)
+        oid = self.images[key][0]
+        left, right = self._margins()
+        box_w = self.page_w - left - right
+        draw_w = min(box_w, w / KDP_LIMITS["MIN_IMAGE_DPI"] * 72)
+        draw_h = draw_w * h / w
+        max_h = (self.page_h - self.top - self.bottom) * 0.6
+        if draw_h > max_h:
+            draw_w, draw_h = draw_w * max_h / draw_h, max_h
+        self._ensure_space(draw_h + self.LEADING)
+        left, right = self._margins()
+        x = left + (self.page_w - left - right - draw_w) / 2
+        self._y -= draw_h
+        self._page_images[key] = oid
+        self._lines.append(f"q {draw_w:.2f} 0 0 {draw_h:.2f} {x:.2f} {self._y:.2f} cm /Im{oid} Do Q".encode())
+        self._y -= self.LEADING
+
+    def add_chapter(self, chapter: Dict[str, Any]):
+        if self._lines:
+            self._flush_page()
+            # Chapters open on a right-hand page
+            if is_left_page(self._page_number()):
+                self._flush_page()
+        left, right = self._margins()
+        heading = f"Chapter {chapter.get('chapter', '')}".strip()
+        title = chapter.get("title") or ""
+        self._y -= self.TITLE_SIZE * 2
+        for text, size in ((heading, 12.0), (title, self.TITLE_SIZE)):
+            for line in self._wrap(text, size, self.page_w - left - right):
+                x = left + (self.page_w - left - right - self.font.text_width(line, size)) / 2
+                self._text_line(line, size, x)
+                self._y -= size * 1.4
+        self._y -= self.LEADING
+        if chapter.get("image"):
+            self._image(chapter["image"])
+
+        indent = self.FONT_SIZE * 1.5
+        for paragraph in (chapter.get("content") or "").split("\n"):
+            if not paragraph.strip():
+                continue
+            left, right = self._margins()
+            for i, line in enumerate(self._wrap(paragraph, self.FONT_SIZE, self.page_w - left - right, indent)):
+                self._ensure_space(self.LEADING)
+                left, _ = self._margins()
+                self._text_line(line, self.FONT_SIZE, left + (indent if i == 0 else 0))
+                self._y -= self.LEADING
+
+    def close(self):
+        if self._lines:
+            self._flush_page()
+        kids = " ".join(f"{pid} 0 R" for pid in self.page_ids)
+        self._obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+        self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        info_id = self._alloc()
+        info = f"<< /Title ({_pdf_escape(self.title)}) /Author ({_pdf_escape(self.author)}) /Producer (Artisan AI) >>"
+        self._obj(info_id, info.encode("cp1252", errors="replace"))
+        xref_at = self.f.tell()
+        self.f.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+        for oid in range(1, self.next_id):
+            self.f.write(f"{self.offsets[oid]:010d} 00000 n \n".encode())
+        self.f.write(f"trailer\n<< /Size {self.next_id} /Root 1 0 R /Info {info_id} 0 R >>\n"
+                     f"startxref\n{xref_at}\n%%EOF\n".encode())
+        self.f.close()
+        return {"pages": len(self.page_ids)}
+
+
+def _pdf_escape(text: str) -> str:
+    return (text or "").replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+# --- EPUB ---
+class StreamingEPUBWriter:
+    """EPUB 3 writer; each chapter becomes its own zip entry as it arrives."""
+
+    def __init__(self, path: str, title: str, author: str, **_):
+        self.zf = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        self.title, self.author = title, author
+        self.chapters: List[Tuple[str, str]] = []
+        self.images: Dict[str, str] = {}
+        self.zf.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        self.zf.writestr("META-INF/container.xml", (
+            '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>'
+            "</rootfiles></container>"))
+        self.zf.writestr("OEBPS/styles.css", (
+            'body { font-family: "Times New Roman", serif; line-height: 1.6; }\n'
+            "h1, h2 { text-align: center; }\n.chapter-image { text-align: center; }\n"
+            ".chapter-image img { max-width: 100%; }\np { text-indent: 1.5em; margin: 0; text-align: justify; }\n"))
+
+    def add_chapter(self, chapter: Dict[str, Any]):
+        n = len(self.chapters) + 1
+        title = html.escape(chapter.get("title") or f"Chapter {n}")
+        name = f"ch{n}.xhtml"
+        parts = [
+            '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml">'
+            f'<head><title>{title}</title><link rel="stylesheet" href="styles.css"/></head><body>'
+            f"<h2>Chapter {html.escape(str(chapter.get('chapter', n)))}</h2><h1>{title}</h1>"
+        ]
+        if chapter.get("image"):
+            cached = image_cache.get(chapter["image"])
+            if cached:
+                key, path = cached[0], cached[1]
+                if key not in self.images:
+                    self.images[key] = f"images/{key}.jpg"
+                    self.zf.write(path, f"OEBPS/{self.images[key]}")
+                parts.append(f'<div class="chapter-image"><img src="{self.images[key]}" alt="{title}"/></div>')
+        for paragraph in (chapter.get("content") or "").split("\n"):
+            if paragraph.strip():
+                parts.append(f"<p>{html.escape(paragraph.strip())}</p>")
+        parts.append("</body></html>")
+        self.zf.writestr(f"OEBPS/{name}", "".join(parts))
+        self.chapters.append((name, title))
+
+    def close(self):
+        book_id = uuid.uuid4()
+        items = "".join(f'<item id="c{i}" href="{name}" media-type="application/xhtml+xml"/>'
+                        for i, (name, _) in enumerate(self.chapters))
+        items += "".join(f'<item id="i{key[:12]}" href="{href}" media-type="image/jpeg"/>'
+                         for key, href in self.images.items())
+        spine = "".join(f'<itemref idref="c{i}"/>' for i in range(len(self.chapters)))
+        self.zf.writestr("OEBPS/content.opf", (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="bookid">'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+            f'<dc:identifier id="bookid">urn:uuid:{book_id}</dc:identifier>'
+            f"<dc:title>{html.escape(self.title)}</dc:title><dc:creator>{html.escape(self.author)}</dc:creator>"
+            "<dc:language>en</dc:language></metadata><manifest>"
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>'
+            '<item id="css" href="styles.css" media-type="text/css"/>'
+            f"{items}</manifest><spine>{spine}</spine></package>"))
+        toc = "".join(f'<li><a href="{name}">{title}</a></li>' for name, title in self.chapters)
+        self.zf.writestr("OEBPS/nav.xhtml", (
+            '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml" '
+            'xmlns:epub="http://www.idpf.org/2007/ops"><head><title>Contents</title></head><body>'
+            f'<nav epub:type="toc"><ol>{toc}</ol></nav></body></html>'))
+        self.zf.close()
+        return {"chapters": len(self.chapters)}
+
+
+# --- DOCX ---
+class StreamingDOCXWriter:
+    """DOCX writer; document.xml is spooled to a temp file, images go straight into the zip."""
+
+    EMU_PER_INCH = 914400
+
+    def __init__(self, path: str, title: str, author: str, **_):
+        self.zf = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        self.title, self.author = title, author
+        self.body = tempfile.NamedTemporaryFile("w+", encoding="utf-8", suffix=".xml", delete=False)
+        self.images: Dict[str, str] = {}
+        self.chapters = 0
+        self.body.write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+            'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" '
+            'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+            'xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"><w:body>')
+
+    @staticmethod
+    def _para(text: str, style: Optional[str] = None, page_break: bool = False) -> str:
+        props = f'<w:pPr><w:pStyle w:val="{style}"/>{"<w:pageBreakBefore/>" if page_break else ""}</w:pPr>' \
+            if style else ""
+        return f'<w:p>{props}<w:r><w:t xml:space="preserve">{html.escape(text)}</w:t></w:r></w:p>'
+
+    def _picture(self, rel_id: str, w: int, h: int) -> str:
+        cx = int(min(4.5, w / 300) * self.EMU_PER_INCH)
+        cy = int(cx * h / w)
+        n = len(self.images)
+        return (f'<w:p><w:r><w:drawing><wp:inline><wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{n}" name="img{n}"/>'
+                '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture"><pic:pic>'
+                f'<pic:nvPicPr><pic:cNvPr id="{n}" name="img{n}"/><pic:cNvPicPr/></pic:nvPicPr>'
+                f'<pic:blipFill><a:blip r:embed="{rel_id}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+                f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+                '<a:prstGeom prst="rect"/></pic:spPr></pic:pic></a:graphicData></a:graphic></wp:inline>'
+                "</w:drawing></w:r></w:p>")
+
+    def add_chapter(self, chapter: Dict[str, Any]):
+        self.chapters += 1
+        self.body.write(self._para(f"Chapter {chapter.get('chapter', self.chapters)}", "Heading2", page_break=True))
+        self.body.write(self._para(chapter.get("title") or "", "Heading1"))
+        if chapter.get("image"):
+            cached = image_cache.get(chapter["image"])
+            if cached:
+                key, path, w, h = cached
+                if key not in self.images:
+                    self.images[key] = f"rIdImg{len(self.images) + 1}"
+                    self.zf.write(path, f"word/media/{key}.jpg")
+                self.body.write(self._picture(self.images[key], w, h))
+        for paragraph in (chapter.get("content") or "").split("\n"):
+            if paragraph.strip():
+                self.body.write(self._para(paragraph.strip()))
+
+    def close(self):
+        self.body.write("<w:sectPr/></w:body></w:document>")
+        self.body.close()
+        self.zf.write(self.body.name, "word/document.xml")
+        os.unlink(self.body.name)
+        rels = "".join(
+            f'<Relationship Id="{rid}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" '
+            f'Target="media/{key}.jpg"/>' for key, rid in self.images.items())
+        self.zf.writestr("word/_rels/document.xml.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{rels}</Relationships>'))
+        self.zf.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>'))
+        self.zf.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Default Extension="jpg" ContentType="image/jpeg"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            "</Types>"))
+        self.zf.close()
+        return {"chapters": self.chapters}
+
+
+WRITERS = {"pdf": StreamingPDFWriter, "epub": StreamingEPUBWriter, "docx": StreamingDOCXWriter}
+
+
+class ExportJob:
+    """One export in progress. Feed chapters with add_chapter(), then finish()."""
+
+    def __init__(self, fmt: str, title: str = "Untitled", author: str = "", trim_size: str = '6" x 9" (Standard)',
+                 estimated_pages: Optional[int] = None, total_words: Optional[int] = None):
+        fmt = (fmt or "pdf").lower()
+        if fmt not in WRITERS:
+            raise ValueError(f"Unsupported export format '{fmt}' (expected one of {', '.join(SUPPORTED_FORMATS)})")
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        if not estimated_pages:
+            # Same estimate as kdpValidator.ts checkPageCount; worst-case gutter if unknown
+            estimated_pages = (total_words // 250 + 10) if total_words else KDP_LIMITS["MAX_PAGES_STANDARD"]
+        sweep(EXPORT_DIR, EXPORT_TTL_S)
+        image_cache.sweep()
+        self.format = fmt
+        self.chapters = 0
+        self.file_id = f"{uuid.uuid4().hex}.{fmt}"
+        self.path = os.path.join(EXPORT_DIR, self.file_id)
+        self.writer = WRITERS[fmt](self.path, title=title, author=author, trim_size=trim_size,
+                                   estimated_pages=estimated_pages)
+
+    def add_chapter(self, chapter: Dict[str, Any]):
+        """Lay out one chapter; ValueError naming the chapter if it cannot be rendered."""
+        self.chapters += 1
+        try:
+            self.writer.add_chapter(chapter)
+        except CHAPTER_ERRORS as e:
+            label = chapter.get("chapter") if isinstance(chapter, dict) else None
+            reason = "image could not be decoded" if isinstance(e, UnidentifiedImageError) else e
+            raise ValueError(f"Chapter {label or self.chapters}: {reason}") from e
+
+    def finish(self) -> Dict[str, Any]:
+        info = self.writer.close()
+        return {"file_id": self.file_id, "format": self.format, "bytes": os.path.getsize(self.path), **info}
+
+    def abort(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass  # a writer that failed mid-chapter may not close cleanly; the file goes either way
+        finally:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+_last_sweep: Dict[str, float] = {}
+_sweep_lock = threading.Lock()
+
+
+def sweep(root: str, max_age_s: float, interval_s: float = SWEEP_INTERVAL_S) -> int:
+    """Delete files in `root` not written for `max_age_s`, at most once per `interval_s`."""
+    now = time.time()
+    with _sweep_lock:
+        if now - _last_sweep.get(root, 0.0) < interval_s:
+            return 0
+        _last_sweep[root] = now
+    removed = 0
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime > max_age_s:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def export_path(file_id: str) -> Optional[str]:
+    """Path of a finished export, or None if the id is unknown or malformed."""
+    name = os.path.basename(file_id)
+    path = os.path.join(EXPORT_DIR, name)
+    return path if name == file_id and os.path.isfile(path) else None
@@ -0,0 +1,207 @@
+"""
+Artisan AI - ZeroGPU Slot Budgeting
+Packs queued requests into as few @spaces.GPU invocations as possible.
+
+Each ZeroGPU call pays an attach overhead and reserves its `duration` against the
+quota, whatever the job size. The batcher collects requests for a short window,
+groups compatible ones, estimates each group's GPU seconds and picks the smallest
+duration bucket that fits. Groups that would overrun the largest bucket spill into
+a second invocation.
+
+With a `size_key`, an invocation that runs out of memory is split in half and
+retried, and groups are capped at the batch size learned to fit for their sequence
+length or resolution bucket (see adaptive_batch.py).
+
+The GPU decorator is injected, so the whole layer runs with `spaces` stubbed out:
+
+    batcher = GPUBatcher(run, estimate, gpu_decorator=lambda duration: (lambda f: f))
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from adaptive_batch import BatchSizeLimiter, run_splitting
+
+DEFAULT_BUCKETS = (15, 30, 60, 90, 120)
+
+
+class SlotOverrun(ValueError):
+    """An item whose estimate alone exceeds the largest duration bucket."""
+
+    def __init__(self, seconds: float, budget: float):
+        super().__init__(f"Request needs ~{seconds:.0f} GPU seconds; the largest slot allows {budget:g}")
+        self.seconds = seconds
+        self.budget = budget
+
+
+class GPUBatcher:
+    """
+    run_batch(items) -> results     executes one invocation worth of items on the GPU
+    estimate(items) -> seconds      predicted GPU time for running `items` together
+    group_key(item) -> hashable     items sharing a key can be run in one call
+    size_key(items) -> (family, n)  memory bucket of a batch, e.g. ("image", width * height)
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        estimate: Callable[[Sequence[Any]], float],
+        gpu_decorator: Callable[..., Callable],
+        group_key: Callable[[Any], Hashable] = lambda item: None,
+        buckets: Sequence[int] = DEFAULT_BUCKETS,
+        overhead_s: float = 2.0,
+        window_s: float = 0.05,
+        max_batch: int = 8,
+        on_error: Optional[Callable[[Exception], Any]] = None,
+        size_key: Optional[Callable[[Sequence[Any]], Hashable]] = None,
+    ):
+        self.run_batch = run_batch
+        self.estimate = estimate
+        self.group_key = group_key
+        self.buckets = tuple(sorted(buckets))
+        self.overhead_s = overhead_s
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self.on_error = on_error or (lambda e: {"success": False, "error": str(e)})
+        self.size_key = size_key
+        self.limiter = BatchSizeLimiter(max_batch) if size_key else None
+
+        # ZeroGPU registers decorated functions up front, so build one per bucket now
+        self._runners = {d: gpu_decorator(duration=d)(self._invoke) for d in self.buckets}
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.metrics = {"items": 0, "invocations": 0, "reserved_gpu_s": 0, "estimated_gpu_s": 0.0}
+
+    @staticmethod
+    def _invoke(run_batch, items):
+        return run_batch(items)
+
+    # --- PLANNING ---
+    @property
+    def budget(self) -> float:
+        """GPU seconds available to one invocation after attach overhead."""
+        return self.buckets[-1] - self.overhead_s
+
+    def duration_for(self, seconds: float) -> int:
+        """Smallest bucket covering `seconds` plus attach overhead; SlotOverrun if none does."""
+        needed = seconds + self.overhead_s
+        for d in self.buckets:
+            if d >= needed:
+                return d
+        raise SlotOverrun(seconds, self.budget)
+
+    def _pack(self, items: Sequence[Any]) -> List[List[int]]:
+        """Group compatible items and split each group at the budget; returns index lists."""
+        groups: Dict[Hashable, List[int]] = {}
+        for idx, item in enumerate(items):
+            groups.setdefault(self.group_key(item), []).append(idx)
+
+        budget = self.budget
+        invocations = []
+        for group in groups.values():
+            current: List[int] = []
+            for idx in group:
+                candidate = current + [idx]
+                batch = [items[i] for i in candidate]
+                too_big = (len(candidate) > self.max_batch or self.estimate(batch) > budget
+                           or (self.limiter is not None and len(candidate) > self.limiter.limit(self.size_key(batch))))
+                if current and too_big:
+                    # Spill to a second invocation rather than overrun the slot
+                    invocations.append(current)
+                    current = [idx]
+                else:
+                    current = candidate
+            if current:
+                invocations.append(current)
+        return invocations
+
+    def plan(self, items: Sequence[Any]) -> List[Tuple[int, List[Any]]]:
+        """Split items into (duration, batch) invocations that fit the budget."""
+        plan = []
+        for indices in self._pack(items):
+            batch = [items[i] for i in indices]
+            plan.append((self.duration_for(self.estimate(batch)), batch))
+        return plan
+
+    # --- EXECUTION ---
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        seconds = self.estimate([item])
+        if seconds > self.budget:
+            future.set_result(self.on_error(SlotOverrun(seconds, self.budget)))
+            return future
+        self._queue.put((item, future))
+        self._ensure_thread()
+        return future
+
+    def run(self, item: Any) -> Any:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(item).result()
+
+    def run_many(self, items: Sequence[Any]) -> List[Any]:
+        futures = [self.submit(item) for item in items]
+        return [f.result() for f in futures]
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="gpu-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[Any, Future]]:
+        pending = [self._queue.get()]
+        deadline = time.monotonic() + self.window_s
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Anything else already waiting rides along without extending the window
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                return pending
+
+    def _loop(self):
+        while True:
+            pending = self._collect()
+            items = [item for item, _ in pending]
+            for indices in self._pack(items):
+                batch = [items[i] for i in indices]
+                duration = self.duration_for(self.estimate(batch))
+                self.dispatch(duration, batch, [pending[i][1] for i in indices])
+
+    def _call(self, batch: List[Any], duration: Optional[int] = None) -> List[Any]:
+        duration = duration or self.duration_for(self.estimate(batch))
+        self.metrics["invocations"] += 1
+        self.metrics["items"] += len(batch)
+        self.metrics["reserved_gpu_s"] += duration
+        self.metrics["estimated_gpu_s"] += self.estimate(batch)
+        return self._runners[duration](self.run_batch, batch)
+
+    def dispatch(self, duration: int, batch: List[Any], futures: List[Future]):
+        try:
+            if self.limiter is None:
+                results = self._call(batch, duration)
+            else:
+                # Halves of a batch that ran out of memory go out as smaller invocations
+                results = run_splitting(self._call, batch, self.limiter, self.size_key, self.on_error)
+        except Exception as e:
+            results = [self.on_error(e)] * len(batch)
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        m = dict(self.metrics)
+        m["reserved_gpu_s_per_item"] = round(m["reserved_gpu_s"] / m["items"], 2) if m["items"] else None
+        if self.limiter:
+            m["batch_limits"] = self.limiter.stats()
+        return m
@@ -0,0 +1,181 @@
+"""
+Artisan AI - Prompt Embedding & Latent Cache
+Covers and illustrations are regenerated again and again with the same title,
+style prompt and negative prompt, changing only the seed or one word.
+
+- Prompt embeddings: text-encoder outputs (CLIP / T5) are cached per model,
+  prompt and negative prompt, so a repeated prompt skips the text encoders.
+- Variants: the final latents of every image are kept under an image id.
+  "More like this" re-noises them to `strength` and denoises only that tail of
+  the schedule (img2img straight from latents, no VAE encode), so each variant
+  costs about `strength` of a full generation and keeps the composition.
+
+Entries are CPU tensors held by the calling process and shipped to the GPU call
+inside the request items, so they survive ZeroGPU running the call in another
+process. Both caches are LRU-bounded by bytes. Pipelines other than Flux and
+SDXL run uncached.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+MB = 1024 ** 2
+EMBED_CACHE_MB = float(os.getenv("ARTISAN_EMBED_CACHE_MB", "1024"))
+LATENT_CACHE_MB = float(os.getenv("ARTISAN_LATENT_CACHE_MB", "512"))
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return 0
+
+
+def embed_key(model: str, prompt: str, negative_prompt: str) -> str:
+    return hashlib.sha256(json.dumps([model, prompt, negative_prompt]).encode()).hexdigest()
+
+
+class TensorLRU:
+    """Dicts of CPU tensors, evicted least-recently-used beyond `max_bytes`."""
+
+    def __init__(self, max_bytes: float):
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "mb": round(self._bytes / MB, 1),
+                    "max_mb": round(self.max_bytes / MB, 1),
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else None}
+
+
+# --- PIPELINES ---
+def pipeline_kind(pipe: Any) -> Optional[str]:
+    name = type(pipe).__name__
+    if name.startswith("Flux"):
+        return "flux"
+    if name.startswith("StableDiffusionXL"):
+        return "sdxl"
+    return None
+
+
+def supports(pipe: Any) -> bool:
+    return pipeline_kind(pipe) is not None
+
+
+def encode_prompts(pipe: Any, prompts: List[str], negative_prompt: str, call: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Text-encoder outputs for each prompt, as CPU tensors ready to pass back as *_embeds."""
+    device = pipe._execution_device
+    with torch.no_grad():
+        if pipeline_kind(pipe) == "flux":
+            # Schnell ignores the negative prompt (no true CFG), so it is not encoded
+            length = {"max_sequence_length": call["max_sequence_length"]} if "max_sequence_length" in call else {}
+            embeds, pooled, _ = pipe.encode_prompt(prompt=prompts, prompt_2=None, device=device, **length)
+            tensors = {"prompt_embeds": embeds, "pooled_prompt_embeds": pooled}
+        else:
+            cfg = call.get("guidance_scale", 5.0) > 1
+            embeds, negative, pooled, negative_pooled = pipe.encode_prompt(
+                prompt=prompts, device=device, do_classifier_free_guidance=cfg,
+                negative_prompt=[negative_prompt] * len(prompts),
+            )
+            tensors = {"prompt_embeds": embeds, "pooled_prompt_embeds": pooled}
+            if cfg:
+                tensors.update(negative_prompt_embeds=negative, negative_pooled_prompt_embeds=negative_pooled)
+    return [{k: v[i:i + 1].to("cpu", copy=True) for k, v in tensors.items()} for i in range(len(prompts))]
+
+
+def embed_kwargs(pipe: Any, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Stack per-prompt embeddings into pipeline call kwargs on the pipeline's device."""
+    device = pipe._execution_device
+    return {k: torch.cat([row[k] for row in rows]).to(device) for k in rows[0]}
+
+
+class LatentCapture:
+    """callback_on_step_end that keeps the latest latents; after the call they are the final ones."""
+
+    def __init__(self):
+        self.latents: Optional[torch.Tensor] = None
+
+    def __call__(self, pipe, step, timestep, callback_kwargs):
+        self.latents = callback_kwargs["latents"]
+        return {}
+
+    def rows(self, pipe: Any, width: int, height: int) -> List[Optional[torch.Tensor]]:
+        """Final latents per image, unpacked to (1, C, h, w) in the space img2img accepts."""
+        latents = self.latents
+        if latents is None:
+            return []
+        if pipeline_kind(pipe) == "flux":
+            latents = pipe._unpack_latents(latents, height, width, pipe.vae_scale_factor)
+        return [latents[i:i + 1].to("cpu", copy=True) for i in range(latents.shape[0])]
+
+
+_img2img: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+_img2img_lock = threading.Lock()
+
+
+def img2img(pipe: Any) -> Any:
+    """Image-to-image pipeline sharing the loaded pipeline's modules (no extra weights)."""
+    with _img2img_lock:
+        runner = _img2img.get(pipe)
+        if runner is None:
+            from diffusers import AutoPipelineForImage2Image
+            runner = _img2img[pipe] = AutoPipelineForImage2Image.from_pipe(pipe)
+        return runner
+
+
+def variant_kwargs(pipe: Any, kwargs: Dict[str, Any], latents: List[torch.Tensor], strength: float) -> Dict[str, Any]:
+    kwargs = dict(kwargs, image=torch.cat(latents).to(pipe._execution_device, pipe.dtype), strength=strength)
+    if pipeline_kind(pipe) == "sdxl":
+        # SDXL img2img takes its size from the image
+        kwargs.pop("width", None)
+        kwargs.pop("height", None)
+    return kwargs
+
+
+def variant_steps(steps: int, strength: float) -> int:
+    """Schedule length for a variant: at least one step must remain after cutting to `strength`."""
+    return max(steps, math.ceil(1 / strength))
+
+
+def denoised_steps(steps: int, strength: float) -> int:
+    """Steps img2img runs for a schedule of `steps` at `strength` (Flux rounds up, SDXL down)."""
+    return max(1, min(steps, math.ceil(steps * strength - 1e-9)))
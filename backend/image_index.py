@@ -0,0 +1,172 @@
+"""
+Artisan AI - Perceptual Image Index
+Near-duplicate detection for generated pages, designs and covers.
+
+Images are reduced to a 64-bit perceptual hash (pHash: sign of the low-frequency
+DCT block against its median; dHash is available too). Lookups use multi-index
+hashing: the hash is split into 4 x 16-bit substrings, each with its own table.
+If two hashes are within Hamming distance r, at least one substring is within
+r // 4 (pigeonhole), so a query only probes the few substring neighbours and
+verifies candidates with a popcount instead of scanning the index.
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from itertools import combinations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+from scipy.fft import dctn
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+DEFAULT_RADIUS = 10   # ~85% of bits equal; same composition with small detail changes
+
+
+def phash(image: Image.Image) -> int:
+    gray = np.asarray(image.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float32)
+    block = dctn(gray, norm="ortho")[:8, :8].ravel()
+    bits = block > np.median(block[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash(image: Image.Image) -> int:
+    gray = np.asarray(image.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (gray[:, 1:] > gray[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+HASHERS = {"phash": phash, "dhash": dhash}
+
+_probe_masks: Dict[int, np.ndarray] = {}
+
+
+def _masks(radius: int) -> np.ndarray:
+    """All CHUNK_BITS-wide masks with at most `radius` bits set."""
+    if radius not in _probe_masks:
+        masks = [0]
+        for k in range(1, radius + 1):
+            for bits in combinations(range(CHUNK_BITS), k):
+                masks.append(sum(1 << b for b in bits))
+        _probe_masks[radius] = np.asarray(masks, dtype=np.int64)
+    return _probe_masks[radius]
+
+
+class MultiIndexHash:
+    """Hamming-radius search over 64-bit hashes."""
+
+    def __init__(self):
+        self.hashes: List[int] = []
+        self.refs: List[Any] = []
+        self.tables: List[Dict[int, List[int]]] = [{} for _ in range(CHUNKS)]
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, h: int, ref: Any) -> int:
+        slot = len(self.hashes)
+        self.hashes.append(h)
+        self.refs.append(ref)
+        for i, table in enumerate(self.tables):
+            table.setdefault((h >> (i * CHUNK_BITS)) & CHUNK_MASK, []).append(slot)
+        return slot
+
+    def query(self, h: int, radius: int = DEFAULT_RADIUS) -> List[Tuple[Any, int]]:
+        """(ref, distance) for every stored hash within `radius`, nearest first."""
+        masks = _masks(radius // CHUNKS)
+        candidates: List[int] = []
+        for i, table in enumerate(self.tables):
+            probes = (masks ^ ((h >> (i * CHUNK_BITS)) & CHUNK_MASK)).tolist()
+            for bucket in map(table.get, probes):
+                if bucket:
+                    candidates.extend(bucket)
+        hashes = self.hashes
+        found = [(d, slot) for slot in set(candidates) if (d := (hashes[slot] ^ h).bit_count()) <= radius]
+        found.sort()
+        return [(self.refs[slot], d) for d, slot in found]
+
+    def nearest(self, h: int, radius: int = DEFAULT_RADIUS) -> Optional[Tuple[Any, int]]:
+        hits = self.query(h, radius)
+        return hits[0] if hits else None
+
+
+class ProjectImageIndex:
+    """One MultiIndexHash per project, bounded LRU over projects. Thread-safe."""
+
+    def __init__(self, max_projects: int = 5000, hasher: str = "phash", radius: int = DEFAULT_RADIUS):
+        self.max_projects = max_projects
+        self.hash = HASHERS[hasher]
+        self.radius = radius
+        self._projects: "OrderedDict[str, MultiIndexHash]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    def _index(self, project: str) -> MultiIndexHash:
+        index = self._projects.get(project)
+        if index is None:
+            index = self._projects[project] = MultiIndexHash()
+            while len(self._projects) > self.max_projects:
+                self._projects.popitem(last=False)
+        self._projects.move_to_end(project)
+        return index
+
+    def check(self, project: str, image: Image.Image, ref: Any) -> Tuple[int, Optional[Tuple[Any, int]]]:
+        """
+        Hash `image` and look it up in the project. New images are added under `ref`;
+        duplicates are not. Returns (hash, (existing ref, distance) or None).
+        """
+        h = self.hash(image)
+        with self._lock:
+            index = self._index(project)
+            hit = index.nearest(h, self.radius)
+            self.checked += 1
+            if hit is None:
+                index.add(h, ref)
+            else:
+                self.duplicates += 1
+        return h, hit
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "projects": len(self._projects),
+                "images": sum(len(i) for i in self._projects.values()),
+                "checked": self.checked,
+                "duplicates": self.duplicates,
+            }
+
+
+def dedupe(index: ProjectImageIndex, project: str, items: List[Any], to_image: Callable[[Any], Optional[Image.Image]],
+           regenerate: Callable[[List[int], int], List[Any]], retries: int = 2) -> List[Dict[str, Any]]:
+    """
+    Check each generated item against the project and regenerate near-duplicates
+    (including duplicates of earlier items in the same batch) up to `retries` times.
+    `items` is updated in place; returns per-item {"dedupe_id", "regenerated", "duplicate_of", "distance"},
+    where "duplicate_of" is the "dedupe_id" of the earlier image.
+    """
+    info = [{"dedupe_id": uuid.uuid4().hex[:16], "regenerated": 0} for _ in items]
+    pending = list(range(len(items)))
+    for attempt in range(retries + 1):
+        retry = []
+        for i in pending:
+            image = to_image(items[i])
+            if image is None:
+                continue
+            _, hit = index.check(project, image, info[i]["dedupe_id"])
+            info[i].pop("duplicate_of", None)
+            info[i].pop("distance", None)
+            if hit is not None:
+                info[i]["duplicate_of"], info[i]["distance"] = hit
+                retry.append(i)
+        if not retry or attempt == retries:
+            break
+        for i, item in zip(retry, regenerate(retry, attempt + 1)):
+            items[i] = item
+            info[i]["regenerated"] = attempt + 1
+        pending = retry
+    return info
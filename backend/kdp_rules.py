@@ -0,0 +1,96 @@
+"""
+Artisan AI - KDP Print Rules
+Server-side mirror of kdpCalculator.ts / kdpValidator.ts so server and client agree.
+Keep the numbers here in lockstep with those files.
+"""
+
+from typing import Dict, Optional, Tuple
+
+KDP_LIMITS = {
+    "MIN_PAGES": 24,
+    "MAX_PAGES_STANDARD": 828,
+    "MIN_SPINE_TEXT_PAGES": 79,
+    "BLEED_STANDARD": 0.125,  # Inches
+    "SAFETY_MARGIN": 0.25,    # Inches minimum text safe zone
+    "MIN_IMAGE_DPI": 300,
+}
+
+# kdpValidator.ts checkTrimSize (inches, width x height)
+VALID_TRIM_SIZES: Dict[str, Tuple[float, float]] = {
+    '5" x 8"': (5.0, 8.0),
+    '5.25" x 8"': (5.25, 8.0),
+    '5.5" x 8.5"': (5.5, 8.5),
+    '6" x 9" (Standard)': (6.0, 9.0),
+    '7" x 10"': (7.0, 10.0),
+    '8" x 10"': (8.0, 10.0),
+    '8.25" x 11"': (8.25, 11.0),
+    '8.5" x 8.5" (Square)': (8.5, 8.5),
+    '8.5" x 11" (Letter)': (8.5, 11.0),
+}
+
+SPINE_MULTIPLIERS = {
+    "white": 0.002252,
+    "cream": 0.0025,
+    "premium-color": 0.002347,
+}
+
+
+def get_gutter(page_count: int) -> float:
+    """Inside margin grows with page count to account for binding glue."""
+    if page_count < 24:
+        return 0.0
+    if page_count <= 150:
+        return 0.375
+    if page_count <= 300:
+        return 0.500
+    if page_count <= 500:
+        return 0.625
+    if page_count <= 700:
+        return 0.750
+    return 0.875
+
+
+def get_spine_width(page_count: int, paper_type: str = "white") -> float:
+    multiplier = SPINE_MULTIPLIERS.get(paper_type, SPINE_MULTIPLIERS["white"])
+    return round(page_count * multiplier, 4)
+
+
+def get_cover_dimensions(trim_width: float, trim_height: float, page_count: int,
+                         paper_type: str = "white") -> Dict[str, float]:
+    spine = get_spine_width(page_count, paper_type)
+    bleed = KDP_LIMITS["BLEED_STANDARD"]
+    return {
+        "totalWidth": round(bleed + trim_width + spine + trim_width + bleed, 3),
+        "totalHeight": round(bleed + trim_height + bleed, 3),
+        "spineWidth": spine,
+        "frontCoverWidth": trim_width,
+        "spineTextAllowed": page_count >= KDP_LIMITS["MIN_SPINE_TEXT_PAGES"],
+    }
+
+
+def get_page_dimensions(trim_width: float, trim_height: float, page_count: int) -> Dict[str, float]:
+    """Interior page canvas with bleed (bleed on the outside edge only, top and bottom)."""
+    bleed = KDP_LIMITS["BLEED_STANDARD"]
+    return {
+        "trimWidth": trim_width,
+        "trimHeight": trim_height,
+        "bleed": bleed,
+        "gutter": get_gutter(page_count),
+        "fullWidth": trim_width + bleed,
+        "fullHeight": trim_height + bleed * 2,
+        "safetyMargin": KDP_LIMITS["SAFETY_MARGIN"],
+    }
+
+
+def is_left_page(page_number: int, reading_direction: str = "LTR") -> bool:
+    """LTR: even pages are on the left. RTL (manga): odd pages are on the left."""
+    is_odd = page_number % 2 != 0
+    return (not is_odd) if reading_direction == "LTR" else is_odd
+
+
+def match_trim_size(width: float, height: float, tolerance: float = 0.02) -> Optional[str]:
+    """Name of the KDP trim size matching these inches, if any."""
+    for name, (w, h) in VALID_TRIM_SIZES.items():
+        if abs(w - width) <= tolerance and abs(h - height) <= tolerance:
+            return name
+    return None
@@ -0,0 +1,157 @@
+"""
+Artisan AI - Load Controller
+Degrades service step by step under a traffic spike instead of letting latency
+spiral for everyone.
+
+Signals: scheduler queue depth, p95 latency of recent interactive requests, and
+decode time per generated token. Pressure is the worst of the three relative to
+its target. Above 1.0 the controller moves up one level per evaluation; below
+RECOVER_AT for COOLDOWN_S it moves back down one level (hysteresis, no flapping).
+
+  0 normal       full budgets
+  1 trimmed      max_new_tokens x0.5, diffusion steps x0.5
+  2 reduced      max_new_tokens x0.25, minimum steps, resolution x0.75
+  3 approximate  cached / approximate answers where an agent has them, bulk work rejected
+  4 shed         new generation rejected with Retry-After; cached answers still served
+"""
+
+import contextvars
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+LEVELS = ("normal", "trimmed", "reduced", "approximate", "shed")
+NORMAL, TRIMMED, REDUCED, APPROXIMATE, SHED = range(len(LEVELS))
+
+TOKEN_FACTOR = {NORMAL: 1.0, TRIMMED: 0.5, REDUCED: 0.25, APPROXIMATE: 0.25, SHED: 0.25}
+STEP_FACTOR = {NORMAL: 1.0, TRIMMED: 0.5, REDUCED: 0.0, APPROXIMATE: 0.0, SHED: 0.0}
+RESOLUTION_FACTOR = {NORMAL: 1.0, TRIMMED: 1.0, REDUCED: 0.75, APPROXIMATE: 0.75, SHED: 0.75}
+MIN_TOKENS = 64
+MIN_STEPS = 1
+APPROXIMATE_SLACK = 0.05   # semantic-cache similarity given up at the approximate level
+
+SLO_P95_S = float(os.getenv("ARTISAN_SLO_P95_S", "20"))
+SLO_TOKEN_MS = float(os.getenv("ARTISAN_SLO_TOKEN_MS", "60"))
+QUEUE_TARGET = int(os.getenv("ARTISAN_QUEUE_TARGET", "64"))
+EVAL_INTERVAL_S = 2.0
+COOLDOWN_S = 10.0
+RECOVER_AT = 0.7
+WINDOW_S = 30.0
+
+# Level a request was admitted at; set per request by the app middleware
+request_level: contextvars.ContextVar[int] = contextvars.ContextVar("request_level", default=NORMAL)
+
+
+class LoadShed(Exception):
+    """Raised when the current level does not admit the request."""
+
+    def __init__(self, level: int, retry_after: float):
+        super().__init__(f"Server is shedding load (level {level}: {LEVELS[level]})")
+        self.level = level
+        self.retry_after = retry_after
+
+
+class LoadController:
+    def __init__(self, queue_depth: Callable[[], int], slo_p95_s: float = SLO_P95_S,
+                 slo_token_ms: float = SLO_TOKEN_MS, queue_target: int = QUEUE_TARGET):
+        self.queue_depth = queue_depth
+        self.slo_p95_s = slo_p95_s
+        self.slo_token_s = slo_token_ms / 1000
+        self.queue_target = queue_target
+        self._level = NORMAL
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=5000)
+        self._token_s: Optional[float] = None   # EWMA of decode seconds per token
+        self._evaluated = 0.0
+        self._calm_since: Optional[float] = None
+        self._pressure: Dict[str, float] = {}
+        self.shed = 0
+        self.transitions = 0
+
+    # --- SIGNALS ---
+    def observe_latency(self, seconds: float):
+        self._latencies.append((time.monotonic(), seconds))
+
+    def observe_decode(self, seconds: float, steps: int):
+        if steps <= 0:
+            return
+        sample = seconds / steps
+        self._token_s = sample if self._token_s is None else 0.8 * self._token_s + 0.2 * sample
+
+    def _p95(self, now: float) -> Optional[float]:
+        while self._latencies and now - self._latencies[0][0] > WINDOW_S:
+            self._latencies.popleft()
+        if not self._latencies:
+            return None
+        lat = sorted(s for _, s in self._latencies)
+        return lat[min(len(lat) - 1, int(0.95 * len(lat)))]
+
+    # --- CONTROL LOOP ---
+    @property
+    def level(self) -> int:
+        now = time.monotonic()
+        if now - self._evaluated >= EVAL_INTERVAL_S:
+            self._evaluated = now
+            self._step(now)
+        return self._level
+
+    def _step(self, now: float):
+        p95 = self._p95(now)
+        self._pressure = {
+            "queue": self.queue_depth() / self.queue_target,
+            "latency": p95 / self.slo_p95_s if p95 is not None else 0.0,
+            # Per-token latency only means something while requests are arriving
+            "decode": self._token_s / self.slo_token_s if self._token_s is not None and p95 is not None else 0.0,
+        }
+        pressure = max(self._pressure.values())
+        if pressure > 1.0:
+            self._calm_since = None
+            if self._level < SHED:
+                self._level += 1
+                self.transitions += 1
+        elif pressure < RECOVER_AT and self._level > NORMAL:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= COOLDOWN_S:
+                self._level -= 1
+                self.transitions += 1
+                self._calm_since = now
+        else:
+            self._calm_since = None
+
+    # --- POLICY ---
+    def retry_after(self) -> float:
+        p95 = self._p95(time.monotonic())
+        return max(1.0, p95 if p95 is not None else COOLDOWN_S)
+
+    def admit(self, level: int, bulk: bool = False):
+        """Raise LoadShed if new generation work is not accepted at `level`."""
+        if level >= SHED or (bulk and level >= APPROXIMATE):
+            self.shed += 1
+            raise LoadShed(level, self.retry_after())
+
+    @staticmethod
+    def max_tokens(requested: int, level: int) -> int:
+        return max(min(requested, MIN_TOKENS), int(requested * TOKEN_FACTOR[level]))
+
+    @staticmethod
+    def image_params(width: int, height: int, steps: int, level: int) -> Tuple[int, int, int]:
+        scale = RESOLUTION_FACTOR[level]
+        # Keep dimensions multiples of 64 for the diffusion VAE
+        w = max(512, int(width * scale) // 64 * 64) if scale < 1 else width
+        h = max(512, int(height * scale) // 64 * 64) if scale < 1 else height
+        return w, h, max(MIN_STEPS, int(steps * STEP_FACTOR[level]))
+
+    def stats(self) -> Dict:
+        p95 = self._p95(time.monotonic())
+        return {
+            "level": self._level,
+            "mode": LEVELS[self._level],
+            "pressure": {k: round(v, 3) for k, v in self._pressure.items()},
+            "p95_s": round(p95, 3) if p95 is not None else None,
+            "decode_ms_per_token": round(self._token_s * 1000, 2) if self._token_s is not None else None,
+            "queue_depth": self.queue_depth(),
+            "slo": {"p95_s": self.slo_p95_s, "token_ms": self.slo_token_s * 1000, "queue": self.queue_target},
+            "shed": self.shed,
+            "transitions": self.transitions,
+        }
@@ -0,0 +1,279 @@
+"""
+Artisan AI - Multi-Adapter LoRA Serving
+Specialises the one base model per agent (and per genre) with LoRA adapters
+instead of a persona line in every prompt, without loading a model per agent.
+
+The attention projections of the base model are wrapped once. Each wrapped
+layer owns a fixed bank of adapter slots (A: slots x rank x in, B: slots x out x rank);
+slot 0 is all zeros and means "base model". For a batch, the distinct adapters'
+A and B are stacked once; each forward pass runs the shared base matmul, then
+((x @ A_stack.T) * row_mask) @ B_stack.T, where the mask keeps only each row's own
+rank block (scaled). Requests for different adapters thus share one forward pass and
+cost two extra small matmuls per layer, however many adapters are mixed.
+
+Adapters are PEFT-format directories (adapter_config.json + adapter_model.safetensors
+or .bin) under ARTISAN_LORA_DIR, named "<agent>" or "<agent>-<genre>". They are
+hot-loaded into a free slot on first use; when the bank is full the least recently
+used adapter that is not in the current batch is evicted. An adapter that cannot be
+loaded (rank above ARTISAN_LORA_MAX_RANK, unreadable or mismatched weights) is
+served by the base model with a warning, and retried only once its files change.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import torch
+from torch import nn
+
+LORA_DIR = os.getenv("ARTISAN_LORA_DIR", "./adapters")
+LORA_SLOTS = int(os.getenv("ARTISAN_LORA_SLOTS", "8"))
+LORA_MAX_RANK = int(os.getenv("ARTISAN_LORA_MAX_RANK", "16"))
+TARGET_MODULES = ("q_proj", "k_proj", "v_proj", "o_proj")
+
+_PERSONA = re.compile(r"^As '[^']+',\s*")
+
+
+def adapter_name(agent: str, genre: Optional[str] = None) -> str:
+    slug = agent.lower().replace(" ", "-")
+    if genre:
+        return f"{slug}-{re.sub(r'[^a-z0-9]+', '-', genre.lower()).strip('-')}"
+    return slug
+
+
+def resolve_adapter(agent: str, genre: Optional[str] = None, adapter_dir: str = LORA_DIR) -> Optional[str]:
+    """Most specific adapter on disk: "<agent>-<genre>", then "<agent>", else None.
+    Checked on every call, so adapters dropped into the directory are picked up live."""
+    for name in ([adapter_name(agent, genre)] if genre else []) + [adapter_name(agent)]:
+        path = os.path.join(adapter_dir, name)
+        if os.path.exists(os.path.join(path, "adapter_config.json")) and _weights_file(path):
+            return name
+    return None
+
+
+def _weights_file(path: str) -> Optional[str]:
+    for filename in ("adapter_model.safetensors", "adapter_model.bin"):
+        if os.path.exists(os.path.join(path, filename)):
+            return os.path.join(path, filename)
+    return None
+
+
+def strip_persona(prompt: str) -> str:
+    """Drop the leading "As 'PERSONA'," line; the adapter carries the persona instead."""
+    rest = _PERSONA.sub("", prompt, count=1)
+    return rest[:1].upper() + rest[1:] if rest != prompt else prompt
+
+
+class MultiLoRALinear(nn.Module):
+    """nn.Linear plus a bank of LoRA slots selected per batch row."""
+
+    def __init__(self, base: nn.Linear, slots: int, rank: int):
+        super().__init__()
+        self.base = base
+        weight = base.weight
+        self.lora_A = nn.Parameter(torch.zeros(slots, rank, base.in_features, dtype=weight.dtype, device=weight.device),
+                                   requires_grad=False)
+        self.lora_B = nn.Parameter(torch.zeros(slots, base.out_features, rank, dtype=weight.dtype, device=weight.device),
+                                   requires_grad=False)
+        self.register_buffer("scale", torch.zeros(slots, dtype=weight.dtype, device=weight.device), persistent=False)
+        self.active: Optional[Tuple[torch.Tensor, torch.Tensor, torch.Tensor]] = None   # set by LoRABank.activate
+
+    def bind(self, slots: List[int], mask: torch.Tensor):
+        """Stack the batch's distinct adapters: A (k*rank x in), B (out x k*rank), and a per-row block mask."""
+        self.active = (self.lora_A[slots].flatten(0, 1), self.lora_B[slots].transpose(0, 1).flatten(1), mask)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.base(x)
+        if self.active is None:
+            return out
+        a, b, mask = self.active
+        if x.shape[0] != mask.shape[0]:
+            return out
+        # Two matmuls whatever the adapter mix; each row keeps only its own adapter's rank block
+        return out + ((x @ a.T) * mask) @ b.T
+
+    def load_slot(self, slot: int, a: torch.Tensor, b: torch.Tensor, scale: float):
+        rank = a.shape[0]
+        self.lora_A.data[slot].zero_()
+        self.lora_B.data[slot].zero_()
+        self.lora_A.data[slot, :rank] = a.to(self.lora_A.dtype)
+        self.lora_B.data[slot, :, :rank] = b.to(self.lora_B.dtype)
+        self.scale[slot] = scale
+
+    def clear_slot(self, slot: int):
+        self.lora_A.data[slot].zero_()
+        self.lora_B.data[slot].zero_()
+        self.scale[slot] = 0
+
+
+class SlotsExhausted(RuntimeError):
+    """Every slot holds an adapter the current batch needs (LoRABank.plan prevents this)."""
+
+
+def _read_adapter(path: str) -> Tuple[Dict[str, torch.Tensor], Dict]:
+    with open(os.path.join(path, "adapter_config.json")) as f:
+        config = json.load(f)
+    weights_file = _weights_file(path)
+    if weights_file is None:
+        raise FileNotFoundError(f"No adapter_model.safetensors or adapter_model.bin in {path}")
+    if weights_file.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        weights = load_file(weights_file)
+    else:
+        weights = torch.load(weights_file, map_location="cpu")
+    return weights, config
+
+
+def _version(path: str) -> float:
+    """Latest modification time of an adapter's files, to notice a fixed adapter."""
+    try:
+        return max(entry.stat().st_mtime for entry in os.scandir(path))
+    except (FileNotFoundError, ValueError):
+        return 0.0
+
+
+class LoRABank:
+    """Wraps a model's target projections and manages which adapter sits in which slot."""
+
+    def __init__(self, model: nn.Module, adapter_dir: str = LORA_DIR, slots: int = LORA_SLOTS,
+                 max_rank: int = LORA_MAX_RANK, targets: Sequence[str] = TARGET_MODULES):
+        self.adapter_dir = adapter_dir
+        self.slots = slots
+        self.max_rank = max_rank
+        self.layers: Dict[str, MultiLoRALinear] = {}
+        for name, module in list(model.named_modules()):
+            for child_name, child in list(module.named_children()):
+                if child_name in targets and isinstance(child, nn.Linear):
+                    wrapped = MultiLoRALinear(child, slots, max_rank)
+                    setattr(module, child_name, wrapped)
+                    self.layers[f"{name}.{child_name}" if name else child_name] = wrapped
+        self._resident: "OrderedDict[str, int]" = OrderedDict()   # adapter -> slot, LRU order
+        self._free = list(range(slots - 1, 0, -1))                # slot 0 is the base model
+        self._failed: Dict[str, float] = {}                        # adapter -> version that failed
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def _layer_for(self, key: str) -> Optional[Tuple[MultiLoRALinear, str]]:
+        # PEFT keys: base_model.model.<module path>.lora_A.weight
+        for suffix in (".lora_A.weight", ".lora_B.weight"):
+            if key.endswith(suffix):
+                path = key[: -len(suffix)]
+                for prefix in ("base_model.model.", ""):
+                    if path.startswith(prefix) and path[len(prefix):] in self.layers:
+                        return self.layers[path[len(prefix):]], suffix[6]
+        return None
+
+    def _read(self, name: str) -> Tuple[List[Dict], float]:
+        """Validated (layer, A, B) pairs and scale for an adapter; raises before any slot is touched."""
+        weights, config = _read_adapter(os.path.join(self.adapter_dir, name))
+        rank = int(config.get("r", 8))
+        if not 0 < rank <= self.max_rank:
+            raise ValueError(f"Adapter '{name}' has rank {rank} > ARTISAN_LORA_MAX_RANK={self.max_rank}")
+        scale = float(config.get("lora_alpha", rank)) / rank
+        pairs: Dict[int, Dict] = {}
+        for key, tensor in weights.items():
+            found = self._layer_for(key)
+            if found:
+                layer, which = found
+                pairs.setdefault(id(layer), {"layer": layer})[which] = tensor
+        complete = [p for p in pairs.values() if "A" in p and "B" in p]
+        if not complete:
+            raise ValueError(f"Adapter '{name}' has no LoRA weights for {', '.join(TARGET_MODULES)}")
+        for pair in complete:
+            base = pair["layer"].base
+            if (pair["A"].shape != (rank, base.in_features) or pair["B"].shape != (base.out_features, rank)):
+                raise ValueError(f"Adapter '{name}' weights do not match rank {rank} and the base model's shapes")
+        return complete, scale
+
+    def _load(self, name: str, keep: set) -> int:
+        pairs, scale = self._read(name)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            victim = next((n for n in self._resident if n not in keep), None)
+            if victim is None:
+                raise SlotsExhausted(f"All {self.slots - 1} LoRA slots are in use by this batch")
+            slot = self._resident.pop(victim)
+            self.evictions += 1
+        for layer in self.layers.values():
+            layer.clear_slot(slot)
+        for pair in pairs:
+            pair["layer"].load_slot(slot, pair["A"], pair["B"], scale)
+        self._resident[name] = slot
+        self.loads += 1
+        return slot
+
+    def slots_for(self, names: Sequence[Optional[str]]) -> List[int]:
+        """Slot per request, hot-loading adapters that are not resident."""
+        keep = {n for n in names if n}
+        out = []
+        for name in names:
+            if not name:
+                out.append(0)
+                continue
+            if name not in self._resident:
+                version = _version(os.path.join(self.adapter_dir, name))
+                if self._failed.get(name) == version:
+                    out.append(0)
+                    continue
+                try:
+                    self._load(name, keep)
+                    self._failed.pop(name, None)
+                except SlotsExhausted:
+                    raise
+                except Exception as e:
+                    # One broken adapter must not fail every request batched with it
+                    print(f"⚠️ LoRA adapter '{name}' not loaded ({e}), serving the base model")
+                    self._failed[name] = version
+                    out.append(0)
+                    continue
+            self._resident.move_to_end(name)
+            out.append(self._resident[name])
+        return out
+
+    def plan(self, names: Sequence[Optional[str]]) -> List[List[int]]:
+        """Split batch rows so no sub-batch needs more distinct adapters than there are slots."""
+        distinct = list(dict.fromkeys(n for n in names if n))
+        capacity = self.slots - 1
+        if len(distinct) <= capacity:
+            return [list(range(len(names)))]
+        chunk_of = {n: i // capacity for i, n in enumerate(distinct)}
+        chunks: List[List[int]] = [[] for _ in range((len(distinct) + capacity - 1) // capacity)]
+        for row, name in enumerate(names):
+            chunks[chunk_of[name] if name else 0].append(row)
+        return chunks
+
+    @contextmanager
+    def activate(self, names: Sequence[Optional[str]]) -> Iterator[None]:
+        """Route batch row i through adapter names[i] (None = base model) for the duration."""
+        with self._lock:
+            slots = self.slots_for(names)
+            if not any(slots):
+                yield
+                return
+            distinct = sorted(set(slots) - {0})
+            layers = list(self.layers.values())
+            template = layers[0]
+            rank = template.lora_A.shape[1]
+            mask = torch.zeros(len(slots), 1, len(distinct) * rank, dtype=template.lora_A.dtype,
+                               device=template.lora_A.device)
+            for row, slot in enumerate(slots):
+                if slot:
+                    k = distinct.index(slot)
+                    mask[row, 0, k * rank:(k + 1) * rank] = template.scale[slot]
+            for layer in layers:
+                layer.bind(distinct, mask)
+            try:
+                yield
+            finally:
+                for layer in layers:
+                    layer.active = None
+
+    def stats(self) -> Dict:
+        return {"resident": list(self._resident), "slots": self.slots - 1,
+                "loads": self.loads, "evictions": self.evictions, "failed": sorted(self._failed)}
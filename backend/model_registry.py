@@ -0,0 +1,315 @@
+"""
+Artisan AI - Model Registry
+Loads models by config name instead of hard-coded globals, and keeps the GPU
+within budget by moving idle models down a tier instead of running out of memory.
+
+Tiers: "device" (ready to run) -> "cpu" (weights in host RAM, fast to restore)
+-> "disk" (released; reloaded from the local HF cache). Before a model is brought
+to the device, least-recently-used models that are idle and not pinned are
+offloaded until it fits; the CPU tier is LRU-bounded the same way. The load
+itself runs outside the registry lock, so requests for a model already on the
+device are not held up while another one loads.
+
+Roles ("text", "image") point at a config name and can be re-pointed at runtime,
+so a model version is swapped without restarting. The old model is released as
+soon as no request is using it.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import torch
+
+GB = 1024 ** 3
+
+MODEL_CONFIGS: Dict[str, Dict[str, Any]] = {
+    "llama-3-8b": {"kind": "text", "repo": "meta-llama/Llama-3-8B-Instruct", "label": "Llama-3-8B-Instruct",
+                   "dtype": "float16", "size_gb": 16.1},
+    "llama-3.1-8b": {"kind": "text", "repo": "meta-llama/Llama-3.1-8B-Instruct", "label": "Llama-3.1-8B-Instruct",
+                     "dtype": "float16", "size_gb": 16.1},
+    "flux-schnell": {"kind": "image", "repo": "black-forest-labs/FLUX.1-schnell", "label": "FLUX.1-schnell",
+                     "dtype": "float16", "size_gb": 33.7, "call": {"guidance_scale": 0.0}},
+    "sdxl-base": {"kind": "image", "repo": "stabilityai/stable-diffusion-xl-base-1.0", "label": "SDXL-base-1.0",
+                  "dtype": "float16", "size_gb": 6.9, "load": {"use_safetensors": True, "variant": "fp16"},
+                  "call": {"guidance_scale": 7.0}},
+}
+DEFAULT_ROLES = {
+    "text": os.getenv("ARTISAN_TEXT_MODEL", "llama-3-8b"),
+    "image": os.getenv("ARTISAN_IMAGE_MODEL", "flux-schnell"),
+}
+USE_WAIT_S = 120.0   # how long a request waits for busy models to free the device before trying anyway
+
+DEVICE, CPU, DISK = "device", "cpu", "disk"
+LOADING = "loading"   # being moved to the device; its bytes are already reserved there
+
+
+def _load_configs() -> Dict[str, Dict[str, Any]]:
+    """Built-in configs, extended or overridden by the JSON file in ARTISAN_MODEL_CONFIGS."""
+    configs = {k: dict(v) for k, v in MODEL_CONFIGS.items()}
+    path = os.getenv("ARTISAN_MODEL_CONFIGS")
+    if path:
+        try:
+            with open(path) as f:
+                for name, spec in json.load(f).items():
+                    configs[name] = {**configs.get(name, {}), **spec}
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ Could not read ARTISAN_MODEL_CONFIGS ({e}), using built-in models")
+    return configs
+
+
+def _load_text(spec: Dict[str, Any]) -> Tuple[Any, Any]:
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(spec["repo"])
+    model = AutoModelForCausalLM.from_pretrained(
+        spec["repo"], torch_dtype=getattr(torch, spec.get("dtype", "float16")), low_cpu_mem_usage=True,
+        **spec.get("load", {})
+    )
+    return model.eval(), tokenizer
+
+
+def _load_image(spec: Dict[str, Any]) -> Tuple[Any, Any]:
+    from diffusers import DiffusionPipeline
+    pipe = DiffusionPipeline.from_pretrained(
+        spec["repo"], torch_dtype=getattr(torch, spec.get("dtype", "float16")), **spec.get("load", {})
+    )
+    return pipe, None
+
+
+LOADERS: Dict[str, Callable[[Dict[str, Any]], Tuple[Any, Any]]] = {"text": _load_text, "image": _load_image}
+
+
+def footprint(obj: Any) -> int:
+    """Bytes of parameters and buffers in a module or a diffusers pipeline's module components."""
+    modules = [obj] if isinstance(obj, torch.nn.Module) else [
+        c for c in getattr(obj, "components", {}).values() if isinstance(c, torch.nn.Module)
+    ]
+    return sum(t.numel() * t.element_size() for m in modules for t in (*m.parameters(), *m.buffers()))
+
+
+class ModelHandle:
+    __slots__ = ("name", "spec", "model", "tokenizer", "state", "bytes", "last_used", "pinned",
+                 "in_use", "retired", "loads", "offloads", "restores", "last_ready_s")
+
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.spec = spec
+        self.model: Any = None
+        self.tokenizer: Any = None
+        self.state = DISK
+        self.bytes = int(spec.get("size_gb", 0) * GB)   # estimate until measured
+        self.last_used = 0.0
+        self.pinned = False
+        self.in_use = 0
+        self.retired = False
+        self.loads = 0
+        self.offloads = 0
+        self.restores = 0
+        self.last_ready_s: Optional[float] = None
+
+    @property
+    def label(self) -> str:
+        return self.spec.get("label", self.name)
+
+
+class ModelRegistry:
+    def __init__(self, configs: Optional[Dict[str, Dict[str, Any]]] = None, roles: Optional[Dict[str, str]] = None,
+                 device: Optional[str] = None, device_budget: Optional[int] = None, cpu_budget: Optional[int] = None,
+                 loaders: Optional[Dict[str, Callable]] = None):
+        self.configs = configs if configs is not None else _load_configs()
+        self.roles = dict(roles or DEFAULT_ROLES)
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self._device_budget = device_budget or (int(float(os.environ["ARTISAN_GPU_BUDGET_GB"]) * GB)
+                                                if os.getenv("ARTISAN_GPU_BUDGET_GB") else None)
+        self.cpu_budget = cpu_budget or int(float(os.getenv("ARTISAN_CPU_BUDGET_GB", "48")) * GB)
+        self.loaders = loaders or LOADERS
+        self._handles: Dict[str, ModelHandle] = {}
+        self._cond = threading.Condition()
+        for role, name in self.roles.items():
+            if name not in self.configs:
+                raise ValueError(f"Role '{role}' points at unknown model '{name}'")
+
+    # --- BUDGETS ---
+    @property
+    def device_budget(self) -> int:
+        if self._device_budget is None:
+            # Resolved lazily: on ZeroGPU the device only exists inside a GPU call
+            if self.device.startswith("cuda") and torch.cuda.is_available():
+                self._device_budget = int(torch.cuda.get_device_properties(0).total_memory * 0.9)
+            else:
+                self._device_budget = self.cpu_budget
+        return self._device_budget
+
+    def _used(self, state: str) -> int:
+        states = (DEVICE, LOADING) if state == DEVICE else (state,)
+        return sum(h.bytes for h in self._handles.values() if h.state in states)
+
+    def _handle(self, name: str) -> ModelHandle:
+        if name not in self.configs:
+            raise KeyError(f"Unknown model '{name}'")
+        if name not in self._handles:
+            self._handles[name] = ModelHandle(name, self.configs[name])
+        return self._handles[name]
+
+    def resolve(self, role_or_name: str) -> str:
+        return self.roles.get(role_or_name, role_or_name)
+
+    # --- TIER MOVES (caller holds the lock) ---
+    def _victim(self, state: str, exclude: ModelHandle) -> Optional[ModelHandle]:
+        idle = [h for h in self._handles.values()
+                if h.state == state and h is not exclude and not h.pinned and h.in_use == 0]
+        return min(idle, key=lambda h: h.last_used) if idle else None
+
+    def _to_disk(self, h: ModelHandle):
+        h.model = h.tokenizer = None
+        h.state = DISK
+        h.offloads += 1
+
+    def _to_cpu(self, h: ModelHandle):
+        while self._used(CPU) + h.bytes > self.cpu_budget:
+            victim = self._victim(CPU, h)
+            if victim is None:
+                self._to_disk(h)
+                return
+            self._to_disk(victim)
+        if self.device != "cpu":
+            h.model.to("cpu")
+        h.state = CPU
+        h.offloads += 1
+
+    def _make_room(self, h: ModelHandle) -> bool:
+        while self._used(DEVICE) + h.bytes > self.device_budget:
+            victim = self._victim(DEVICE, h)
+            if victim is None:
+                return False
+            self._to_cpu(victim)
+        if self.device.startswith("cuda"):
+            torch.cuda.empty_cache()
+        return True
+
+    def _ensure(self, h: ModelHandle):
+        while h.state == LOADING:
+            # Another request is loading it: wait for that rather than load it twice
+            self._cond.wait()
+        if h.state == DEVICE:
+            return
+        deadline = time.monotonic() + USE_WAIT_S
+        while not self._make_room(h):
+            # Everything in the way is busy or pinned: wait for a request to finish
+            remaining = deadline - time.monotonic()
+            busy = any(x.in_use for x in self._handles.values() if x.state in (DEVICE, LOADING) and x is not h)
+            if remaining <= 0 or not busy:
+                print(f"⚠️ Loading '{h.name}' over the device budget")
+                break
+            self._cond.wait(remaining)
+        started = time.monotonic()
+        source, h.state = h.state, LOADING
+        # Loading and moving take minutes for large models; other models stay usable meanwhile
+        self._cond.release()
+        try:
+            if source == DISK:
+                print(f"🔄 Loading {h.label}...")
+                model, tokenizer = self.loaders[h.spec["kind"]](h.spec)
+            else:
+                model, tokenizer = h.model, h.tokenizer
+            model.to(self.device)
+        except BaseException:
+            self._cond.acquire()
+            h.state = source
+            self._cond.notify_all()
+            raise
+        self._cond.acquire()
+        if source == DISK:
+            h.model, h.tokenizer = model, tokenizer
+            h.bytes = footprint(model) or h.bytes
+            h.loads += 1
+        else:
+            h.restores += 1
+        h.state = DEVICE
+        h.last_ready_s = round(time.monotonic() - started, 3)
+        self._cond.notify_all()
+
+    # --- PUBLIC API ---
+    @contextmanager
+    def use(self, role_or_name: str) -> Iterator[ModelHandle]:
+        """Bring a model to the device and keep it there (not evictable) for the duration."""
+        with self._cond:
+            h = self._handle(self.resolve(role_or_name))
+            h.in_use += 1
+            try:
+                self._ensure(h)
+            except BaseException:
+                h.in_use -= 1
+                raise
+            h.last_used = time.monotonic()
+        try:
+            yield h
+        finally:
+            with self._cond:
+                h.in_use -= 1
+                h.last_used = time.monotonic()
+                if h.retired and h.in_use == 0:
+                    self._to_disk(h)
+                    del self._handles[h.name]
+                self._cond.notify_all()
+
+    def label(self, role_or_name: str) -> str:
+        name = self.resolve(role_or_name)
+        return self.configs.get(name, {}).get("label", name)
+
+    def pin(self, name: str, pinned: bool = True):
+        """Pinned models are never offloaded by the LRU policy."""
+        with self._cond:
+            self._handle(name).pinned = pinned
+            self._cond.notify_all()
+
+    def assign(self, role: str, name: str) -> Optional[str]:
+        """Point a role at another model config. Returns the previous name; it is released once idle."""
+        with self._cond:
+            if name not in self.configs:
+                raise KeyError(f"Unknown model '{name}'")
+            if self.configs[name]["kind"] != role and role in LOADERS:
+                raise ValueError(f"Model '{name}' is a {self.configs[name]['kind']} model, not {role}")
+            previous = self.roles.get(role)
+            self.roles[role] = name
+            current = self._handles.get(name)
+            if current is not None:
+                # Pointed back at a model that was retired but still busy: keep it
+                current.retired = False
+            old = self._handles.get(previous) if previous != name else None
+            if old is not None and previous not in self.roles.values():
+                old.retired = True
+                if old.in_use == 0:
+                    self._to_disk(old)
+                    del self._handles[previous]
+            self._cond.notify_all()
+            return previous
+
+    def release(self, name: str):
+        """Drop a model to the disk tier now (unless it is serving a request)."""
+        with self._cond:
+            h = self._handles.get(name)
+            if h is not None and h.in_use == 0 and h.state != DISK:
+                self._to_disk(h)
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            models: List[Dict[str, Any]] = [
+                {"name": h.name, "label": h.label, "kind": h.spec["kind"], "state": h.state,
+                 "gb": round(h.bytes / GB, 2), "pinned": h.pinned, "in_use": h.in_use,
+                 "loads": h.loads, "offloads": h.offloads, "restores": h.restores, "last_ready_s": h.last_ready_s}
+                for h in self._handles.values()
+            ]
+            return {
+                "roles": dict(self.roles),
+                "available": sorted(self.configs),
+                "device": self.device,
+                "device_gb": {"used": round(self._used(DEVICE) / GB, 2),
+                              "budget": round(self._device_budget / GB, 2) if self._device_budget else None},
+                "cpu_gb": {"used": round(self._used(CPU) / GB, 2), "budget": round(self.cpu_budget / GB, 2)},
+                "models": models,
+            }
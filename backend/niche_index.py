@@ -0,0 +1,434 @@
+"""
+Artisan AI - Niche Index
+Local catalog / keyword data behind /api/niche-analysis, so the numbers come from
+data and the LLM only narrates them.
+
+Ingestion reads CSV, JSONL or Parquet dumps into two tables:
+  catalog   one row per listing: title text, BSR, price, reviews, rating, publish date, platform
+  keywords  one row per search term: keyword text, search volume (+ previous volume), platform
+
+Each table is a directory of column files (.npy, opened memory-mapped), a
+CSR inverted index over its text tokens (sorted vocabulary + postings/offsets),
+and a UTF-8 label blob for titles / keywords. A lookup intersects postings lists,
+gathers only the matching rows from the column memmaps, and aggregates them
+with NumPy.
+
+Usage:
+    python niche_index.py catalog dump1.csv dump2.jsonl
+    python niche_index.py keywords keywords.parquet
+"""
+
+import csv
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from array import array
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+INDEX_DIR = os.getenv("ARTISAN_NICHE_DIR", "niche_index")
+
+STOPWORDS = {"a", "an", "and", "the", "for", "of", "to", "in", "on", "with", "by", "book", "books"}
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+EPOCH = date(1970, 1, 1)
+
+# Source column aliases -> canonical column
+CATALOG_FIELDS = {
+    "bsr": ("bsr", "sales_rank", "rank", "best_sellers_rank"),
+    "price": ("price", "list_price"),
+    "reviews": ("reviews", "review_count", "ratings_total", "num_reviews"),
+    "rating": ("rating", "stars", "avg_rating"),
+    "published": ("published", "publication_date", "pub_date", "release_date"),
+    "platform": ("platform", "marketplace", "store"),
+}
+CATALOG_TEXT = ("title", "subtitle", "keywords", "categories", "category")
+KEYWORD_FIELDS = {
+    "volume": ("search_volume", "volume", "searches"),
+    "volume_prev": ("previous_volume", "volume_prev", "prev_volume"),
+    "platform": ("platform", "marketplace", "store"),
+}
+KEYWORD_TEXT = ("keyword", "term", "query")
+
+# Rule-of-thumb BSR -> daily sales curve (BSR 100k ~ 0.5/day, 1k ~ 17/day)
+DAILY_SALES_K = 3000.0
+DAILY_SALES_EXP = 0.75
+SELLING_BSR = 100_000
+RECENT_DAYS = 90
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for t in TOKEN_RE.findall((text or "").lower()):
+        if t in STOPWORDS:
+            continue
+        if len(t) > 3 and t.endswith("s") and not t.endswith("ss"):
+            t = t[:-1]
+        tokens.append(t)
+    return tokens
+
+
+def _number(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else float(value)
+    try:
+        return float(str(value).replace(",", "").replace("$", "").strip())
+    except ValueError:
+        return None
+
+
+def _day(value: Any) -> int:
+    """Days since epoch, or -1 when missing / unparseable."""
+    if value is None or value == "":
+        return -1
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return (value - EPOCH).days
+    try:
+        return (datetime.fromisoformat(str(value)[:10]).date() - EPOCH).days
+    except ValueError:
+        return -1
+
+
+def _pick(row: Dict[str, Any], names: Tuple[str, ...]) -> Any:
+    for name in names:
+        if name in row and row[name] not in (None, ""):
+            return row[name]
+    return None
+
+
+# --- READERS ---
+def read_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream rows as dicts with lower-cased keys."""
+    lower = path.lower()
+    if lower.endswith(".csv") or lower.endswith(".tsv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f, delimiter="\t" if lower.endswith(".tsv") else ","):
+                yield {k.strip().lower(): v for k, v in row.items() if k}
+    elif lower.endswith(".jsonl") or lower.endswith(".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield {k.lower(): v for k, v in json.loads(line).items()}
+    elif lower.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet ingestion needs pyarrow installed") from e
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=65536):
+            for row in batch.to_pylist():
+                yield {k.lower(): v for k, v in row.items()}
+    else:
+        raise ValueError(f"Unsupported file type: {path}")
+
+
+# --- BUILD ---
+class TableBuilder:
+    """Accumulates columns, labels and postings in compact arrays, then writes a table directory."""
+
+    def __init__(self, columns: Dict[str, str]):
+        self.columns = {name: array(code) for name, code in columns.items()}
+        self.platforms: Dict[str, int] = {}
+        self.platform = array("B")
+        self.labels = bytearray()
+        self.label_offsets = array("q", [0])
+        self.postings: Dict[str, array] = {}
+        self.rows = 0
+
+    def add(self, text: str, label: str, values: Dict[str, Any], platform: Optional[str]):
+        row = self.rows
+        for token in set(tokenize(text)):
+            self.postings.setdefault(token, array("i")).append(row)
+        for name, col in self.columns.items():
+            col.append(values[name])
+        key = (platform or "unknown").strip().lower()
+        if key not in self.platforms:
+            if len(self.platforms) >= 255:
+                key = "other"
+            self.platforms.setdefault(key, len(self.platforms))
+        self.platform.append(self.platforms[key])
+        self.labels += label.encode("utf-8")
+        self.label_offsets.append(len(self.labels))
+        self.rows += 1
+
+    def write(self, path: str, sources: List[str]):
+        tmp = path + ".building"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, col in self.columns.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.frombuffer(col, dtype=col.typecode))
+        np.save(os.path.join(tmp, "platform.npy"), np.frombuffer(self.platform, dtype=np.uint8))
+        np.save(os.path.join(tmp, "label_offsets.npy"), np.frombuffer(self.label_offsets, dtype=np.int64))
+        with open(os.path.join(tmp, "labels.bin"), "wb") as f:
+            f.write(self.labels)
+
+        vocab = sorted(self.postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self.postings[t]) for t in vocab])
+        postings = np.empty(int(offsets[-1]), dtype=np.int32)
+        for i, term in enumerate(vocab):
+            postings[offsets[i]:offsets[i + 1]] = np.frombuffer(self.postings[term], dtype=np.int32)
+        width = max((len(t) for t in vocab), default=1)
+        np.save(os.path.join(tmp, "vocab.npy"), np.array(vocab, dtype=f"<U{width}"))
+        np.save(os.path.join(tmp, "offsets.npy"), offsets)
+        np.save(os.path.join(tmp, "postings.npy"), postings)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({
+                "rows": self.rows, "terms": len(vocab), "columns": list(self.columns),
+                "platforms": self.platforms, "sources": sources, "built_at": time.time(),
+            }, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+
+def ingest(kind: str, paths: Iterable[str], root: str = INDEX_DIR) -> Dict[str, Any]:
+    """Build (replace) the `catalog` or `keywords` table from one or more dump files."""
+    paths = list(paths)
+    if kind == "catalog":
+        builder = TableBuilder({"bsr": "i", "price": "f", "reviews": "i", "rating": "f", "published": "i"})
+        for path in paths:
+            for row in read_rows(path):
+                text = " ".join(str(row[k]) for k in CATALOG_TEXT if row.get(k))
+                if not text:
+                    continue
+                bsr, price = _number(_pick(row, CATALOG_FIELDS["bsr"])), _number(_pick(row, CATALOG_FIELDS["price"]))
+                reviews, rating = _number(_pick(row, CATALOG_FIELDS["reviews"])), _number(_pick(row, CATALOG_FIELDS["rating"]))
+                builder.add(text, str(row.get("title") or text)[:200], {
+                    "bsr": int(bsr) if bsr and bsr > 0 else 0,
+                    "price": price if price is not None else float("nan"),
+                    "reviews": int(reviews) if reviews is not None else -1,
+                    "rating": rating if rating is not None else float("nan"),
+                    "published": _day(_pick(row, CATALOG_FIELDS["published"])),
+                }, _pick(row, CATALOG_FIELDS["platform"]))
+    elif kind == "keywords":
+        builder = TableBuilder({"volume": "i", "volume_prev": "i"})
+        for path in paths:
+            for row in read_rows(path):
+                keyword = _pick(row, KEYWORD_TEXT)
+                if not keyword:
+                    continue
+                volume, prev = _number(_pick(row, KEYWORD_FIELDS["volume"])), _number(_pick(row, KEYWORD_FIELDS["volume_prev"]))
+                builder.add(str(keyword), str(keyword)[:200], {
+                    "volume": int(volume) if volume is not None else -1,
+                    "volume_prev": int(prev) if prev is not None else -1,
+                }, _pick(row, KEYWORD_FIELDS["platform"]))
+    else:
+        raise ValueError("kind must be 'catalog' or 'keywords'")
+    os.makedirs(root, exist_ok=True)
+    builder.write(os.path.join(root, kind), [os.path.basename(p) for p in paths])
+    return {"table": kind, "rows": builder.rows, "terms": len(builder.postings)}
+
+
+# --- QUERY ---
+class TableReopened(Exception):
+    """A rebuild replaced the table while a lookup was reading it."""
+
+
+class Table:
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.columns = {name: load(name) for name in self.meta["columns"]}
+        self.platform = load("platform")
+        self.vocab = load("vocab")
+        self.offsets = load("offsets")
+        self.postings = load("postings")
+        self.label_offsets = load("label_offsets")
+        self._labels = open(os.path.join(path, "labels.bin"), "rb")
+        self._label_lock = threading.Lock()
+
+    def term_rows(self, term: str) -> np.ndarray:
+        i = int(np.searchsorted(self.vocab, term))
+        if i >= len(self.vocab) or self.vocab[i] != term:
+            return np.empty(0, dtype=np.int32)
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def match(self, terms: List[str], platforms: Optional[List[str]] = None) -> np.ndarray:
+        """Rows containing every term (AND), rarest list first."""
+        if not terms:
+            return np.empty(0, dtype=np.int32)
+        lists = sorted((self.term_rows(t) for t in set(terms)), key=len)
+        rows = np.asarray(lists[0])
+        for other in lists[1:]:
+            if rows.size == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        # Tables ingested without a platform column are not filtered
+        known = {k: v for k, v in self.meta["platforms"].items() if k != "unknown"}
+        if platforms and known and rows.size:
+            codes = [known[p.lower()] for p in platforms if p.lower() in known]
+            rows = rows[np.isin(self.platform[rows], codes)] if codes else rows[:0]
+        return rows
+
+    def labels(self, rows: np.ndarray) -> List[str]:
+        out = []
+        with self._label_lock:
+            if self._labels.closed:
+                raise TableReopened()
+            for r in rows.tolist():
+                start, end = int(self.label_offsets[r]), int(self.label_offsets[r + 1])
+                self._labels.seek(start)
+                out.append(self._labels.read(end - start).decode("utf-8", "replace"))
+        return out
+
+    def close(self):
+        with self._label_lock:
+            self._labels.close()
+
+
+def _level(score: float) -> str:
+    return "Low" if score < 34 else "Medium" if score < 67 else "High"
+
+
+class NicheIndex:
+    def __init__(self, root: str = INDEX_DIR):
+        self.root = root
+        self._tables: Dict[str, Tuple[float, Table]] = {}
+        self._lock = threading.Lock()
+
+    def table(self, kind: str) -> Optional[Table]:
+        """Open a table, reopening it if it was rebuilt since last use."""
+        meta = os.path.join(self.root, kind, "meta.json")
+        try:
+            mtime = os.path.getmtime(meta)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._tables.get(kind)
+            if cached is None or cached[0] != mtime:
+                self._tables[kind] = (mtime, Table(os.path.join(self.root, kind)))
+                if cached is not None:
+                    cached[1].close()
+            return self._tables[kind][1]
+
+    def lookup(self, niche: str, platforms: Optional[List[str]] = None, today: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Computed niche metrics, or None when neither table has matching rows."""
+        try:
+            return self._lookup(niche, platforms, today)
+        except TableReopened:
+            # Rebuilt mid-lookup: the retry opens the new tables
+            return self._lookup(niche, platforms, today)
+
+    def _lookup(self, niche: str, platforms: Optional[List[str]], today: Optional[int]) -> Optional[Dict[str, Any]]:
+        terms = tokenize(niche)
+        catalog, keywords = self.table("catalog"), self.table("keywords")
+        today = today if today is not None else (date.today() - EPOCH).days
+        result: Dict[str, Any] = {"niche": niche, "terms": terms}
+
+        if catalog is not None:
+            rows = catalog.match(terms, platforms)
+            if rows.size:
+                result.update(self._catalog_metrics(catalog, rows, today))
+        if keywords is not None:
+            rows = keywords.match(terms, platforms)
+            if rows.size:
+                result.update(self._keyword_metrics(keywords, rows, terms))
+        if "listings" not in result and "searchVolume" not in result:
+            return None
+        return self._score(result)
+
+    @staticmethod
+    def _catalog_metrics(table: Table, rows: np.ndarray, today: int) -> Dict[str, Any]:
+        bsr = table.columns["bsr"][rows]
+        price = table.columns["price"][rows]
+        reviews = table.columns["reviews"][rows]
+        rating = table.columns["rating"][rows]
+        published = table.columns["published"][rows]
+
+        ranked = bsr > 0
+        daily = np.where(ranked, DAILY_SALES_K / np.power(np.maximum(bsr, 1), DAILY_SALES_EXP), 0.0)
+        selling = ranked & (bsr <= SELLING_BSR)
+        dated = published >= 0
+        recent = dated & (published >= today - RECENT_DAYS)
+        prior = dated & (published < today - RECENT_DAYS) & (published >= today - 2 * RECENT_DAYS)
+        top = np.argsort(np.where(ranked, bsr, np.iinfo(np.int32).max))[:10]
+        known_reviews = reviews[reviews >= 0]
+
+        return {
+            "listings": int(rows.size),
+            "rankedListings": int(ranked.sum()),
+            "sellingListings": int(selling.sum()),
+            "medianBsr": float(np.median(bsr[ranked])) if ranked.any() else None,
+            "estMonthlySales": round(float(daily.sum() * 30), 1),
+            "estMonthlySalesTop10": round(float(daily[top].sum() * 30), 1),
+            "medianPrice": round(float(np.nanmedian(price)), 2) if np.isfinite(price).any() else None,
+            "medianReviews": float(np.median(known_reviews)) if known_reviews.size else None,
+            "top10MedianReviews": float(np.median(reviews[top][reviews[top] >= 0])) if (reviews[top] >= 0).any() else None,
+            "avgRating": round(float(np.nanmean(rating)), 2) if np.isfinite(rating).any() else None,
+            "newListings90d": int(recent.sum()),
+            "newListingsPrior90d": int(prior.sum()),
+            "newSellingShare": round(float((recent & selling).sum() / max(1, selling.sum())), 3),
+            "topTitles": table.labels(rows[top[:5]]),
+        }
+
+    @staticmethod
+    def _keyword_metrics(table: Table, rows: np.ndarray, terms: List[str]) -> Dict[str, Any]:
+        volume = table.columns["volume"][rows]
+        prev = table.columns["volume_prev"][rows]
+        order = np.argsort(-volume)[:10]
+        labels = table.labels(rows[order])
+        exact = next((i for i, label in zip(order.tolist(), labels) if tokenize(label) == terms), None)
+        both = (volume >= 0) & (prev > 0)
+        return {
+            "searchVolume": int(volume[exact]) if exact is not None else int(volume[order[0]]),
+            "relatedVolume": int(volume[volume > 0].sum()),
+            "volumeGrowth": round(float(volume[both].sum() / prev[both].sum() - 1), 3) if both.any() else None,
+            "keywords": labels,
+        }
+
+    @staticmethod
+    def _score(m: Dict[str, Any]) -> Dict[str, Any]:
+        """Scores in 0-100 from the raw aggregates."""
+        demand = 0.0
+        if m.get("estMonthlySalesTop10") is not None:
+            demand = max(demand, min(100.0, 25 * math.log10(1 + m["estMonthlySalesTop10"])))
+        if m.get("searchVolume"):
+            demand = max(demand, min(100.0, 20 * math.log10(1 + m["searchVolume"])))
+
+        competition = 50.0  # neutral when there is no catalog data
+        if "listings" in m:
+            competition = 0.5 * min(100.0, 20 * math.log10(1 + m["listings"]))
+            competition += 0.5 * min(100.0, 25 * math.log10(1 + (m.get("top10MedianReviews") or 0)))
+
+        growth = []
+        if m.get("newListingsPrior90d"):
+            growth.append(m["newListings90d"] / m["newListingsPrior90d"] - 1)
+        if m.get("volumeGrowth") is not None:
+            growth.append(m["volumeGrowth"])
+        velocity = 50 + 50 * max(-1.0, min(1.0, sum(growth) / len(growth))) if growth else 50.0
+        velocity = 0.5 * velocity + 0.5 * 100 * m.get("newSellingShare", 0.5)
+
+        price = m.get("medianPrice") or 9.99
+        profit = max(0.0, min(100.0, demand * (1 - competition / 200) * min(1.5, price / 9.99)))
+        score = round(0.4 * demand + 0.3 * (100 - competition) + 0.2 * velocity + 0.1 * profit)
+
+        m.update({
+            "score": score,
+            "demandScore": round(demand),
+            "competitionScore": round(competition),
+            "velocityScore": round(velocity),
+            "profitPotentialScore": round(profit),
+            "competition": _level(competition),
+            "velocity": "Rising" if velocity >= 60 else "Stable" if velocity >= 40 else "Peaking",
+            "profitPotential": _level(profit),
+            "verdict": "GO" if score >= 60 else "CAUTION" if score >= 40 else "STOP",
+        })
+        return m
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("catalog", "keywords"):
+        print(__doc__)
+        sys.exit(1)
+    started = time.time()
+    print(json.dumps(ingest(sys.argv[1], sys.argv[2:])), f"in {time.time() - started:.1f}s")
@@ -0,0 +1,329 @@
+"""
+Artisan AI - KDP Preflight Engine
+Streams an interior PDF page by page and checks it against the KDP print rules in
+kdp_rules.py (trim size, bleed, gutter for the page count, margins, font embedding
+and image DPI).
+
+Pages are split into ranges and checked on a process pool. Each worker opens the
+file itself and keeps at most one page's objects alive, and only capped issue
+lists come back, so memory does not grow with page count.
+"""
+
+import math
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from pypdf import PdfReader
+from pypdf.generic import ContentStream
+
+from kdp_rules import KDP_LIMITS, get_gutter, is_left_page, match_trim_size
+
+POINTS_PER_INCH = 72.0
+MAX_ISSUES = 50          # Per issue type, per report
+INLINE_PAGE_LIMIT = 48   # Below this, skip the process pool entirely
+MAX_FORM_DEPTH = 3
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+Matrix = Tuple[float, float, float, float, float, float]
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def _mult(m: Matrix, n: Matrix) -> Matrix:
+    """PDF matrix product m x n."""
+    a, b, c, d, e, f = m
+    a2, b2, c2, d2, e2, f2 = n
+    return (
+        a * a2 + b * c2, a * b2 + b * d2,
+        c * a2 + d * c2, c * b2 + d * d2,
+        e * a2 + f * c2 + e2, e * b2 + f * d2 + f2,
+    )
+
+
+def _point(m: Matrix, x: float, y: float) -> Tuple[float, float]:
+    a, b, c, d, e, f = m
+    return x * a + y * c + e, x * b + y * d + f
+
+
+def _font_embedded(font) -> bool:
+    font = font.get_object()
+    subtype = font.get("/Subtype")
+    if subtype == "/Type3":
+        return True
+    if subtype == "/Type0":
+        descendants = font.get("/DescendantFonts")
+        if not descendants:
+            return False
+        font = descendants.get_object()[0].get_object()
+    descriptor = font.get("/FontDescriptor")
+    if descriptor is None:
+        return False
+    descriptor = descriptor.get_object()
+    return any(k in descriptor for k in ("/FontFile", "/FontFile2", "/FontFile3"))
+
+
+def _simple_widths(font) -> Optional[Tuple[int, List[float]]]:
+    """(FirstChar, Widths) for simple fonts; None for CID/Type0 fonts."""
+    font = font.get_object()
+    widths = font.get("/Widths")
+    if font.get("/Subtype") == "/Type0" or widths is None:
+        return None
+    return int(font.get("/FirstChar", 0)), [float(w) for w in widths.get_object()]
+
+
+def _string_bytes(s) -> bytes:
+    if isinstance(s, bytes):
+        return s
+    return getattr(s, "original_bytes", None) or str(s).encode("latin-1", errors="replace")
+
+
+class _PageScan:
+    """Single pass over a page's content: text extents, image DPI, fonts."""
+
+    def __init__(self, reader: PdfReader):
+        self.reader = reader
+        self.text_min_x = math.inf
+        self.text_max_x = -math.inf
+        self.text_min_y = math.inf
+        self.text_max_y = -math.inf
+        self.min_dpi = math.inf
+        self.fonts: Dict[str, bool] = {}
+        self._metrics: Dict[Any, Optional[Tuple[int, List[float]]]] = {}
+
+    def _advance(self, metrics: Optional[Tuple[int, List[float]]], items, font_size: float) -> float:
+        """Text-space advance of a Tj string or TJ array, using the font's /Widths if present."""
+        total = 0.0
+        for item in items:
+            if isinstance(item, (int, float)):
+                total -= float(item) / 1000.0 * font_size
+                continue
+            data = _string_bytes(item)
+            if metrics is None:
+                # CID fonts: assume an average advance of half the font size
+                total += len(data) * font_size * 0.5
+                continue
+            first, widths = metrics
+            em = 0.0
+            for code in data:
+                i = code - first
+                em += widths[i] if 0 <= i < len(widths) else 500.0
+            total += em / 1000.0 * font_size
+        return total
+
+    def scan(self, content, resources, ctm: Matrix = IDENTITY, depth: int = 0):
+        if content is None:
+            return
+        resources = resources.get_object() if resources is not None else {}
+        fonts = resources.get("/Font")
+        fonts = fonts.get_object() if fonts is not None else {}
+        for name, font in fonts.items():
+            base = str(font.get_object().get("/BaseFont", name))
+            if base not in self.fonts:
+                self.fonts[base] = _font_embedded(font)
+        xobjects = resources.get("/XObject")
+        xobjects = xobjects.get_object() if xobjects is not None else {}
+
+        stack: List[Matrix] = []
+        tm = tlm = IDENTITY
+        font_size = 12.0
+        leading = 0.0
+        metrics = None
+        for operands, op in ContentStream(content, self.reader).operations:
+            if op == b"q":
+                stack.append(ctm)
+            elif op == b"Q":
+                ctm = stack.pop() if stack else ctm
+            elif op == b"cm":
+                ctm = _mult(tuple(float(v) for v in operands), ctm)
+            elif op == b"BT":
+                tm = tlm = IDENTITY
+            elif op == b"Tf":
+                font_size = float(operands[1])
+                font = fonts.get(operands[0])
+                key = id(font.get_object()) if font is not None else None
+                if key not in self._metrics:
+                    self._metrics[key] = _simple_widths(font) if font is not None else None
+                metrics = self._metrics[key]
+            elif op == b"TL":
+                leading = float(operands[0])
+            elif op in (b"Td", b"TD"):
+                if op == b"TD":
+                    leading = -float(operands[1])
+                tlm = _mult((1, 0, 0, 1, float(operands[0]), float(operands[1])), tlm)
+                tm = tlm
+            elif op == b"Tm":
+                tm = tlm = tuple(float(v) for v in operands)
+            elif op == b"T*":
+                tlm = _mult((1, 0, 0, 1, 0, -leading), tlm)
+                tm = tlm
+            elif op in (b"Tj", b"'", b'"', b"TJ"):
+                if op in (b"'", b'"'):
+                    tlm = _mult((1, 0, 0, 1, 0, -leading), tlm)
+                    tm = tlm
+                items = operands[0] if op == b"TJ" else [operands[-1]]
+                advance = self._advance(metrics, items, font_size)
+                self._extend_text(_mult(tm, ctm), advance, font_size)
+                tm = _mult((1, 0, 0, 1, advance, 0), tm)
+            elif op == b"Do":
+                xobj = xobjects.get(operands[0])
+                if xobj is None:
+                    continue
+                xobj = xobj.get_object()
+                subtype = xobj.get("/Subtype")
+                if subtype == "/Image":
+                    self._image(xobj, ctm)
+                elif subtype == "/Form" and depth < MAX_FORM_DEPTH:
+                    matrix = tuple(float(v) for v in xobj.get("/Matrix", IDENTITY))
+                    self.scan(xobj.get_data(), xobj.get("/Resources"), _mult(matrix, ctm), depth + 1)
+
+    def _extend_text(self, m: Matrix, advance: float, font_size: float):
+        x0, y0 = _point(m, 0, 0)
+        x1, y1 = _point(m, advance, font_size)
+        self.text_min_x = min(self.text_min_x, x0, x1)
+        self.text_max_x = max(self.text_max_x, x0, x1)
+        self.text_min_y = min(self.text_min_y, y0, y1)
+        self.text_max_y = max(self.text_max_y, y0, y1)
+
+    def _image(self, xobj, ctm: Matrix):
+        a, b, c, d, _, _ = ctm
+        shown_w = math.hypot(a, b) / POINTS_PER_INCH
+        shown_h = math.hypot(c, d) / POINTS_PER_INCH
+        if shown_w <= 0 or shown_h <= 0:
+            return
+        dpi = min(float(xobj.get("/Width", 0)) / shown_w, float(xobj.get("/Height", 0)) / shown_h)
+        self.min_dpi = min(self.min_dpi, dpi)
+
+
+def check_page_range(path: str, start: int, end: int, page_count: int,
+                     reading_direction: str = "LTR") -> Dict[str, Any]:
+    """Check pages [start, end). Runs in a worker process."""
+    reader = PdfReader(path)
+    gutter = get_gutter(page_count)
+    bleed = KDP_LIMITS["BLEED_STANDARD"]
+    result: Dict[str, Any] = {
+        "sizes": Counter(),
+        "gutter": [], "margins": [], "low_dpi": [],
+        "fonts": {},
+    }
+    for index in range(start, end):
+        page = reader.pages[index]
+        page_number = index + 1
+        width = float(page.mediabox.width) / POINTS_PER_INCH
+        height = float(page.mediabox.height) / POINTS_PER_INCH
+        result["sizes"][(round(width, 3), round(height, 3))] += 1
+
+        # Bleed pages are trim + 0.125" wide and trim + 0.25" tall
+        has_bleed = match_trim_size(width, height) is None and \
+            match_trim_size(width - bleed, height - 2 * bleed) is not None
+        trim_w = width - bleed if has_bleed else width
+        left = is_left_page(page_number, reading_direction)
+        trim_x0 = bleed if (has_bleed and left) else 0.0
+        trim_y0 = bleed if has_bleed else 0.0
+
+        scan = _PageScan(reader)
+        scan.scan(page.get_contents(), page.get("/Resources"))
+        for name, embedded in scan.fonts.items():
+            result["fonts"][name] = result["fonts"].get(name, True) and embedded
+
+        if scan.min_dpi < KDP_LIMITS["MIN_IMAGE_DPI"] and len(result["low_dpi"]) < MAX_ISSUES:
+            result["low_dpi"].append({"page": page_number, "dpi": int(scan.min_dpi)})
+
+        if scan.text_min_x is math.inf:
+            continue
+        text_left = scan.text_min_x / POINTS_PER_INCH - trim_x0
+        text_right = trim_w - (scan.text_max_x / POINTS_PER_INCH - trim_x0)
+        text_bottom = scan.text_min_y / POINTS_PER_INCH - trim_y0
+        text_top = (height - 2 * trim_y0) - (scan.text_max_y / POINTS_PER_INCH - trim_y0)
+        inside, outside = (text_right, text_left) if left else (text_left, text_right)
+
+        if inside < gutter and len(result["gutter"]) < MAX_ISSUES:
+            result["gutter"].append({"page": page_number, "inside": round(inside, 3)})
+        outside_min = KDP_LIMITS["SAFETY_MARGIN"] + (bleed if has_bleed else 0.0)
+        if min(outside, text_top, text_bottom) < outside_min and len(result["margins"]) < MAX_ISSUES:
+            result["margins"].append({"page": page_number, "outside": round(min(outside, text_top, text_bottom), 3)})
+    return result
+
+
+def _merge(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged: Dict[str, Any] = {"sizes": Counter(), "gutter": [], "margins": [], "low_dpi": [], "fonts": {}}
+    for r in results:
+        merged["sizes"].update(r["sizes"])
+        for key in ("gutter", "margins", "low_dpi"):
+            merged[key].extend(r[key][:MAX_ISSUES - len(merged[key])])
+        for name, embedded in r["fonts"].items():
+            merged["fonts"][name] = merged["fonts"].get(name, True) and embedded
+    return merged
+
+
+def _count(issues: List[Any]) -> str:
+    return f"{len(issues)}+" if len(issues) >= MAX_ISSUES else str(len(issues))
+
+
+def _check(check_id: str, label: str, ok: bool, message: str, blocking: bool = True,
+           warn: bool = False, details: Optional[List[Any]] = None) -> Dict[str, Any]:
+    status = "pass" if ok else ("warning" if warn else "fail")
+    check = {"id": check_id, "label": label, "status": status, "message": message, "blocking": blocking}
+    if details:
+        check["details"] = details
+    return check
+
+
+def run_preflight(path: str, reading_direction: str = "LTR", workers: Optional[int] = None) -> Dict[str, Any]:
+    """Validate an interior PDF. Returns a report shaped like kdpValidator.ts ComplianceReport."""
+    global _pool
+    page_count = len(PdfReader(path).pages)
+    if page_count <= INLINE_PAGE_LIMIT:
+        merged = check_page_range(path, 0, page_count, page_count, reading_direction)
+    else:
+        workers = workers or os.cpu_count() or 2
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers)
+        chunk = max(16, math.ceil(page_count / (workers * 4)))
+        futures = [
+            _pool.submit(check_page_range, path, s, min(s + chunk, page_count), page_count, reading_direction)
+            for s in range(0, page_count, chunk)
+        ]
+        merged = _merge([f.result() for f in futures])
+
+    gutter = get_gutter(page_count)
+    (size, _), = merged["sizes"].most_common(1) or [((0.0, 0.0), 0)]
+    bleed = KDP_LIMITS["BLEED_STANDARD"]
+    trim_name = match_trim_size(*size) or match_trim_size(size[0] - bleed, size[1] - 2 * bleed)
+    has_bleed = match_trim_size(*size) is None and trim_name is not None
+    unembedded = sorted(name for name, ok in merged["fonts"].items() if not ok)
+
+    checks = [
+        _check("page_count", "Page Count",
+               KDP_LIMITS["MIN_PAGES"] <= page_count <= KDP_LIMITS["MAX_PAGES_STANDARD"],
+               f"{page_count} pages (KDP range {KDP_LIMITS['MIN_PAGES']}-{KDP_LIMITS['MAX_PAGES_STANDARD']})"),
+        _check("trim_size", "Trim Size", trim_name is not None,
+               f"{trim_name} (KDP Approved)" if trim_name else f'Invalid page size: {size[0]}" x {size[1]}"'),
+        _check("page_size_consistency", "Uniform Page Size", len(merged["sizes"]) <= 1,
+               "All pages match" if len(merged["sizes"]) <= 1 else f"{len(merged['sizes'])} different page sizes"),
+        _check("bleed", "Bleed", True,
+               f'Bleed {bleed}" detected' if has_bleed else "No bleed (text-only interior)", blocking=False),
+        _check("gutter", "Gutter", not merged["gutter"],
+               f'Inside margin >= {gutter}" for {page_count} pages' if not merged["gutter"]
+               else f'{_count(merged["gutter"])} pages inside the {gutter}" gutter', details=merged["gutter"]),
+        _check("margins", "Outside Margins", not merged["margins"],
+               "Text inside the safe zone" if not merged["margins"]
+               else f'{_count(merged["margins"])} pages with text outside the safe zone', details=merged["margins"]),
+        _check("fonts", "Font Embedding", not unembedded,
+               f"{len(merged['fonts'])} fonts, all embedded" if not unembedded
+               else f"Not embedded: {', '.join(unembedded[:10])}"),
+        _check("image_dpi", "Image Resolution", not merged["low_dpi"],
+               f"All images >= {KDP_LIMITS['MIN_IMAGE_DPI']} DPI" if not merged["low_dpi"]
+               else f"{_count(merged['low_dpi'])} pages with images under {KDP_LIMITS['MIN_IMAGE_DPI']} DPI",
+               blocking=False, warn=True, details=merged["low_dpi"]),
+    ]
+    blocked = any(c["blocking"] and c["status"] == "fail" for c in checks)
+    warnings = any(c["status"] == "warning" for c in checks)
+    return {
+        "checks": checks,
+        "canExport": not blocked,
+        "overallStatus": "blocked" if blocked else ("warnings" if warnings else "ready"),
+        "pageCount": page_count,
+        "trimSize": trim_name,
+    }
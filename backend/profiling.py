@@ -0,0 +1,322 @@
+"""
+Artisan AI - On-Demand Profiling
+Admin-only tools for finding where a slow request spends its time.
+
+- Sampling profiler: a background thread snapshots every thread's Python stack at
+  a fixed interval for N seconds and writes folded stacks (`.folded`), which
+  flamegraph.pl, speedscope and inferno read directly.
+- Request trace: the next request matching a path (or agent slug) runs under
+  torch.profiler and is written as a Chrome trace (`.json`, open in Perfetto or
+  chrome://tracing), plus a `.phases.json` summary of labelled phases
+  (tokenize, prefill, decode, encode, ...).
+
+When neither is armed the cost is one attribute check per request and per
+phase, so it stays enabled in production. The endpoints exist only when
+ARTISAN_ADMIN_TOKEN is set and require it in the X-Admin-Token header.
+
+A trace covers everything the process does while the matched request runs,
+including other requests batched into the same model call.
+"""
+
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+
+PROFILE_DIR = os.path.realpath(os.getenv("ARTISAN_PROFILE_DIR", "profiles"))
+ADMIN_TOKEN = os.getenv("ARTISAN_ADMIN_TOKEN")
+MAX_SAMPLE_S = 300.0
+MAX_TRACE_TTL_S = 3600.0
+MAX_STACK_DEPTH = 128
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """Folded-stack sampler over all threads; nothing runs between sessions."""
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.current: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval_s: float, path: str) -> Dict[str, Any]:
+        if self.running:
+            raise RuntimeError("A sampling session is already running")
+        self._stop.clear()
+        self.current = {"file": os.path.basename(path), "seconds": seconds, "interval_ms": interval_s * 1000,
+                        "started": time.time(), "samples": 0}
+        self._thread = threading.Thread(target=self._run, args=(seconds, interval_s, path),
+                                        name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return dict(self.current)
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, seconds: float, interval_s: float, path: str):
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not self._stop.wait(interval_s):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames: List[str] = []
+                while frame is not None and len(frames) < MAX_STACK_DEPTH:
+                    frames.append(_frame_name(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stacks[";".join([names.get(ident, str(ident))] + frames[::-1])] += 1
+            self.current["samples"] += 1
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.current["finished"] = time.time()
+
+
+class _PrefillMark:
+    """Logits processor that notes when the first decode step starts (prefill is done)."""
+
+    def __init__(self):
+        self.at: Optional[float] = None
+
+    def __call__(self, input_ids, scores):
+        if self.at is None:
+            self.at = time.perf_counter()
+        return scores
+
+
+class RequestTrace:
+    def __init__(self, match: str, ttl_s: float, directory: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.match = match
+        self.directory = directory
+        self.expires = time.monotonic() + ttl_s
+        self.path: Optional[str] = None
+        self.started = 0.0
+        self.phases: List[Dict[str, Any]] = []
+        self._torch = None
+
+    def _record(self, name: str, start: float, end: float):
+        self.phases.append({"name": name, "start_ms": round((start - self.started) * 1000, 3),
+                            "ms": round((end - start) * 1000, 3)})
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        try:
+            from torch.profiler import profile, ProfilerActivity
+            import torch
+            activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if torch.cuda.is_available() else [])
+            try:
+                # Handlers run on executor and scheduler threads, not the one that starts the trace
+                from torch._C._profiler import _ExperimentalConfig
+                self._torch = profile(activities=activities, record_shapes=True,
+                                      experimental_config=_ExperimentalConfig(profile_all_threads=True))
+            except (ImportError, TypeError):
+                self._torch = profile(activities=activities, record_shapes=True)
+            self._torch.__enter__()
+        except ImportError:
+            self._torch = None
+        return self
+
+    def __exit__(self, *exc):
+        finished = time.perf_counter()
+        base = os.path.join(self.directory, f"trace-{self.id}")
+        files = []
+        if self._torch is not None:
+            self._torch.__exit__(*exc)
+            self._torch.export_chrome_trace(base + ".json")
+            files.append(os.path.basename(base + ".json"))
+        totals: Dict[str, float] = {}
+        for p in self.phases:
+            totals[p["name"]] = round(totals.get(p["name"], 0.0) + p["ms"], 3)
+        with open(base + ".phases.json", "w") as f:
+            json.dump({"id": self.id, "path": self.path, "match": self.match,
+                       "wall_ms": round((finished - self.started) * 1000, 3),
+                       "phase_ms": totals, "phases": self.phases, "trace": files[0] if files else None}, f, indent=2)
+        return False
+
+
+class Profiler:
+    def __init__(self, directory: str = PROFILE_DIR):
+        self.directory = directory
+        self.sampler = SamplingProfiler()
+        self._armed: List[RequestTrace] = []
+        self._active: Optional[RequestTrace] = None
+        self._lock = threading.Lock()
+
+    # --- HOT PATH ---
+    def claim(self, path: str) -> Optional[RequestTrace]:
+        """Trace to run this request under, if one is armed for its path."""
+        if not self._armed:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._armed = [t for t in self._armed if t.expires > now]
+            if self._active is not None:
+                return None
+            for trace in self._armed:
+                if path == trace.match or path.startswith(trace.match.rstrip("/") + "/"):
+                    self._armed.remove(trace)
+                    trace.path = path
+                    self._active = trace
+                    return trace
+        return None
+
+    @contextmanager
+    def running(self, trace: Optional[RequestTrace]) -> Iterator[None]:
+        """Run the request under a claimed trace (no-op for None) and free the slot afterwards."""
+        if trace is None:
+            yield
+            return
+        try:
+            with trace:
+                yield
+        finally:
+            with self._lock:
+                self._active = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Label a stretch of work; recorded only while a request trace is running."""
+        trace = self._active
+        if trace is None:
+            yield
+            return
+        from torch.profiler import record_function
+        start = time.perf_counter()
+        try:
+            with record_function(f"phase:{name}"):
+                yield
+        finally:
+            trace._record(name, start, time.perf_counter())
+
+    @contextmanager
+    def generation(self) -> Iterator[Dict[str, Any]]:
+        """
+        Wrap model.generate: yields extra generate kwargs that split the call into
+        prefill and decode phases while tracing, and nothing otherwise.
+        """
+        trace = self._active
+        if trace is None:
+            yield {}
+            return
+        from transformers import LogitsProcessorList
+        mark = _PrefillMark()
+        start = time.perf_counter()
+        try:
+            yield {"logits_processor": LogitsProcessorList([mark])}
+        finally:
+            end = time.perf_counter()
+            trace._record("prefill", start, mark.at or end)
+            if mark.at is not None:
+                trace._record("decode", mark.at, end)
+
+    # --- CONTROL ---
+    def sample(self, seconds: float, interval_ms: float) -> Dict[str, Any]:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"sample-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.folded"
+        return self.sampler.start(seconds, interval_ms / 1000, os.path.join(self.directory, name))
+
+    def arm(self, match: str, ttl_s: float) -> RequestTrace:
+        os.makedirs(self.directory, exist_ok=True)
+        trace = RequestTrace(match, ttl_s, self.directory)
+        with self._lock:
+            self._armed.append(trace)
+        return trace
+
+    def files(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        entries = [e for e in os.scandir(self.directory) if e.is_file()]
+        return [{"name": e.name, "bytes": e.stat().st_size, "modified": e.stat().st_mtime}
+                for e in sorted(entries, key=lambda e: e.stat().st_mtime, reverse=True)]
+
+    def file_path(self, name: str) -> Optional[str]:
+        path = os.path.realpath(os.path.join(self.directory, name))
+        if os.path.dirname(path) != os.path.realpath(self.directory) or not os.path.isfile(path):
+            return None
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "sampling": self.sampler.current if self.sampler.running else None,
+            "armed": [{"id": t.id, "match": t.match, "expires_in_s": round(t.expires - now, 1)}
+                      for t in self._armed if t.expires > now],
+            "tracing": self._active.id if self._active else None,
+        }
+
+
+profiler = Profiler()
+
+
+# --- ADMIN API ---
+class SampleRequest(BaseModel):
+    seconds: float = Field(10.0, gt=0, le=MAX_SAMPLE_S)
+    interval_ms: float = Field(5.0, ge=1, le=1000)
+
+class TraceRequest(BaseModel):
+    path: Optional[str] = None
+    agent: Optional[str] = None
+    ttl_s: float = Field(600.0, gt=0, le=MAX_TRACE_TTL_S)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN or ""):
+        raise HTTPException(status_code=401, detail="Admin token required")
+
+
+def admin_router() -> APIRouter:
+    """Profiling endpoints, mounted by each app only when ARTISAN_ADMIN_TOKEN is set."""
+    router = APIRouter(prefix="/api/admin/profile", dependencies=[Depends(require_admin)])
+
+    @router.get("")
+    def profile_status():
+        return {"success": True, **profiler.stats(), "files": profiler.files()}
+
+    @router.post("/sample")
+    def profile_sample(req: SampleRequest):
+        try:
+            session = profiler.sample(req.seconds, req.interval_ms)
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return {"success": True, **session, "url": f"/api/admin/profile/files/{session['file']}"}
+
+    @router.post("/trace")
+    def profile_trace(req: TraceRequest):
+        if bool(req.path) == bool(req.agent):
+            raise HTTPException(status_code=400, detail="Give exactly one of path or agent")
+        trace = profiler.arm(req.path or f"/api/{req.agent}", req.ttl_s)
+        return {"success": True, "id": trace.id, "match": trace.match,
+                "files": [f"/api/admin/profile/files/trace-{trace.id}.json",
+                          f"/api/admin/profile/files/trace-{trace.id}.phases.json"]}
+
+    @router.get("/files/{name}")
+    def profile_file(name: str):
+        path = profiler.file_path(name)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Profile not found (still recording?)")
+        return FileResponse(path, filename=name)
+
+    return router
@@ -0,0 +1,230 @@
+"""
+Artisan AI - Project Store
+Local persistence for /api/cloud-save: SQLite for metadata plus a content-addressed
+blob directory.
+
+A project document (manuscript, covers, metadata) is walked as a JSON tree. Any
+long string is cut into content-defined chunks at paragraph boundaries, so editing
+one paragraph changes one chunk and every other chunk dedups against what is
+already stored. A snapshot is just the compressed tree with chunk hashes in place
+of the long strings, which makes each autosave a compressed delta.
+
+Blob I/O is batched: all new chunks from one save are appended to a single pack
+file in one write, and loads read each pack once with offsets sorted.
+
+User keys starting with "$" are stored with one more "$", so a document can never
+be mistaken for a chunk reference. Snapshots record the manifest format, and ones
+saved before this escaping are read as they were written.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+STORE_DIR = os.getenv("ARTISAN_STORE_DIR", "artisan_store")
+
+INLINE_LIMIT = 4096          # Strings shorter than this stay inside the manifest
+CHUNK_MIN = 2 * 1024
+CHUNK_MAX = 64 * 1024
+BOUNDARY_MASK = 0x7           # ~1 in 8 paragraph ends is a cut point once past CHUNK_MIN
+CHUNK_REF = "$chunks"
+MANIFEST_FORMAT = 2           # 1: keys unescaped; 2: user keys starting with "$" get another "$"
+
+
+def chunk_text(text: str) -> List[str]:
+    """Content-defined chunks cut after paragraphs whose hash hits the boundary mask."""
+    chunks: List[str] = []
+    start = 0
+    pos = 0
+    length = len(text)
+    while pos < length:
+        end = text.find("\n", pos)
+        end = length if end == -1 else end + 1
+        # Lines with no newline for a long stretch (e.g. base64) are cut at CHUNK_MAX
+        while end - start > CHUNK_MAX:
+            chunks.append(text[start:start + CHUNK_MAX])
+            start += CHUNK_MAX
+        size = end - start
+        paragraph = text[pos:end]
+        if size >= CHUNK_MIN and (zlib.crc32(paragraph.encode("utf-8")) & BOUNDARY_MASK) == 0:
+            chunks.append(text[start:end])
+            start = end
+        pos = end
+    if start < length:
+        chunks.append(text[start:])
+    return chunks
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ProjectStore:
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+        self.pack_dir = os.path.join(root, "packs")
+        os.makedirs(self.pack_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "store.db"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                hash TEXT PRIMARY KEY, pack TEXT NOT NULL, offset INTEGER NOT NULL,
+                length INTEGER NOT NULL, raw_length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, tenant TEXT NOT NULL, project_id TEXT NOT NULL,
+                created_at REAL NOT NULL, manifest BLOB NOT NULL, bytes_written INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS snapshots_project ON snapshots (tenant, project_id, id);
+        """)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(snapshots)")}
+        if "format" not in columns:
+            with self._db:
+                self._db.execute("ALTER TABLE snapshots ADD COLUMN format INTEGER NOT NULL DEFAULT 1")
+
+    # --- ENCODING ---
+    def _encode(self, value: Any, new_chunks: Dict[str, bytes]) -> Any:
+        if isinstance(value, str) and len(value) > INLINE_LIMIT:
+            hashes = []
+            for chunk in chunk_text(value):
+                raw = chunk.encode("utf-8")
+                h = _digest(raw)
+                new_chunks.setdefault(h, raw)
+                hashes.append(h)
+            return {CHUNK_REF: hashes}
+        if isinstance(value, dict):
+            return {("$" + k if k.startswith("$") else k): self._encode(v, new_chunks) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._encode(v, new_chunks) for v in value]
+        return value
+
+    def _decode(self, value: Any, blobs: Dict[str, bytes], escaped: bool = True) -> Any:
+        if isinstance(value, dict):
+            if set(value) == {CHUNK_REF}:
+                return "".join(blobs[h].decode("utf-8") for h in value[CHUNK_REF])
+            return {(k[1:] if escaped and k.startswith("$") else k): self._decode(v, blobs, escaped)
+                    for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._decode(v, blobs, escaped) for v in value]
+        return value
+
+    @staticmethod
+    def _refs(value: Any, out: List[str]):
+        if isinstance(value, dict):
+            if set(value) == {CHUNK_REF}:
+                out.extend(value[CHUNK_REF])
+            else:
+                for v in value.values():
+                    ProjectStore._refs(v, out)
+        elif isinstance(value, list):
+            for v in value:
+                ProjectStore._refs(v, out)
+
+    # --- BATCHED BLOB I/O ---
+    def _existing(self, hashes: List[str]) -> set:
+        found = set()
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            rows = self._db.execute(
+                f"SELECT hash FROM chunks WHERE hash IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            found.update(r[0] for r in rows)
+        return found
+
+    def _write_pack(self, chunks: Dict[str, bytes]) -> Tuple[int, List[Tuple]]:
+        """Append all new chunks to one pack file. Returns (bytes written, chunk rows)."""
+        pack = f"{uuid.uuid4().hex}.pack"
+        rows, offset = [], 0
+        with open(os.path.join(self.pack_dir, pack), "wb") as f:
+            for h, raw in chunks.items():
+                packed = zlib.compress(raw, 6)
+                f.write(packed)
+                rows.append((h, pack, offset, len(packed), len(raw)))
+                offset += len(packed)
+            f.flush()
+            os.fsync(f.fileno())
+        return offset, rows
+
+    def _locations(self, hashes: List[str]) -> List[Tuple[str, str, int, int]]:
+        locations = []
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            locations += self._db.execute(
+                f"SELECT hash, pack, offset, length FROM chunks WHERE hash IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+        return locations
+
+    def _read_chunks(self, unique: List[str], locations: List[Tuple[str, str, int, int]]) -> Dict[str, bytes]:
+        """Read located chunks; packs are append-only, so this needs no lock."""
+        by_pack: Dict[str, List[Tuple[int, int, str]]] = {}
+        for h, pack, offset, length in locations:
+            by_pack.setdefault(pack, []).append((offset, length, h))
+        blobs = {}
+        for pack, entries in by_pack.items():
+            with open(os.path.join(self.pack_dir, pack), "rb") as f:
+                for offset, length, h in sorted(entries):
+                    f.seek(offset)
+                    blobs[h] = zlib.decompress(f.read(length))
+        missing = set(unique) - set(blobs)
+        if missing:
+            raise KeyError(f"{len(missing)} chunks missing from store")
+        return blobs
+
+    # --- PUBLIC API ---
+    def save(self, tenant: str, project_id: str, document: Dict[str, Any]) -> Dict[str, Any]:
+        new_chunks: Dict[str, bytes] = {}
+        manifest = self._encode(document, new_chunks)
+        packed_manifest = zlib.compress(json.dumps(manifest, separators=(",", ":")).encode("utf-8"), 9)
+        with self._lock:
+            existing = self._existing(list(new_chunks))
+            to_write = {h: raw for h, raw in new_chunks.items() if h not in existing}
+            written, rows = self._write_pack(to_write) if to_write else (0, [])
+            bytes_written = written + len(packed_manifest)
+            with self._db:
+                self._db.executemany("INSERT OR IGNORE INTO chunks VALUES (?, ?, ?, ?, ?)", rows)
+                cursor = self._db.execute(
+                    "INSERT INTO snapshots (tenant, project_id, created_at, manifest, bytes_written, format) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (tenant, project_id, time.time(), packed_manifest, bytes_written, MANIFEST_FORMAT),
+                )
+        return {
+            "snapshot_id": cursor.lastrowid,
+            "bytes_written": bytes_written,
+            "chunks_total": len(new_chunks),
+            "chunks_new": len(to_write),
+        }
+
+    def load(self, tenant: str, project_id: str, snapshot_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        query = "SELECT id, manifest, format FROM snapshots WHERE tenant = ? AND project_id = ?"
+        params: List[Any] = [tenant, project_id]
+        if snapshot_id is not None:
+            query += " AND id = ?"
+            params.append(snapshot_id)
+        # One connection is shared across executor threads, so every query holds the lock
+        with self._lock:
+            row = self._db.execute(query + " ORDER BY id DESC LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        manifest = json.loads(zlib.decompress(row[1]))
+        refs: List[str] = []
+        self._refs(manifest, refs)
+        unique = list(dict.fromkeys(refs))
+        with self._lock:
+            locations = self._locations(unique)
+        blobs = self._read_chunks(unique, locations)
+        return {"snapshot_id": row[0], "data": self._decode(manifest, blobs, escaped=row[2] >= 2)}
+
+    def history(self, tenant: str, project_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, created_at, bytes_written FROM snapshots WHERE tenant = ? AND project_id = ? "
+                "ORDER BY id DESC LIMIT ?", (tenant, project_id, limit),
+            ).fetchall()
+        return [{"snapshot_id": r[0], "created_at": r[1], "bytes_written": r[2]} for r in rows]
@@ -0,0 +1,335 @@
+"""
+Artisan AI - Puzzle Book Engine
+Server-side replacement for sudokuGenerator.ts / wordSearchGenerator.ts.
+
+Sudoku uses a bitmask solver (row/column/box candidate masks, most-constrained cell
+first). Cells are removed in symmetric pairs and a removal is only kept if the
+solver still finds exactly one solution. Difficulty is calibrated by solver
+effort: the number of branching guesses a deterministic solve needs.
+
+Word search enumerates every legal placement of a word and picks one, instead of
+retrying random positions, so placement never silently fails when a slot exists.
+
+Puzzles are generated in seeded batches on a process pool, so a book is
+reproducible from its seed. SVG markup matches the TS renderers.
+"""
+
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_PUZZLES = 1000
+BATCH_SIZE = 8
+CALIBRATION_ATTEMPTS = 12
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2)
+    return _pool
+
+
+# --- SUDOKU ---
+SUDOKU_DIFFICULTIES = {
+    # target clues (sudokuGenerator.ts), accepted solver-guess range
+    "EASY": (45, 0, 0),
+    "MEDIUM": (35, 0, 2),
+    "HARD": (28, 2, 8),
+    "EXPERT": (22, 8, 10_000),
+}
+FULL_MASK = 0b1111111110  # bits 1..9
+ROW = [i // 9 for i in range(81)]
+COL = [i % 9 for i in range(81)]
+BOX = [(i // 27) * 3 + (i % 9) // 3 for i in range(81)]
+POPCOUNT = [bin(m).count("1") for m in range(1024)]
+MASK_BITS = [tuple(1 << d for d in range(1, 10) if m & (1 << d)) for m in range(1024)]
+BIT_DIGIT = {1 << d: d for d in range(1, 10)}
+
+
+class SudokuSolver:
+    """Counts solutions up to `limit`; records the first solution and effort."""
+
+    def __init__(self, grid: List[int], limit: int = 2, rng: Optional[random.Random] = None):
+        self.grid = list(grid)
+        self.limit = limit
+        self.rng = rng
+        self.count = 0
+        self.guesses = 0
+        self.nodes = 0
+        self.solution: Optional[List[int]] = None
+        self.rows, self.cols, self.boxes = [0] * 9, [0] * 9, [0] * 9
+        self.valid = True
+        empties = []
+        for i, d in enumerate(self.grid):
+            if d == 0:
+                empties.append(i)
+                continue
+            bit = 1 << d
+            if (self.rows[ROW[i]] | self.cols[COL[i]] | self.boxes[BOX[i]]) & bit:
+                self.valid = False
+            self.rows[ROW[i]] |= bit
+            self.cols[COL[i]] |= bit
+            self.boxes[BOX[i]] |= bit
+        self._empties = empties
+
+    def solve(self) -> "SudokuSolver":
+        if self.valid:
+            self._search(self._empties)
+        return self
+
+    def _search(self, empties: List[int]) -> bool:
+        self.nodes += 1
+        if not empties:
+            self.count += 1
+            if self.solution is None:
+                self.solution = list(self.grid)
+            return self.count >= self.limit
+
+        rows, cols, boxes = self.rows, self.cols, self.boxes
+        best_pos, best_n, best_mask = -1, 10, 0
+        for pos, i in enumerate(empties):
+            mask = FULL_MASK & ~(rows[ROW[i]] | cols[COL[i]] | boxes[BOX[i]])
+            n = POPCOUNT[mask]
+            if n < best_n:
+                best_pos, best_n, best_mask = pos, n, mask
+                if n <= 1:
+                    break
+        if best_n == 0:
+            return False
+        if best_n > 1:
+            self.guesses += 1
+
+        i = empties[best_pos]
+        last = empties.pop()
+        if best_pos < len(empties):
+            empties[best_pos] = last
+        r, c, b = ROW[i], COL[i], BOX[i]
+        bits = MASK_BITS[best_mask]
+        if self.rng is not None and len(bits) > 1:
+            bits = list(bits)
+            self.rng.shuffle(bits)
+
+        stop = False
+        for bit in bits:
+            self.grid[i] = BIT_DIGIT[bit]
+            rows[r] |= bit
+            cols[c] |= bit
+            boxes[b] |= bit
+            stop = self._search(empties)
+            rows[r] ^= bit
+            cols[c] ^= bit
+            boxes[b] ^= bit
+            if stop:
+                break
+        self.grid[i] = 0
+
+        if best_pos < len(empties):
+            empties.append(empties[best_pos])
+            empties[best_pos] = i
+        else:
+            empties.append(i)
+        return stop
+
+
+def _carve(solution: List[int], target_clues: int, rng: random.Random) -> List[int]:
+    """Remove symmetric cell pairs while the puzzle keeps a unique solution."""
+    puzzle = list(solution)
+    clues = 81
+    order = list(range(41))  # one representative per symmetric pair (40 is the centre)
+    rng.shuffle(order)
+    for i in order:
+        if clues <= target_clues:
+            break
+        cells = (i,) if i == 40 else (i, 80 - i)
+        for k in cells:
+            puzzle[k] = 0
+        if SudokuSolver(puzzle, limit=2).solve().count == 1:
+            clues -= len(cells)
+        else:
+            for k in cells:
+                puzzle[k] = solution[k]
+    return puzzle
+
+
+def generate_sudoku(seed: int, difficulty: str = "MEDIUM") -> Dict[str, Any]:
+    target, low, high = SUDOKU_DIFFICULTIES.get(difficulty, SUDOKU_DIFFICULTIES["MEDIUM"])
+    rng = random.Random(seed)
+    best = None
+    for _ in range(CALIBRATION_ATTEMPTS):
+        solution = SudokuSolver([0] * 81, limit=1, rng=rng).solve().solution
+        puzzle = _carve(solution, target, rng)
+        effort = SudokuSolver(puzzle, limit=1).solve().guesses
+        distance = max(low - effort, effort - high, 0)
+        if best is None or distance < best[0]:
+            best = (distance, puzzle, solution, effort)
+        if distance == 0:
+            break
+    _, puzzle, solution, effort = best
+    grid = [puzzle[r * 9:(r + 1) * 9] for r in range(9)]
+    return {
+        "puzzle": grid,
+        "solution": [solution[r * 9:(r + 1) * 9] for r in range(9)],
+        "clues": sum(1 for d in puzzle if d),
+        "effort": effort,
+        "difficulty": difficulty,
+        "svg": render_sudoku_svg(puzzle),
+        "solutionSvg": render_sudoku_svg(solution, givens=puzzle),
+    }
+
+
+def render_sudoku_svg(cells: List[int], givens: Optional[List[int]] = None) -> str:
+    cell = 50
+    board = cell * 9
+    parts = [
+        f'<svg width="{board + 10}" height="{board + 10}" viewBox="-5 -5 {board + 10} {board + 10}" xmlns="http://www.w3.org/2000/svg">',
+        f'<rect x="0" y="0" width="{board}" height="{board}" fill="white" stroke="none"/>',
+    ]
+    for i in range(10):
+        w = (4 if i in (0, 9) else 2) if i % 3 == 0 else 1
+        x = i * cell
+        parts.append(f'<line x1="{x}" y1="0" x2="{x}" y2="{board}" stroke="black" stroke-width="{w}" stroke-linecap="square" />')
+        parts.append(f'<line x1="0" y1="{x}" x2="{board}" y2="{x}" stroke="black" stroke-width="{w}" stroke-linecap="square" />')
+    for i, d in enumerate(cells):
+        if not d:
+            continue
+        given = givens is None or givens[i] != 0
+        weight, fill = ("bold", "black") if given else ("normal", "#555555")
+        parts.append(
+            f'<text x="{COL[i] * cell + cell // 2}" y="{ROW[i] * cell + cell // 2 + 10}" font-family="Arial, sans-serif" '
+            f'font-size="32" font-weight="{weight}" text-anchor="middle" fill="{fill}">{d}</text>'
+        )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+# --- WORD SEARCH ---
+WORD_DIRECTIONS = {
+    "EASY": ((0, 1), (1, 0)),
+    "MEDIUM": ((0, 1), (1, 0), (1, 1), (-1, 1)),
+    "HARD": ((0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1)),
+}
+WORD_DIRECTIONS["EXPERT"] = WORD_DIRECTIONS["HARD"]
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+Placement = Tuple[str, int, int, int, int]
+
+
+def _placements(grid: List[List[str]], word: str, directions) -> List[Tuple[int, int, int, int, int]]:
+    """Every (row, col, dr, dc, overlap) where `word` fits. Overlap counts shared letters."""
+    size = len(grid)
+    span = len(word) - 1
+    found = []
+    for dr, dc in directions:
+        r_lo, r_hi = (span, size) if dr < 0 else (0, size - dr * span)
+        c_lo, c_hi = (span, size) if dc < 0 else (0, size - dc * span)
+        for r in range(r_lo, r_hi):
+            for c in range(c_lo, c_hi):
+                overlap = 0
+                for k, ch in enumerate(word):
+                    cur = grid[r + dr * k][c + dc * k]
+                    if cur:
+                        if cur != ch:
+                            break
+                        overlap += 1
+                else:
+                    found.append((r, c, dr, dc, overlap))
+    return found
+
+
+def generate_word_search(seed: int, words: List[str], size: int = 15, difficulty: str = "MEDIUM") -> Dict[str, Any]:
+    rng = random.Random(seed)
+    directions = WORD_DIRECTIONS.get(difficulty, WORD_DIRECTIONS["MEDIUM"])
+    cleaned = [w for w in ("".join(ch for ch in word.upper() if "A" <= ch <= "Z") for word in words) if 1 < len(w) <= size]
+    grid = [[""] * size for _ in range(size)]
+    placed: List[Placement] = []
+    # Longest words first: they have the fewest legal slots
+    for word in sorted(dict.fromkeys(cleaned), key=len, reverse=True):
+        options = _placements(grid, word, directions)
+        if not options:
+            continue
+        if difficulty in ("HARD", "EXPERT"):
+            # Prefer crossings: shared letters make words harder to spot
+            most = max(o[4] for o in options)
+            options = [o for o in options if o[4] == most]
+        r, c, dr, dc, _ = rng.choice(options)
+        for k, ch in enumerate(word):
+            grid[r + dr * k][c + dc * k] = ch
+        placed.append((word, r, c, dr, dc))
+
+    # Hard books fill with letters drawn from the word list, so decoys look like words
+    pool = "".join(w for w, *_ in placed) if difficulty in ("HARD", "EXPERT") and placed else LETTERS
+    for row in grid:
+        for c in range(size):
+            if not row[c]:
+                row[c] = rng.choice(pool)
+
+    return {
+        "grid": ["".join(row) for row in grid],
+        "placedWords": [w for w, *_ in placed],
+        "skippedWords": [w for w in dict.fromkeys(cleaned) if w not in {p[0] for p in placed}],
+        "placements": [{"word": w, "row": r, "col": c, "dr": dr, "dc": dc} for w, r, c, dr, dc in placed],
+        "difficulty": difficulty,
+        "svg": render_word_search_svg(grid),
+        "solutionSvg": render_word_search_svg(grid, placed),
+    }
+
+
+def render_word_search_svg(grid: List[List[str]], placed: Optional[List[Placement]] = None) -> str:
+    cell = 30
+    size = len(grid)
+    board = cell * size
+    parts = [
+        f'<svg width="{board + 20}" height="{board + 20}" viewBox="-10 -10 {board + 20} {board + 20}" xmlns="http://www.w3.org/2000/svg">',
+        f'<rect x="0" y="0" width="{board}" height="{board}" fill="white" stroke="black" stroke-width="2"/>',
+    ]
+    half = cell // 2
+    for word, r, c, dr, dc in placed or ():
+        end_r, end_c = r + dr * (len(word) - 1), c + dc * (len(word) - 1)
+        parts.append(
+            f'<line x1="{c * cell + half}" y1="{r * cell + half}" x2="{end_c * cell + half}" y2="{end_r * cell + half}" '
+            f'stroke="red" stroke-width="{cell - 6}" stroke-linecap="round" opacity="0.25" />'
+        )
+    for r, row in enumerate(grid):
+        for c, ch in enumerate(row):
+            parts.append(
+                f'<text x="{c * cell + half}" y="{r * cell + half + 8}" font-family="Courier New, monospace" '
+                f'font-size="20" text-anchor="middle" fill="black">{ch}</text>'
+            )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+# --- BATCHES ---
+PUZZLE_TYPES = ("sudoku", "word-search")
+
+
+def generate_batch(spec: Dict[str, Any], indices: List[int]) -> List[Dict[str, Any]]:
+    """Worker entry point: generate puzzles `indices` of a book. Seeds derive from the book seed."""
+    out = []
+    for index in indices:
+        started = time.process_time()
+        seed = spec["seed"] * 1_000_003 + index
+        if spec["type"] == "sudoku":
+            puzzle = generate_sudoku(seed, spec["difficulty"])
+        else:
+            words = spec["words"]
+            per = spec.get("words_per_puzzle")
+            if per and per < len(words):
+                words = random.Random(seed ^ 0x5EED).sample(words, per)
+            puzzle = generate_word_search(seed, words, spec["size"], spec["difficulty"])
+        if not spec.get("include_solution", True):
+            puzzle.pop("solutionSvg", None)
+            puzzle.pop("solution", None)
+        puzzle["index"] = index
+        puzzle["cpu_s"] = time.process_time() - started
+        out.append(puzzle)
+    return out
+
+
+def batches(count: int, size: int = BATCH_SIZE) -> List[List[int]]:
+    return [list(range(s, min(s + size, count))) for s in range(0, count, size)]
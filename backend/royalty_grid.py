@@ -0,0 +1,159 @@
+"""
+Artisan AI - Royalty Grid
+Vectorized royalty / print-cost model for /api/profit-estimate.
+
+Print cost follows complianceService.ts estimateProfit (fixed + per-page rate, B&W vs
+color), spine width follows kdp_rules / kdpCalculator.ts, and the royalty rate is the
+same 70% band (2.99 - 9.99) / 35% outside it. Every combination of
+marketplace x paper type x page count x price is computed in one broadcast pass.
+
+Optimal price maximises expected royalty per month under a constant-elasticity demand
+curve (units ~ price ** elasticity), so it is a real interior optimum rather than
+"highest price wins".
+"""
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from kdp_rules import KDP_LIMITS, SPINE_MULTIPLIERS, VALID_TRIM_SIZES, get_cover_dimensions
+
+MAX_CELLS = 250_000
+DEFAULT_ELASTICITY = -2.0
+
+# Printing cost per marketplace as (fixed, per page) in local currency. US mirrors
+# complianceService.ts; the others are approximate local equivalents.
+MARKETPLACES: Dict[str, Dict[str, Any]] = {
+    "US": {"currency": "USD", "bw": (0.85, 0.012), "color": (1.25, 0.07), "band": (2.99, 9.99)},
+    "UK": {"currency": "GBP", "bw": (0.70, 0.010), "color": (0.85, 0.045), "band": (2.99, 9.99)},
+    "DE": {"currency": "EUR", "bw": (0.60, 0.012), "color": (0.70, 0.060), "band": (2.99, 9.99)},
+    "FR": {"currency": "EUR", "bw": (0.60, 0.012), "color": (0.70, 0.060), "band": (2.99, 9.99)},
+    "ES": {"currency": "EUR", "bw": (0.60, 0.012), "color": (0.70, 0.060), "band": (2.99, 9.99)},
+    "IT": {"currency": "EUR", "bw": (0.60, 0.012), "color": (0.70, 0.060), "band": (2.99, 9.99)},
+    "CA": {"currency": "CAD", "bw": (1.26, 0.016), "color": (1.85, 0.090), "band": (2.99, 9.99)},
+    "AU": {"currency": "AUD", "bw": (1.74, 0.017), "color": (2.40, 0.090), "band": (3.99, 14.99)},
+}
+
+# BSR -> monthly sales, same assumptions as complianceService.ts projections
+BSR_SALES = {"bsr_10k": 30, "bsr_50k": 5, "bsr_100k": 1}
+
+
+def expand_axis(spec: Any, default: Sequence[float]) -> np.ndarray:
+    """Accept a scalar, a list, or {"min", "max", "step"} and return a 1-D float array."""
+    if spec is None:
+        return np.asarray(default, dtype=np.float64)
+    if isinstance(spec, dict):
+        start, stop = float(spec["min"]), float(spec["max"])
+        step = float(spec.get("step") or 1.0)
+        if step <= 0 or stop < start:
+            raise ValueError("range needs min <= max and step > 0")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return start + step * np.arange(count, dtype=np.float64)
+    if isinstance(spec, (int, float)):
+        return np.asarray([spec], dtype=np.float64)
+    return np.asarray(list(spec), dtype=np.float64)
+
+
+def compute_grid(prices: np.ndarray, pages: np.ndarray, marketplaces: List[str],
+                 paper_types: List[str], elasticity: float = DEFAULT_ELASTICITY) -> Dict[str, np.ndarray]:
+    """
+    All arrays are shaped (marketplace, paper, pages, price).
+    Returns print cost, royalty rate, net royalty and expected monthly revenue index.
+    """
+    n_m, n_k = len(marketplaces), len(paper_types)
+    fixed = np.empty((n_m, n_k))
+    per_page = np.empty((n_m, n_k))
+    band_lo = np.empty((n_m, 1, 1, 1))
+    band_hi = np.empty((n_m, 1, 1, 1))
+    for i, m in enumerate(marketplaces):
+        rates = MARKETPLACES[m]
+        band_lo[i], band_hi[i] = rates["band"]
+        for j, paper in enumerate(paper_types):
+            fixed[i, j], per_page[i, j] = rates["color" if paper == "premium-color" else "bw"]
+
+    p = prices[None, None, None, :]
+    n = pages[None, None, :, None]
+    print_cost = fixed[:, :, None, None] + per_page[:, :, None, None] * n        # (M, K, N, 1)
+    rate = np.where((p >= band_lo) & (p <= band_hi), 0.70, 0.35)                   # (M, 1, 1, P)
+    net = p * rate - print_cost                                                    # (M, K, N, P)
+    demand = np.power(p, elasticity)
+    expected = np.where(net > 0, net * demand, 0.0)
+    return {"print_cost": print_cost[..., 0], "rate": rate, "net": net, "expected": expected}
+
+
+def estimate(req: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the grid for a profit-estimate request and summarise it per configuration."""
+    prices = expand_axis(req.get("prices", req.get("price")), [9.99])
+    pages = expand_axis(req.get("pages", req.get("page_count")), [200]).round().astype(np.int64)
+    marketplaces = [m.upper() for m in (req.get("marketplaces") or ["US"])]
+    paper_types = req.get("paper_types") or [req.get("paper_type") or "white"]
+    elasticity = float(req.get("elasticity", DEFAULT_ELASTICITY))
+    trim = VALID_TRIM_SIZES.get(req.get("trim_size") or "", VALID_TRIM_SIZES['6" x 9" (Standard)'])
+
+    unknown = [m for m in marketplaces if m not in MARKETPLACES]
+    if unknown:
+        raise ValueError(f"Unknown marketplaces: {', '.join(unknown)}")
+    bad_paper = [p for p in paper_types if p not in SPINE_MULTIPLIERS]
+    if bad_paper:
+        raise ValueError(f"Unknown paper types: {', '.join(bad_paper)}")
+    if prices.size == 0 or pages.size == 0:
+        raise ValueError("prices and pages must not be empty")
+    if np.any(prices <= 0):
+        raise ValueError("prices must be positive")
+    if np.any(pages <= 0):
+        raise ValueError("pages must be positive")
+    cells = prices.size * pages.size * len(marketplaces) * len(paper_types)
+    if cells > MAX_CELLS:
+        raise ValueError(f"Grid has {cells} cells; limit is {MAX_CELLS}")
+
+    prices = np.round(np.sort(prices), 2)
+    grid = compute_grid(prices, pages.astype(np.float64), marketplaces, paper_types, elasticity)
+    net, expected = grid["net"], grid["expected"]
+
+    # Break-even: lowest grid price with net > 0 (complianceService's isViable).
+    # Optimal: argmax of expected revenue.
+    profitable = net > 0
+    has_break_even = profitable.any(axis=-1)
+    break_even_idx = profitable.argmax(axis=-1)
+    optimal_idx = expected.argmax(axis=-1)
+    has_optimal = expected.max(axis=-1) > 0
+    spine = np.round(pages[None, :] * np.array([SPINE_MULTIPLIERS[p] for p in paper_types])[:, None], 4)
+
+    configs: List[Dict[str, Any]] = []
+    for i, m in enumerate(marketplaces):
+        for j, paper in enumerate(paper_types):
+            for k, n in enumerate(pages.tolist()):
+                best = int(optimal_idx[i, j, k])
+                best_net = float(net[i, j, k, best])
+                configs.append({
+                    "marketplace": m,
+                    "currency": MARKETPLACES[m]["currency"],
+                    "paperType": paper,
+                    "pages": n,
+                    "printable": KDP_LIMITS["MIN_PAGES"] <= n <= KDP_LIMITS["MAX_PAGES_STANDARD"],
+                    "spineWidth": float(spine[j, k]),
+                    "spineTextAllowed": n >= KDP_LIMITS["MIN_SPINE_TEXT_PAGES"],
+                    "printingCost": round(float(grid["print_cost"][i, j, k]), 2),
+                    "breakEvenPrice": float(prices[break_even_idx[i, j, k]]) if has_break_even[i, j, k] else None,
+                    "optimalPrice": float(prices[best]) if has_optimal[i, j, k] else None,
+                    "optimalNetRoyalty": round(best_net, 2) if has_optimal[i, j, k] else None,
+                    "projections": {k_: round(v * max(best_net, 0.0)) for k_, v in BSR_SALES.items()},
+                })
+
+    result: Dict[str, Any] = {
+        "axes": {
+            "marketplaces": marketplaces,
+            "paperTypes": paper_types,
+            "pages": pages.tolist(),
+            "prices": prices.tolist(),
+        },
+        "cells": int(cells),
+        "elasticity": elasticity,
+        "cover": get_cover_dimensions(trim[0], trim[1], int(pages.max()), paper_types[0]),
+        "configurations": configs,
+    }
+    if cells == 1:
+        result["royalty"] = round(float(net.ravel()[0]), 2)
+    if req.get("include_grid", True):
+        result["netRoyalty"] = np.round(net, 2).tolist()
+    return result
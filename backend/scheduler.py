@@ -0,0 +1,329 @@
+"""
+Artisan AI - Fair Scheduler
+Sits in front of the inference engine so one heavy tenant cannot starve the rest.
+
+- Per-tenant weighted fair queuing (virtual finish tags, cost = estimated tokens)
+- Two priority classes: "interactive" (short agents) and "bulk" (manuscripts)
+- Server-side per-tenant token-rate limits (token bucket)
+- Batches sized to what fits in device memory (see adaptive_batch.py)
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+from adaptive_batch import BatchSizeLimiter, run_splitting
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+SWEEP_INTERVAL_S = 60.0
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a tenant has spent its token budget for the current window."""
+
+    def __init__(self, tenant: str, retry_after: float):
+        super().__init__(f"Tenant '{tenant}' exceeded its token rate limit")
+        self.tenant = tenant
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def peek(self, amount: float) -> float:
+        """Seconds until `amount` tokens would fit, without consuming them."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    def try_consume(self, amount: float) -> float:
+        """Consume `amount` tokens. Returns 0 on success, else seconds until it would fit."""
+        wait = self.peek(amount)
+        if wait == 0:
+            self.tokens -= min(amount, self.capacity)
+        return wait
+
+
+class Job:
+    """A single queued generation request."""
+
+    __slots__ = ("tenant", "priority", "prompt", "max_tokens", "cost", "finish_tag",
+                 "seq", "future", "enqueued_at", "started_at", "meta")
+
+    def __init__(self, tenant: str, priority: str, prompt: str, max_tokens: int,
+                 cost: float, future: asyncio.Future, meta: Optional[Dict[str, Any]] = None):
+        self.tenant = tenant
+        self.priority = priority
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.cost = cost
+        self.future = future
+        self.meta = meta or {}
+        self.finish_tag = 0.0
+        self.seq = 0
+        self.enqueued_at = time.monotonic()
+        self.started_at = 0.0
+
+    def __lt__(self, other: "Job") -> bool:
+        return (self.finish_tag, self.seq) < (other.finish_tag, other.seq)
+
+
+class _ClassQueue:
+    """WFQ state for one priority class."""
+
+    def __init__(self):
+        self.heap: List[Job] = []
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        self.latencies: Deque[float] = deque(maxlen=2000)
+        self.served = 0
+
+
+def _load_weights() -> Dict[str, float]:
+    raw = os.getenv("ARTISAN_TENANT_WEIGHTS", "")
+    if not raw:
+        return {}
+    try:
+        return {k: float(v) for k, v in json.loads(raw).items()}
+    except (ValueError, AttributeError):
+        print("⚠️ ARTISAN_TENANT_WEIGHTS is not a JSON object, ignoring")
+        return {}
+
+
+def estimate_prompt_tokens(prompt: str) -> int:
+    """Rough token estimate (~4 chars/token) used for scheduling cost."""
+    return max(1, len(prompt) // 4)
+
+
+class FairScheduler:
+    """
+    Weighted fair queue in front of a single inference engine.
+
+    `runner(jobs)` is a blocking callable executed in a worker thread (or a coroutine
+    function awaited on the loop, as the simulator uses); it receives a list of jobs
+    and returns one result per job, in order.
+
+    With `size_key(jobs) -> (family, size)`, batches that run out of memory are split
+    and retried, and the safe batch size per size bucket is learned.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[List[Job]], List[Any]],
+        tenant_weights: Optional[Dict[str, float]] = None,
+        default_weight: float = 1.0,
+        tokens_per_minute: Optional[float] = None,
+        burst_tokens: Optional[float] = None,
+        bulk_share: float = 0.2,
+        max_batch: int = 1,
+        size_key: Optional[Callable[[List[Job]], Hashable]] = None,
+    ):
+        self.runner = runner
+        self.tenant_weights = tenant_weights if tenant_weights is not None else _load_weights()
+        self.default_weight = default_weight
+        self.tokens_per_minute = tokens_per_minute or float(os.getenv("ARTISAN_TENANT_TPM", "60000"))
+        self.burst_tokens = burst_tokens or float(os.getenv("ARTISAN_TENANT_BURST", str(self.tokens_per_minute)))
+        self.bulk_share = bulk_share
+        self.max_batch = max_batch
+        self.size_key = size_key
+        self.limiter = BatchSizeLimiter(max_batch) if size_key else None
+
+        self._queues: Dict[str, _ClassQueue] = {p: _ClassQueue() for p in PRIORITIES}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._seq = itertools.count()
+        self._interactive_streak = 0
+        self._swept = time.monotonic()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.rejected = 0
+
+    # --- ADMISSION ---
+    def _bucket(self, tenant: str) -> TokenBucket:
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            weight = self.weight(tenant)
+            bucket = TokenBucket(self.tokens_per_minute * weight / 60.0, self.burst_tokens * weight)
+            self._buckets[tenant] = bucket
+        return bucket
+
+    def weight(self, tenant: str) -> float:
+        return self.tenant_weights.get(tenant, self.default_weight)
+
+    def _sweep(self):
+        """Forget idle tenants so per-tenant state stays bounded by recent activity.
+
+        A full bucket, or a finish tag behind virtual time, is indistinguishable from a tenant
+        never seen. A class with nothing queued has ended its busy period, so its tags are
+        dropped and virtual time moves past them: everyone starts the next period level.
+        """
+        now = time.monotonic()
+        if now - self._swept < SWEEP_INTERVAL_S:
+            return
+        self._swept = now
+        for tenant in [t for t, b in self._buckets.items() if b.full()]:
+            del self._buckets[tenant]
+        for q in self._queues.values():
+            if not q.heap:
+                q.virtual_time = max([q.virtual_time, *q.last_finish.values()])
+                q.last_finish.clear()
+                continue
+            for tenant in [t for t, tag in q.last_finish.items() if tag <= q.virtual_time]:
+                del q.last_finish[tenant]
+
+    async def submit(self, prompt: str, tenant: str = "anonymous",
+                     priority: str = PRIORITY_INTERACTIVE, max_tokens: int = 4000,
+                     meta: Optional[Dict[str, Any]] = None) -> Any:
+        """Queue a prompt and wait for its result. Raises RateLimitExceeded when over budget."""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class '{priority}'")
+        self._sweep()
+        cost = estimate_prompt_tokens(prompt) + max_tokens
+        wait = self._bucket(tenant).try_consume(cost)
+        if wait > 0:
+            self.rejected += 1
+            raise RateLimitExceeded(tenant, wait)
+
+        loop = asyncio.get_running_loop()
+        job = Job(tenant, priority, prompt, max_tokens, cost, loop.create_future(), meta)
+        self._enqueue(job)
+        self._ensure_worker()
+        return await job.future
+
+    def _enqueue(self, job: Job):
+        q = self._queues[job.priority]
+        start = max(q.virtual_time, q.last_finish.get(job.tenant, 0.0))
+        job.finish_tag = start + job.cost / self.weight(job.tenant)
+        job.seq = next(self._seq)
+        q.last_finish[job.tenant] = job.finish_tag
+        heapq.heappush(q.heap, job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # --- DISPATCH ---
+    def _next_class(self) -> Optional[str]:
+        interactive = self._queues[PRIORITY_INTERACTIVE].heap
+        bulk = self._queues[PRIORITY_BULK].heap
+        if not interactive and not bulk:
+            return None
+        if not bulk:
+            return PRIORITY_INTERACTIVE
+        if not interactive:
+            return PRIORITY_BULK
+        # Interactive wins, but bulk is guaranteed `bulk_share` of slots while backlogged
+        streak_limit = max(1, math.ceil(1 / self.bulk_share) - 1) if self.bulk_share > 0 else math.inf
+        if self._interactive_streak >= streak_limit:
+            return PRIORITY_BULK
+        return PRIORITY_INTERACTIVE
+
+    def _take_batch(self, priority: str) -> List[Job]:
+        q = self._queues[priority]
+        batch: List[Job] = []
+        while q.heap and len(batch) < self.max_batch:
+            # Leave the rest queued once the next job would push the batch past what fits
+            if batch and self.limiter and len(batch) >= self.limiter.limit(self.size_key(batch + [q.heap[0]])):
+                break
+            job = heapq.heappop(q.heap)
+            q.virtual_time = max(q.virtual_time, job.finish_tag - job.cost / self.weight(job.tenant))
+            if job.future.cancelled():
+                continue
+            batch.append(job)
+        if priority == PRIORITY_INTERACTIVE:
+            self._interactive_streak += 1
+        else:
+            self._interactive_streak = 0
+        return batch
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            priority = self._next_class()
+            if priority is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            batch = self._take_batch(priority)
+            if not batch:
+                continue
+            now = time.monotonic()
+            for job in batch:
+                job.started_at = now
+            try:
+                if asyncio.iscoroutinefunction(self.runner):
+                    results = await self.runner(batch)
+                else:
+                    results = await loop.run_in_executor(None, self._execute, batch)
+            except Exception as e:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                continue
+            finished = time.monotonic()
+            q = self._queues[priority]
+            for job, result in zip(batch, results):
+                q.latencies.append(finished - job.enqueued_at)
+                q.served += 1
+                if not job.future.done():
+                    if isinstance(result, Exception):
+                        job.future.set_exception(result)
+                    else:
+                        job.future.set_result(result)
+
+    def _execute(self, batch: List[Job]) -> List[Any]:
+        if self.limiter is None:
+            return self.runner(batch)
+        # A job that does not fit even alone fails with its OOM error; the rest still run
+        return run_splitting(self.runner, batch, self.limiter, self.size_key, lambda e: e)
+
+    # --- METRICS ---
+    def queue_depth(self, priority: Optional[str] = None) -> int:
+        if priority:
+            return len(self._queues[priority].heap)
+        return sum(len(q.heap) for q in self._queues.values())
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"rejected": self.rejected, "tenants": len(self._buckets), "classes": {}}
+        if self.limiter:
+            out["batch_limits"] = self.limiter.stats()
+        for name, q in self._queues.items():
+            lat = sorted(q.latencies)
+
+            def pct(p: float) -> Optional[float]:
+                if not lat:
+                    return None
+                return round(lat[min(len(lat) - 1, int(p * len(lat)))], 3)
+
+            out["classes"][name] = {
+                "queued": len(q.heap),
+                "served": q.served,
+                "p50_s": pct(0.50),
+                "p99_s": pct(0.99),
+            }
+        return out
@@ -0,0 +1,312 @@
+"""
+Artisan AI - Semantic Cache
+Reuses agent answers for queries that mean the same thing ("cozy mystery books"
+vs "cozy mysteries"), not just identical strings.
+
+Queries are embedded with a small sentence-embedding model on CPU (mean-pooled,
+L2-normalised, so dot product = cosine similarity). Each namespace keeps a
+matrix of vectors with an IVF index: once enough entries exist, k-means
+centroids are trained and a lookup only scans the `nprobe` closest lists. A
+cached answer is reused when similarity clears the agent's threshold.
+
+ARTISAN_SEMANTIC_CACHE_SIZE is one entry budget shared by all namespaces: past
+it, the oldest entries of the least recently used namespace are evicted. The
+matrices start small, double as a namespace fills and are compacted when it
+empties, so memory follows the entries actually held. Entries also expire
+after a TTL.
+
+If the embedding model cannot be loaded (no download access), the failure is
+remembered and every lookup is a miss that is not stored, so agents still answer.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBED_MODEL = os.getenv("ARTISAN_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+CACHE_CAPACITY = int(os.getenv("ARTISAN_SEMANTIC_CACHE_SIZE", "20000"))
+CACHE_TTL_S = float(os.getenv("ARTISAN_SEMANTIC_CACHE_TTL", str(24 * 3600)))
+MAX_NAMESPACES = 1000
+INITIAL_SLOTS = 16
+TRAIN_AT = 1024          # flat scan below this, IVF above
+NPROBE = 4
+
+# Minimum cosine similarity for reuse. Brand analysis depends on exact names, so it is stricter.
+DEFAULT_THRESHOLD = 0.92
+AGENT_THRESHOLDS = {
+    "trend-analysis": float(os.getenv("ARTISAN_SIM_TREND", "0.90")),
+    "brand-intel": float(os.getenv("ARTISAN_SIM_BRAND", "0.95")),
+}
+
+
+class Embedder:
+    """Small transformer encoder on CPU, loaded on first use."""
+
+    def __init__(self, model_name: str = EMBED_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._tokenizer = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None and not self._failed:
+                try:
+                    from transformers import AutoModel, AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    self._model = AutoModel.from_pretrained(self.model_name).eval()
+                except Exception as e:
+                    print(f"⚠️ Embedding model unavailable ({e}), semantic cache disabled")
+                    self._failed = True
+        return self._model, self._tokenizer
+
+    def encode(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Unit vectors, one row per text; None when the model could not be loaded."""
+        import torch
+        model, tokenizer = self._load()
+        if model is None:
+            return None
+        batch = tokenizer([t.lower().strip() for t in texts], padding=True, truncation=True,
+                          max_length=128, return_tensors="pt")
+        with torch.inference_mode():
+            hidden = model(**batch).last_hidden_state
+        mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+        vectors = pooled.numpy().astype(np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class VectorIndex:
+    """Cosine index of up to `capacity` entries: flat scan when small, IVF once trained. LRU eviction."""
+
+    def __init__(self, dim: int, capacity: int, nprobe: int = NPROBE, slots: int = INITIAL_SLOTS):
+        self.dim = dim
+        self.capacity = capacity
+        self.nprobe = nprobe
+        slots = max(1, min(slots, capacity))
+        self.vectors = np.zeros((slots, dim), dtype=np.float32)
+        self.payloads: List[Any] = [None] * slots
+        self.expires = np.zeros(slots, dtype=np.float64)
+        self.live = np.zeros(slots, dtype=bool)
+        self.lru: "OrderedDict[int, None]" = OrderedDict()
+        self.free = list(range(slots - 1, -1, -1))
+        self.centroids: Optional[np.ndarray] = None
+        self.assign = np.full(slots, -1, dtype=np.int32)
+        self.lists: List[set] = []
+        self.trained_at = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.lru)
+
+    @property
+    def allocated(self) -> int:
+        return len(self.payloads)
+
+    def _grow(self):
+        old = self.allocated
+        new = min(self.capacity, old * 2)
+        self.vectors = np.concatenate([self.vectors, np.zeros((new - old, self.dim), dtype=np.float32)])
+        self.payloads.extend([None] * (new - old))
+        self.expires = np.concatenate([self.expires, np.zeros(new - old, dtype=np.float64)])
+        self.live = np.concatenate([self.live, np.zeros(new - old, dtype=bool)])
+        self.assign = np.concatenate([self.assign, np.full(new - old, -1, dtype=np.int32)])
+        self.free.extend(range(new - 1, old - 1, -1))
+
+    def compacted(self) -> "VectorIndex":
+        """A copy holding the same entries (oldest first) in arrays sized to them."""
+        index = VectorIndex(self.dim, self.capacity, self.nprobe, slots=max(INITIAL_SLOTS, 2 * len(self)))
+        for slot in self.lru:
+            index.add(self.vectors[slot], self.payloads[slot], self.expires[slot])
+        index.evictions = self.evictions
+        return index
+
+    def evict_oldest(self):
+        oldest, _ = self.lru.popitem(last=False)
+        self.remove(oldest, already_unlinked=True)
+        self.evictions += 1
+
+    def _train(self):
+        slots = np.flatnonzero(self.live)
+        data = self.vectors[slots]
+        k = max(8, int(np.sqrt(len(slots))))
+        rng = np.random.default_rng(len(slots))
+        centroids = data[rng.choice(len(slots), k, replace=False)]
+        for _ in range(8):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for c in range(k):
+                members = data[labels == c]
+                if len(members):
+                    mean = members.mean(axis=0)
+                    centroids[c] = mean / max(np.linalg.norm(mean), 1e-12)
+        self.centroids = centroids
+        labels = np.argmax(data @ centroids.T, axis=1)
+        self.lists = [set() for _ in range(k)]
+        self.assign[:] = -1
+        for slot, c in zip(slots.tolist(), labels.tolist()):
+            self.assign[slot] = c
+            self.lists[c].add(slot)
+        self.trained_at = len(slots)
+
+    def _candidates(self, vec: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.flatnonzero(self.live)
+        probe = np.argpartition(-(self.centroids @ vec), min(self.nprobe, len(self.centroids) - 1))[:self.nprobe]
+        out = []
+        for c in probe.tolist():
+            out.extend(self.lists[c])
+        return np.fromiter(out, dtype=np.int64, count=len(out))
+
+    def search(self, vec: np.ndarray, now: float) -> Tuple[Optional[int], float]:
+        slots = self._candidates(vec)
+        if slots.size == 0:
+            return None, 0.0
+        sims = self.vectors[slots] @ vec
+        expired = self.expires[slots] < now
+        if expired.any():
+            # Drop every expired candidate, then pick the best of what is still live
+            for stale in slots[expired].tolist():
+                self.remove(stale)
+            slots, sims = slots[~expired], sims[~expired]
+            if slots.size == 0:
+                return None, 0.0
+        best = int(np.argmax(sims))
+        slot = int(slots[best])
+        self.lru.move_to_end(slot)
+        return slot, float(sims[best])
+
+    def add(self, vec: np.ndarray, payload: Any, expires: float) -> int:
+        if not self.free:
+            if self.allocated < self.capacity:
+                self._grow()
+            else:
+                self.evict_oldest()
+        slot = self.free.pop()
+        self.vectors[slot] = vec
+        self.payloads[slot] = payload
+        self.expires[slot] = expires
+        self.live[slot] = True
+        self.lru[slot] = None
+        if self.centroids is not None:
+            c = int(np.argmax(self.centroids @ vec))
+            self.assign[slot] = c
+            self.lists[c].add(slot)
+        # Train once big enough, then retrain as the index doubles
+        count = len(self.lru)
+        if count >= TRAIN_AT and count >= 2 * self.trained_at:
+            self._train()
+        return slot
+
+    def remove(self, slot: int, already_unlinked: bool = False):
+        if not self.live[slot]:
+            return
+        if not already_unlinked:
+            self.lru.pop(slot, None)
+        if self.assign[slot] >= 0:
+            self.lists[self.assign[slot]].discard(slot)
+            self.assign[slot] = -1
+        self.live[slot] = False
+        self.payloads[slot] = None
+        self.free.append(slot)
+
+
+class SemanticCache:
+    def __init__(self, embedder: Optional[Embedder] = None, capacity: int = CACHE_CAPACITY,
+                 ttl_s: float = CACHE_TTL_S, thresholds: Optional[Dict[str, float]] = None):
+        self.embedder = embedder or Embedder()
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self.thresholds = dict(AGENT_THRESHOLDS, **(thresholds or {}))
+        self._indexes: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self.evictions = 0
+
+    def _metric(self, agent: str) -> Dict[str, float]:
+        return self._metrics.setdefault(agent, {"hits": 0, "misses": 0, "stores": 0, "lookup_ms": 0.0})
+
+    def get(self, agent: str, namespace: str, query: str,
+            slack: float = 0.0) -> Tuple[Optional[Any], float, Optional[np.ndarray]]:
+        """
+        Returns (cached value or None, best similarity, query vector for a later put).
+        `slack` lowers the agent's threshold, trading precision for hits under load.
+        Without an embedding model this is always a miss with no vector.
+        """
+        started = time.perf_counter()
+        vectors = self.embedder.encode([query])
+        if vectors is None:
+            with self._lock:
+                self._metric(agent)["misses"] += 1
+            return None, 0.0, None
+        vec = vectors[0]
+        threshold = self.thresholds.get(agent, DEFAULT_THRESHOLD) - slack
+        with self._lock:
+            index = self._indexes.get(namespace)
+            slot, sim = index.search(vec, time.time()) if index is not None else (None, 0.0)
+            hit = slot is not None and sim >= threshold
+            value = index.payloads[slot] if hit else None
+            if index is not None and not hit:
+                # Expired entries were dropped by the search; give back their memory
+                self._shrink(namespace)
+            metric = self._metric(agent)
+            metric["hits" if hit else "misses"] += 1
+            metric["lookup_ms"] += (time.perf_counter() - started) * 1000
+            return value, sim, vec
+
+    def put(self, agent: str, namespace: str, vec: Optional[np.ndarray], value: Any):
+        if vec is None:
+            return
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = VectorIndex(vec.shape[0], self.capacity)
+                while len(self._indexes) > MAX_NAMESPACES:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(namespace)
+            index.add(vec, value, time.time() + self.ttl_s)
+            self._metric(agent)["stores"] += 1
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        """Evict from the least recently used namespaces until all of them fit `capacity` together."""
+        excess = sum(len(i) for i in self._indexes.values()) - self.capacity
+        while excess > 0:
+            namespace, index = next(iter(self._indexes.items()))
+            while excess > 0 and len(index):
+                index.evict_oldest()
+                self.evictions += 1
+                excess -= 1
+            self._shrink(namespace)
+
+    def _shrink(self, namespace: str):
+        index = self._indexes[namespace]
+        if not len(index):
+            del self._indexes[namespace]
+        elif index.allocated > INITIAL_SLOTS and 4 * len(index) < index.allocated:
+            self._indexes[namespace] = index.compacted()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            agents = {}
+            for agent, m in self._metrics.items():
+                lookups = m["hits"] + m["misses"]
+                agents[agent] = {
+                    "hits": int(m["hits"]), "misses": int(m["misses"]), "stores": int(m["stores"]),
+                    "hit_rate": round(m["hits"] / lookups, 3) if lookups else None,
+                    "avg_lookup_ms": round(m["lookup_ms"] / lookups, 2) if lookups else None,
+                    "threshold": self.thresholds.get(agent, DEFAULT_THRESHOLD),
+                }
+            return {
+                "embedder": "unavailable" if self.embedder._failed else ("loaded" if self.embedder._model else "lazy"),
+                "namespaces": len(self._indexes),
+                "entries": sum(len(i) for i in self._indexes.values()),
+                "evictions": self.evictions,
+                "capacity": self.capacity,
+                "allocated_mb": round(sum(i.vectors.nbytes for i in self._indexes.values()) / 1024 ** 2, 1),
+                "agents": agents,
+            }
@@ -0,0 +1,208 @@
+"""
+Artisan AI - Inference Simulator
+Timing model of the GPU engine for app_mock.py, so load tests against the mock
+behave like the real backend: queueing, batching and autoscaling policies can be
+capacity-planned on a laptop with no GPU.
+
+  text batch   cold + prefill_s * batch * longest_prompt
+                    + longest_output * decode_s * (1 + decode_batch_factor * (batch - 1))
+  image batch  cold + steps * step_s * megapixels * (1 + image_batch_factor * (batch - 1))
+
+Text and image batches share one simulated device and sleep with asyncio.sleep.
+The first batch (and the first after `idle_unload_s` idle, if set) pays
+`cold_start_s`. ARTISAN_SIM_SPEED > 1 compresses time for quick runs.
+
+Parameters come from a JSON file (ARTISAN_SIM_PARAMS) fitted to real runs:
+
+    ARTISAN_TIMING_LOG=timings.jsonl python app.py         # real backend logs batch timings
+    python sim_engine.py fit timings.jsonl > sim_params.json
+    ARTISAN_SIM_PARAMS=sim_params.json python app_mock.py
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_PARAMS: Dict[str, Any] = {
+    "prefill_s": 0.0005,           # per prompt token per row (padded)
+    "decode_s": 0.03,              # per decode step for a single row
+    "decode_batch_factor": 0.05,   # extra decode time per additional row
+    "step_s": 0.35,                # per diffusion step at 1024x1024
+    "image_batch_factor": 0.9,     # extra time per additional image in a batch
+    "cold_start_s": 20.0,          # model load before the first batch
+    "idle_unload_s": 0.0,          # idle time after which the model counts as unloaded (0 = never)
+    "output_jitter": 0.15,         # +/- fraction applied to generated length
+    # Typical generated tokens per agent; long-form agents fill most of their budget
+    "output_tokens": {"default": 400, "niche-analysis": 180, "amazon-seo": 450, "brand-intel": 600,
+                      "trend-analysis": 500, "aplus-generate": 700, "humanize": 500},
+    "fill_fraction": {"kdp-generate": 0.9, "expand-chapter": 0.95},
+}
+
+
+def load_params(path: Optional[str] = None) -> Dict[str, Any]:
+    params = json.loads(json.dumps(DEFAULT_PARAMS))
+    path = path or os.getenv("ARTISAN_SIM_PARAMS")
+    if path:
+        try:
+            with open(path) as f:
+                for key, value in json.load(f).items():
+                    if isinstance(value, dict) and isinstance(params.get(key), dict):
+                        params[key].update(value)
+                    else:
+                        params[key] = value
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ Could not read ARTISAN_SIM_PARAMS ({e}), using default timings")
+    return params
+
+
+class SimEngine:
+    def __init__(self, params: Optional[Dict[str, Any]] = None, speed: Optional[float] = None, seed: int = 0):
+        self.params = params or load_params()
+        self.speed = speed or float(os.getenv("ARTISAN_SIM_SPEED", "1"))
+        self.rng = random.Random(seed)
+        self._device: Optional[asyncio.Lock] = None
+        self._last_busy: Optional[float] = None
+        self.started = time.monotonic()
+        self.metrics = {"text_batches": 0, "text_rows": 0, "prompt_tokens": 0, "output_tokens": 0,
+                        "image_batches": 0, "images": 0, "cold_starts": 0, "busy_s": 0.0, "decode_s": 0.0,
+                        "decode_steps": 0}
+
+    # --- TIMING MODEL ---
+    def output_tokens(self, agent: Optional[str], max_tokens: int) -> int:
+        p = self.params
+        fill = p["fill_fraction"].get(agent or "")
+        typical = max_tokens * fill if fill else p["output_tokens"].get(agent or "", p["output_tokens"]["default"])
+        jitter = 1 + self.rng.uniform(-p["output_jitter"], p["output_jitter"])
+        return max(1, min(max_tokens, int(typical * jitter)))
+
+    def text_seconds(self, prompt_tokens: Sequence[int], output_tokens: Sequence[int]) -> Dict[str, float]:
+        p, rows = self.params, len(prompt_tokens)
+        return {
+            "prefill": p["prefill_s"] * rows * max(prompt_tokens),
+            "decode": max(output_tokens) * p["decode_s"] * (1 + p["decode_batch_factor"] * (rows - 1)),
+        }
+
+    def image_seconds(self, count: int, width: int, height: int, steps: int) -> float:
+        p = self.params
+        return steps * p["step_s"] * (width * height) / (1024 * 1024) * (1 + p["image_batch_factor"] * (count - 1))
+
+    # --- DEVICE ---
+    async def _occupy(self, seconds: float) -> float:
+        """Hold the simulated device for `seconds` (plus a cold start when due); returns simulated time."""
+        if self._device is None:
+            self._device = asyncio.Lock()
+        async with self._device:
+            now = time.monotonic()
+            idle = self.params["idle_unload_s"]
+            if self._last_busy is None or (idle and (now - self._last_busy) * self.speed > idle):
+                seconds += self.params["cold_start_s"]
+                self.metrics["cold_starts"] += 1
+            await asyncio.sleep(seconds / self.speed)
+            self._last_busy = time.monotonic()
+            self.metrics["busy_s"] += seconds
+        return seconds
+
+    async def run_text(self, jobs: List[Any]) -> List[Dict[str, Any]]:
+        """FairScheduler runner: one padded batch of scheduler Jobs."""
+        from scheduler import estimate_prompt_tokens
+        prompts = [estimate_prompt_tokens(job.prompt) for job in jobs]
+        outputs = [self.output_tokens(job.meta.get("agent"), job.max_tokens) for job in jobs]
+        parts = self.text_seconds(prompts, outputs)
+        await self._occupy(parts["prefill"] + parts["decode"])
+        m = self.metrics
+        m["text_batches"] += 1
+        m["text_rows"] += len(jobs)
+        m["prompt_tokens"] += sum(prompts)
+        m["output_tokens"] += sum(outputs)
+        m["decode_s"] += parts["decode"]
+        m["decode_steps"] += max(outputs)
+        return [{"text": f"[SIMULATED OUTPUT] {n} tokens for: {job.prompt[:50]}...", "tokens": n}
+                for job, n in zip(jobs, outputs)]
+
+    async def run_images(self, count: int, width: int = 1024, height: int = 1024, steps: int = 4) -> float:
+        seconds = await self._occupy(self.image_seconds(count, width, height, steps))
+        self.metrics["image_batches"] += 1
+        self.metrics["images"] += count
+        return seconds
+
+    def stats(self) -> Dict[str, Any]:
+        m = dict(self.metrics)
+        elapsed = (time.monotonic() - self.started) * self.speed
+        m["busy_s"] = round(m["busy_s"], 3)
+        m["utilization"] = round(min(1.0, m["busy_s"] / elapsed), 3) if elapsed else 0.0
+        m["mean_text_batch"] = round(m["text_rows"] / m["text_batches"], 2) if m["text_batches"] else None
+        decode_s = m.pop("decode_s")
+        m["decode_ms_per_token"] = round(decode_s / m["decode_steps"] * 1000, 2) if m["decode_steps"] else None
+        return {"speed": self.speed, "params": self.params, **m}
+
+
+class TimingLog:
+    """Appends real batch timings as JSONL in the format `fit` reads; a no-op without a path."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path if path is not None else os.getenv("ARTISAN_TIMING_LOG")
+        self._lock = threading.Lock()
+
+    def write(self, kind: str, **fields):
+        if not self.path:
+            return
+        if "seconds" in fields:
+            fields["seconds"] = round(fields["seconds"], 4)
+        line = json.dumps({"kind": kind, **fields})
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+# --- FITTING ---
+def _lstsq(rows: List[List[float]], targets: List[float]) -> List[float]:
+    import numpy as np
+    coef, *_ = np.linalg.lstsq(np.array(rows, dtype=float), np.array(targets, dtype=float), rcond=None)
+    return [max(0.0, float(c)) for c in coef]
+
+
+def fit(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Least-squares fit of the timing model to logged runs:
+      {"kind": "text", "batch", "prompt_tokens" (longest), "new_tokens", "seconds"}
+      {"kind": "image", "batch", "width", "height", "steps", "seconds"}
+      {"kind": "cold", "seconds"}
+      {"kind": "output", "agent", "tokens"}      generated length per agent call
+    """
+    params: Dict[str, Any] = {}
+    text = [r for r in records if r["kind"] == "text" and r.get("new_tokens")]
+    if len(text) >= 3:
+        prefill_s, decode_s, extra = _lstsq(
+            [[r["batch"] * r["prompt_tokens"], r["new_tokens"], r["new_tokens"] * (r["batch"] - 1)] for r in text],
+            [r["seconds"] for r in text],
+        )
+        params.update(prefill_s=prefill_s, decode_s=decode_s,
+                      decode_batch_factor=extra / decode_s if decode_s else DEFAULT_PARAMS["decode_batch_factor"])
+    images = [r for r in records if r["kind"] == "image"]
+    if len(images) >= 2:
+        work = [r["steps"] * r["width"] * r["height"] / (1024 * 1024) for r in images]
+        step_s, extra = _lstsq([[w, w * (r["batch"] - 1)] for w, r in zip(work, images)],
+                               [r["seconds"] for r in images])
+        params.update(step_s=step_s,
+                      image_batch_factor=extra / step_s if step_s else DEFAULT_PARAMS["image_batch_factor"])
+    cold = sorted(r["seconds"] for r in records if r["kind"] == "cold")
+    if cold:
+        params["cold_start_s"] = cold[len(cold) // 2]
+    outputs: Dict[str, List[int]] = {}
+    for r in records:
+        if r["kind"] == "output" and r.get("agent"):
+            outputs.setdefault(r["agent"], []).append(r["tokens"])
+    if outputs:
+        params["output_tokens"] = {a: sorted(v)[len(v) // 2] for a, v in outputs.items()}
+    return {k: round(v, 6) if isinstance(v, float) else v for k, v in params.items()}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "fit":
+        sys.exit("Usage: python sim_engine.py fit timings.jsonl > sim_params.json")
+    with open(sys.argv[2]) as f:
+        print(json.dumps(fit([json.loads(line) for line in f if line.strip()]), indent=2))
@@ -0,0 +1,71 @@
+"""
+Artisan AI - Tenant Identity
+The tenant a request is scheduled, rate-limited and billed as.
+
+- API keys map to tenants through ARTISAN_API_KEYS, a JSON object
+  {"<key>": "<tenant>"}; clients send the key as `X-API-Key` or
+  `Authorization: Bearer <key>`. An unknown key is a 401.
+- Requests without a key all share the "anonymous" tenant, so one client cannot
+  mint fresh rate-limit buckets by changing a header.
+- X-Tenant-ID is honoured only with ARTISAN_TRUST_TENANT_HEADER=1, for
+  deployments behind a gateway that authenticates callers and sets it.
+
+Keys are held as SHA-256 digests, so lookups do not compare secrets byte by byte.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Mapping, Optional
+
+from fastapi import Header, HTTPException
+
+ANONYMOUS = "anonymous"
+TRUST_TENANT_HEADER = os.getenv("ARTISAN_TRUST_TENANT_HEADER", "0") == "1"
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _load_keys() -> Dict[str, str]:
+    raw = os.getenv("ARTISAN_API_KEYS", "")
+    if not raw:
+        return {}
+    try:
+        return {_digest(k): str(v) for k, v in json.loads(raw).items() if k and v}
+    except (ValueError, AttributeError):
+        print("⚠️ ARTISAN_API_KEYS is not a JSON object, every caller is anonymous")
+        return {}
+
+
+API_KEYS = _load_keys()
+
+
+def _bearer(authorization: Optional[str]) -> Optional[str]:
+    if authorization and authorization[:7].lower() == "bearer ":
+        return authorization[7:].strip() or None
+    return None
+
+
+def tenant_for(api_key: Optional[str], tenant_header: Optional[str] = None) -> Optional[str]:
+    """Tenant for these credentials; None when a key was given but is not known."""
+    if api_key:
+        return API_KEYS.get(_digest(api_key))
+    if TRUST_TENANT_HEADER and tenant_header:
+        return tenant_header
+    return ANONYMOUS
+
+
+def tenant_of(headers: Mapping[str, str]) -> Optional[str]:
+    """Non-raising lookup from raw request headers (for logging; unknown keys give None)."""
+    return tenant_for(headers.get("x-api-key") or _bearer(headers.get("authorization")), headers.get("x-tenant-id"))
+
+
+def get_tenant(x_api_key: Optional[str] = Header(None), authorization: Optional[str] = Header(None),
+               x_tenant_id: Optional[str] = Header(None)) -> str:
+    """FastAPI dependency: the authenticated tenant, or 401 for an unknown key."""
+    tenant = tenant_for(x_api_key or _bearer(authorization), x_tenant_id)
+    if tenant is None:
+        raise HTTPException(status_code=401, detail="Unknown API key")
+    return tenant
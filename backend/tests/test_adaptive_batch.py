@@ -0,0 +1,103 @@
+import pytest
+
+from adaptive_batch import BatchSizeLimiter, is_oom, pow2_bucket, run_splitting
+
+KEY = ("text", 4096)
+
+
+class OutOfMemoryError(RuntimeError):
+    pass
+
+
+class FakeDevice:
+    """Runs batches of up to `fits` items; larger ones raise like torch does."""
+
+    def __init__(self, fits):
+        self.fits = fits
+        self.calls = []
+
+    def __call__(self, items):
+        self.calls.append(len(items))
+        if len(items) > self.fits:
+            raise OutOfMemoryError("CUDA out of memory")
+        return [item * 10 for item in items]
+
+
+def run(device, items, limiter):
+    return run_splitting(device, items, limiter, lambda batch: KEY, lambda e: "failed")
+
+
+def test_oom_detection():
+    assert is_oom(OutOfMemoryError("boom"))
+    assert is_oom(RuntimeError("CUDA error: out of memory"))
+    assert not is_oom(ValueError("bad input"))
+
+
+def test_pow2_bucket():
+    assert [pow2_bucket(n) for n in (0, 1, 2, 3, 1000, 1024, 1025)] == [1, 1, 2, 4, 1024, 1024, 2048]
+
+
+def test_oom_halves_the_batch_and_keeps_order():
+    limiter = BatchSizeLimiter(8, memory=lambda: None)
+    device = FakeDevice(fits=2)
+    assert run(device, list(range(8)), limiter) == [i * 10 for i in range(8)]
+    # The second half is already cut to the limit learned from the first
+    assert device.calls == [8, 4, 2, 2, 2, 2]
+    assert limiter.stats()[str(KEY)] == {"limit": 2, "ooms": 2, "probes": 0}
+
+    # The learned limit is applied up front next time
+    device.calls.clear()
+    run(device, list(range(8)), limiter)
+    assert device.calls == [2, 2, 2, 2]
+
+
+def test_single_item_that_does_not_fit_fails_alone():
+    limiter = BatchSizeLimiter(4, memory=lambda: None)
+    device = FakeDevice(fits=0)
+    assert run(device, [1, 2], limiter) == ["failed", "failed"]
+
+
+def test_other_errors_propagate():
+    limiter = BatchSizeLimiter(4, memory=lambda: None)
+
+    def broken(items):
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        run(broken, [1, 2], limiter)
+
+
+def test_probes_up_after_clean_batches_and_cooldown():
+    limiter = BatchSizeLimiter(8, probe_after=3, cooldown_s=0.0, memory=lambda: None)
+    limiter.record_oom(KEY, 4)
+    assert limiter.limit(KEY) == 2
+    for _ in range(2):
+        limiter.record_success(KEY, 2)
+    assert limiter.limit(KEY) == 2
+    limiter.record_success(KEY, 2)
+    assert limiter.limit(KEY) == 3
+    # Batches below the limit do not count towards the next probe
+    for _ in range(3):
+        limiter.record_success(KEY, 1)
+    assert limiter.limit(KEY) == 3
+    assert limiter.stats()[str(KEY)]["probes"] == 1
+
+
+def test_no_probe_before_cooldown_unless_memory_was_freed():
+    free = [1000]
+    limiter = BatchSizeLimiter(8, probe_after=1, cooldown_s=3600, memory=lambda: (free[0], 10000))
+    limiter.record_oom(KEY, 4)
+    limiter.record_success(KEY, 2)
+    assert limiter.limit(KEY) == 2
+    free[0] = 3000
+    assert limiter.limit(KEY) == 3
+
+
+def test_larger_sizes_of_a_family_inherit_the_limit():
+    limiter = BatchSizeLimiter(8, memory=lambda: None)
+    assert limiter.limit(("text", 8192)) == 8
+    limiter.record_oom(("text", 2048), 4)
+    assert limiter.limit(("text", 8192)) == 2
+    assert limiter.limit(("text", 16384)) == 2
+    assert limiter.limit(("text", 1024)) == 8
+    assert limiter.limit(("image", 4096)) == 8
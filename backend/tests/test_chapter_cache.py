@@ -0,0 +1,75 @@
+from chapter_cache import ChapterCache, section_hash, split_sections
+
+OUTLINE = "The storm hits the harbour.\n\nMara finds the letter.\n\nThe ferry leaves without her."
+
+
+def expand(cache, outline, tenant="t", chapter_id="ch1"):
+    """One re-expansion round where the 'model' writes PROSE(<section>)."""
+    plan = cache.plan(tenant, chapter_id, outline)
+    generated = {i: f"PROSE({plan.sections[i]})" for i in plan.regenerate}
+    return plan, cache.commit(plan, generated)
+
+
+def test_split_sections_prefers_paragraphs_then_lines():
+    assert split_sections(OUTLINE) == ["The storm hits the harbour.", "Mara finds the letter.",
+                                       "The ferry leaves without her."]
+    assert split_sections("one\ntwo\n  \n") == ["one", "two"]
+    assert split_sections("   ") == []
+
+
+def test_section_hash_ignores_case_and_whitespace():
+    assert section_hash("Mara  finds\nthe letter.") == section_hash("mara finds the letter.")
+    assert section_hash("Mara finds the letter.") != section_hash("Mara finds the map.")
+
+
+def test_first_expansion_generates_everything():
+    cache = ChapterCache()
+    plan, patch = expand(cache, OUTLINE)
+    assert plan.regenerate == [0, 1, 2]
+    assert patch == [{"op": "insert", "old_start": 0, "old_end": 0, "new_start": 0, "new_end": 3,
+                      "sections": [f"PROSE({s})" for s in split_sections(OUTLINE)]}]
+
+
+def test_editing_one_beat_regenerates_only_that_beat():
+    cache = ChapterCache()
+    expand(cache, OUTLINE)
+    edited = OUTLINE.replace("letter", "map")
+    plan, patch = expand(cache, edited)
+    assert plan.regenerate == [1]
+    assert plan.reused == {0: "PROSE(The storm hits the harbour.)", 2: "PROSE(The ferry leaves without her.)"}
+    assert plan.context(1) == ("PROSE(The storm hits the harbour.)", "PROSE(The ferry leaves without her.)")
+    assert patch == [{"op": "replace", "old_start": 1, "old_end": 2, "new_start": 1, "new_end": 2,
+                      "sections": ["PROSE(Mara finds the map.)"]}]
+    assert "PROSE(Mara finds the map.)" in cache.text("t", "ch1")
+    assert "letter" not in cache.text("t", "ch1")
+
+
+def test_inserting_and_deleting_beats_shift_nothing_else():
+    cache = ChapterCache()
+    expand(cache, OUTLINE)
+    plan, patch = expand(cache, "Prologue at sea.\n\n" + OUTLINE)
+    assert plan.regenerate == [0]
+    assert [p["op"] for p in patch] == ["insert"]
+
+    plan, patch = expand(cache, "Prologue at sea.\n\nThe ferry leaves without her.")
+    assert plan.regenerate == []
+    assert patch == [{"op": "delete", "old_start": 1, "old_end": 3, "new_start": 1, "new_end": 1, "sections": []}]
+
+
+def test_chapters_are_isolated_per_tenant_and_id():
+    cache = ChapterCache()
+    expand(cache, OUTLINE, tenant="a")
+    assert cache.plan("b", "ch1", OUTLINE).regenerate == [0, 1, 2]
+    assert cache.plan("a", "ch2", OUTLINE).regenerate == [0, 1, 2]
+    assert cache.plan("a", "ch1", OUTLINE).regenerate == []
+
+
+def test_least_recently_committed_chapter_is_evicted():
+    cache = ChapterCache(max_chapters=2)
+    expand(cache, OUTLINE, chapter_id="one")
+    expand(cache, OUTLINE, chapter_id="two")
+    expand(cache, OUTLINE, chapter_id="one")
+    expand(cache, OUTLINE, chapter_id="three")
+    assert cache.text("t", "two") == ""
+    assert cache.plan("t", "two", OUTLINE).regenerate == [0, 1, 2]
+    assert cache.plan("t", "one", OUTLINE).regenerate == []
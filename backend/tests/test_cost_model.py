@@ -0,0 +1,119 @@
+import pytest
+
+from cost_model import (DECODE_S, EXPECTED_TOKENS, MAX_REQUEST_GPU_S, MIN_OUTPUT_SAMPLES, OUTPUT_MARGIN,
+                        PREFILL_S, AdmissionController, CostModel, CostRejected)
+from tokenization import TokenService
+
+
+@pytest.fixture
+def cost():
+    # Fallback counting: 4 characters per token
+    return CostModel(tokens=TokenService(model_name=None))
+
+
+def job(gpu_seconds, new_tokens=100):
+    return {"kind": "text", "prompt_tokens": 16, "new_tokens": new_tokens, "gpu_seconds": gpu_seconds}
+
+
+def test_text_estimate_charges_time_for_expected_tokens_and_memory_for_the_cap(cost):
+    estimate = cost.text("x" * 400, 4000, expected_tokens=500)
+    assert estimate["prompt_tokens"] == 116
+    assert estimate["expected_tokens"] == 500
+    assert estimate["gpu_seconds"] == round(116 * PREFILL_S + 500 * DECODE_S, 2)
+    assert estimate["memory_mb"] > cost.text("x" * 400, 500)["memory_mb"]
+
+
+def test_text_limit_is_bound_by_slot_time_then_context(cost):
+    short = cost.text("hello", 100)
+    assert cost.text_limit(short) == int((MAX_REQUEST_GPU_S - short["prompt_tokens"] * PREFILL_S) / DECODE_S)
+    # A long prompt leaves less of Llama 3's 8192-token context than the slot could decode
+    long = cost.text("x" * 4 * 6000, 100)
+    assert cost.text_limit(long) == 8192 - long["prompt_tokens"]
+    huge = cost.text("x" * 4 * 9000, 100)
+    assert cost.text_limit(huge) == 0
+
+
+def test_check_rejects_oversized_text_with_what_fits(cost):
+    estimate = cost.text("hello", 100)
+    limit = cost.text_limit(estimate)
+    cost.check(cost.text("hello", limit))
+    with pytest.raises(CostRejected) as exc:
+        cost.check(cost.text("hello", limit + 1))
+    assert exc.value.status == 413
+    assert exc.value.detail()["max_fitting"] == {"new_tokens": limit}
+
+
+def test_check_rejects_oversized_images_with_a_smaller_size(cost):
+    cost.check(cost.image(1024, 1024, 4))
+    with pytest.raises(CostRejected) as exc:
+        cost.check(cost.image(8192, 8192, 4))
+    fits = exc.value.fits
+    assert fits["width"] < 8192 and fits["width"] == fits["height"]
+    cost.check(cost.image(fits["width"], fits["height"], 4))
+
+
+def test_expected_tokens_learns_each_agents_output(cost):
+    assert cost.expected_tokens("seo", 4000) == EXPECTED_TOKENS
+    assert cost.expected_tokens("seo", 200) == 200
+    for _ in range(MIN_OUTPUT_SAMPLES):
+        cost.observe_output("seo", 400)
+    assert cost.expected_tokens("seo", 4000) == int(400 * OUTPUT_MARGIN)
+    assert cost.expected_tokens("other", 4000) == EXPECTED_TOKENS
+
+
+def test_admit_when_idle_then_queue_then_shed(cost):
+    control = AdmissionController(cost, max_backlog_s=100, tenant_gpu_s_per_min=10_000)
+    assert control.decide("a", job(60))["decision"] == "admit"
+    decision = control.decide("b", job(30))
+    assert decision["decision"] == "queue"
+    assert decision["estimated_wait_s"] == 60
+    with pytest.raises(CostRejected) as exc:
+        control.decide("c", job(30))
+    assert exc.value.status == 503
+    assert exc.value.retry_after == pytest.approx(40.0)
+    assert control.stats()["rejected"][503] == 1
+    assert (control.admitted, control.queued) == (1, 1)
+
+
+def test_parallelism_divides_the_backlog(cost):
+    control = AdmissionController(cost, parallelism=4, max_backlog_s=100, tenant_gpu_s_per_min=10_000)
+    for _ in range(6):
+        control.decide("a", job(60))
+    assert control.backlog_s == 90
+
+
+def test_tenant_budget_and_dry_runs(cost):
+    control = AdmissionController(cost, tenant_gpu_s_per_min=60)
+    assert control.decide("a", job(50), charge=False)["decision"] == "admit"
+    assert control.backlog_s == 0
+    control.decide("a", job(50))
+    with pytest.raises(CostRejected) as exc:
+        control.decide("a", job(50), charge=False)
+    assert exc.value.status == 429
+    assert control.stats()["rejected"][429] == 0   # dry runs are not counted
+    # Weighted tenants get a bigger bucket
+    weighted = AdmissionController(cost, tenant_gpu_s_per_min=60, tenant_weight=lambda t: 2.0)
+    weighted.decide("a", job(100))
+
+
+def test_batched_requests_are_charged_their_share(cost):
+    control = AdmissionController(cost, parallelism=4, tenant_gpu_s_per_min=60)
+    assert control.decide("a", job(40), share=8)["charged_gpu_seconds"] == 10
+    assert control.decide("a", job(40), share=2)["charged_gpu_seconds"] == 20
+
+
+def test_admit_releases_the_backlog_afterwards(cost):
+    control = AdmissionController(cost, tenant_gpu_s_per_min=10_000)
+    with control.admit("a", job(10.1)):
+        with control.admit("b", job(20.2)) as decision:
+            assert decision["decision"] == "queue"
+            assert control.backlog_s == pytest.approx(30.3)
+    assert control.backlog_s == 0
+
+
+def test_oversized_requests_are_rejected_before_charging(cost):
+    control = AdmissionController(cost, tenant_gpu_s_per_min=60)
+    with pytest.raises(CostRejected) as exc:
+        control.decide("a", job(1, new_tokens=100_000))
+    assert exc.value.status == 413
+    control.decide("a", job(50))
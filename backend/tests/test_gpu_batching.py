@@ -0,0 +1,94 @@
+import pytest
+
+from gpu_batching import GPUBatcher, SlotOverrun
+
+SECONDS_PER_TOKEN = 0.03
+
+
+def estimate(items):
+    return max(i["max_tokens"] for i in items) * SECONDS_PER_TOKEN * (1 + 0.05 * (len(items) - 1))
+
+
+class FakeGPU:
+    """Stands in for spaces.GPU: records the durations registered and the calls made."""
+
+    def __init__(self):
+        self.registered = []
+        self.calls = []
+
+    def __call__(self, duration):
+        self.registered.append(duration)
+
+        def wrap(fn):
+            def runner(run_batch, items):
+                self.calls.append((duration, len(items)))
+                return fn(run_batch, items)
+            return runner
+        return wrap
+
+
+def make(**kwargs):
+    gpu = FakeGPU()
+    batcher = GPUBatcher(lambda items: [{"success": True, "n": i["max_tokens"]} for i in items], estimate, gpu,
+                         window_s=0.2, **kwargs)
+    return batcher, gpu
+
+
+def test_registers_one_runner_per_bucket():
+    _, gpu = make()
+    assert gpu.registered == [15, 30, 60, 90, 120]
+
+
+def test_duration_picks_smallest_bucket_with_overhead():
+    batcher, _ = make()
+    assert batcher.duration_for(10) == 15
+    assert batcher.duration_for(14) == 30
+    assert batcher.duration_for(118) == 120
+
+
+def test_duration_beyond_largest_bucket_raises():
+    batcher, _ = make()
+    with pytest.raises(SlotOverrun):
+        batcher.duration_for(119)
+
+
+def test_pack_groups_and_spills_at_budget():
+    batcher, _ = make(group_key=lambda item: item["group"], max_batch=3)
+    items = [{"group": "a", "max_tokens": 100}] * 4 + [{"group": "b", "max_tokens": 100}]
+    assert batcher._pack(items) == [[0, 1, 2], [3], [4]]
+
+    # 3800 tokens ~ 114 s alone; two together (~120 s) overrun the 118 s budget and spill
+    big = [{"group": "a", "max_tokens": 3800}] * 2
+    assert batcher._pack(big) == [[0], [1]]
+
+
+def test_plan_assigns_durations():
+    batcher, _ = make()
+    plan = batcher.plan([{"max_tokens": 200}, {"max_tokens": 300}])
+    assert [(d, len(b)) for d, b in plan] == [(15, 2)]
+
+
+def test_concurrent_submits_share_one_invocation():
+    batcher, gpu = make()
+    results = batcher.run_many([{"max_tokens": 100}] * 4)
+    assert [r["success"] for r in results] == [True] * 4
+    assert gpu.calls == [(15, 4)]
+    assert batcher.stats()["reserved_gpu_s"] == 15
+
+
+def test_oversize_item_rejected_without_a_gpu_call():
+    batcher, gpu = make()
+    # 8192 tokens ~ 245 s, more than any slot
+    result = batcher.run({"max_tokens": 8192})
+    assert result["success"] is False
+    assert "largest slot" in result["error"]
+    assert gpu.calls == []
+
+
+def test_oversize_item_does_not_fail_its_neighbours():
+    batcher, gpu = make()
+    futures = [batcher.submit({"max_tokens": 8192}), batcher.submit({"max_tokens": 100})]
+    big, small = [f.result(timeout=5) for f in futures]
+    assert big["success"] is False
+    assert small["success"] is True
+    assert gpu.calls == [(15, 1)]
@@ -0,0 +1,82 @@
+from puzzles import (SudokuSolver, _placements, batches, generate_batch, generate_sudoku,
+                     generate_word_search)
+
+# A well-known puzzle with a single solution
+PUZZLE = [int(d) for d in (
+    "530070000600195000098000060800060003400803001700020006060000280000419005000080079"
+)]
+
+
+def test_solver_counts_unique_and_ambiguous_grids():
+    solver = SudokuSolver(PUZZLE, limit=2).solve()
+    assert solver.count == 1
+    assert solver.solution[:9] == [5, 3, 4, 6, 7, 8, 9, 1, 2]
+
+    # Removing clues until several solutions exist stops the count at the limit
+    assert SudokuSolver([0] * 81, limit=2).solve().count == 2
+
+
+def test_solver_rejects_conflicting_givens():
+    grid = list(PUZZLE)
+    grid[2] = 5  # second 5 in the first row
+    solver = SudokuSolver(grid).solve()
+    assert not solver.valid
+    assert solver.count == 0
+
+
+def test_generated_sudoku_has_exactly_one_solution():
+    for difficulty in ("EASY", "HARD"):
+        result = generate_sudoku(7, difficulty)
+        puzzle = [d for row in result["puzzle"] for d in row]
+        solution = [d for row in result["solution"] for d in row]
+        solver = SudokuSolver(puzzle, limit=2).solve()
+        assert solver.count == 1
+        assert solver.solution == solution
+        assert all(p in (0, s) for p, s in zip(puzzle, solution))
+        assert result["clues"] == sum(1 for d in puzzle if d)
+
+
+def test_generation_is_reproducible_from_the_seed():
+    assert generate_sudoku(11)["puzzle"] == generate_sudoku(11)["puzzle"]
+    assert generate_word_search(11, ["CAT", "DOG"])["grid"] == generate_word_search(11, ["CAT", "DOG"])["grid"]
+
+
+def test_word_search_places_words_where_the_grid_says():
+    words = ["Python", "search", "grid", "puzzle", "letter", "hidden"]
+    result = generate_word_search(3, words, size=10, difficulty="HARD")
+    grid = result["grid"]
+    assert len(grid) == 10 and all(len(row) == 10 for row in grid)
+    assert sorted(result["placedWords"]) == sorted(w.upper() for w in words)
+    for p in result["placements"]:
+        spelled = "".join(grid[p["row"] + p["dr"] * k][p["col"] + p["dc"] * k] for k in range(len(p["word"])))
+        assert spelled == p["word"]
+
+
+def test_word_search_skips_words_that_cannot_fit():
+    result = generate_word_search(1, ["elephant", "ox", "a", "o-x"], size=5, difficulty="EASY")
+    assert result["placedWords"] == ["OX"]
+    assert result["skippedWords"] == []  # too long and too short words are dropped before placement
+
+
+def test_placements_only_cross_on_matching_letters():
+    grid = [[""] * 3 for _ in range(3)]
+    grid[1] = ["C", "A", "T"]
+    options = _placements(grid, "BAT", ((1, 0),))
+    assert (0, 1, 1, 0, 1) in options           # down through the A
+    assert all(c != 0 for _, c, *_ in options)  # column 0 would cross the C
+
+
+def test_word_search_fills_when_no_slot_is_left():
+    result = generate_word_search(2, ["ABCDE", "FGHIJ", "KLMNO", "PQRST", "UVWXY", "ZZZZZ"], size=5,
+                                  difficulty="EASY")
+    assert len(result["placedWords"]) == 5
+    assert len(result["skippedWords"]) == 1
+
+
+def test_batches_and_generate_batch_indices():
+    assert batches(10, 4) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    spec = {"seed": 5, "type": "word-search", "words": ["ONE", "TWO", "THREE"], "size": 8,
+            "difficulty": "EASY", "include_solution": False}
+    out = generate_batch(spec, [2, 3])
+    assert [p["index"] for p in out] == [2, 3]
+    assert "solutionSvg" not in out[0]
@@ -0,0 +1,66 @@
+import pytest
+
+from royalty_grid import estimate
+
+
+def compliance_service(pages, price, interior):
+    """complianceService.ts estimateProfit, transcribed."""
+    printing = 0.85 + pages * 0.012 if interior == "B&W" else 1.25 + pages * 0.07
+    rate = 0.70 if 2.99 <= price <= 9.99 else 0.35
+    net = price * rate - printing
+    return round(printing, 2), net, net > 0
+
+
+@pytest.mark.parametrize("pages,price,interior", [
+    (200, 9.99, "B&W"),
+    (24, 2.99, "B&W"),
+    (300, 14.99, "B&W"),
+    (120, 7.99, "Color"),
+    (200, 12.99, "Color"),
+    (828, 2.98, "B&W"),
+])
+def test_single_cell_matches_compliance_service(pages, price, interior):
+    paper = "white" if interior == "B&W" else "premium-color"
+    result = estimate({"pages": pages, "price": price, "paper_type": paper})
+    printing, net, viable = compliance_service(pages, price, interior)
+    config = result["configurations"][0]
+    assert config["printingCost"] == printing
+    assert result["royalty"] == round(net, 2)
+    assert (config["breakEvenPrice"] is not None) == viable
+
+
+def test_break_even_needs_a_strictly_positive_net():
+    # 110 B&W pages cost 2.17, exactly 70% of 3.10
+    result = estimate({"pages": 110, "prices": [3.09, 3.10, 3.11]})
+    assert result["netRoyalty"][0][0][0][1] == 0.0
+    assert result["configurations"][0]["breakEvenPrice"] == 3.11
+
+
+def test_optimal_price_is_interior_and_projections_use_it():
+    config = estimate({"pages": 200, "prices": {"min": 2.99, "max": 19.99, "step": 0.5},
+                       "include_grid": False})["configurations"][0]
+    assert config["breakEvenPrice"] == 4.99
+    assert 4.99 < config["optimalPrice"] < 19.99
+    assert config["projections"]["bsr_10k"] == round(30 * config["optimalNetRoyalty"])
+
+
+def test_grid_shape_follows_the_axes():
+    result = estimate({"pages": [100, 200], "prices": [4.99, 9.99, 14.99], "marketplaces": ["us", "uk"],
+                       "paper_types": ["white", "cream"]})
+    assert result["cells"] == 24
+    assert len(result["configurations"]) == 8
+    assert len(result["netRoyalty"][0][0][0]) == 3
+    assert result["axes"]["marketplaces"] == ["US", "UK"]
+
+
+@pytest.mark.parametrize("req,message", [
+    ({"pages": 0}, "pages must be positive"),
+    ({"pages": [100, -5]}, "pages must be positive"),
+    ({"price": 0}, "prices must be positive"),
+    ({"marketplaces": ["XX"]}, "Unknown marketplaces"),
+    ({"paper_type": "glossy"}, "Unknown paper types"),
+    ({"prices": {"min": 1, "max": 1000, "step": 0.001}, "pages": [100, 200, 300]}, "limit is"),
+])
+def test_invalid_requests_raise(req, message):
+    with pytest.raises(ValueError, match=message):
+        estimate(req)
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from scheduler import (PRIORITY_BULK, PRIORITY_INTERACTIVE, FairScheduler, Job, RateLimitExceeded,
+                       TokenBucket)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def make(**kwargs):
+    return FairScheduler(lambda jobs: [job.prompt for job in jobs], tokens_per_minute=60000, **kwargs)
+
+
+def enqueue(scheduler, loop, tenant, name, cost=100, priority=PRIORITY_INTERACTIVE):
+    scheduler._enqueue(Job(tenant, priority, name, 0, cost, loop.create_future()))
+
+
+def drain(scheduler):
+    order = []
+    while True:
+        priority = scheduler._next_class()
+        if priority is None:
+            return order
+        order += [job.prompt for job in scheduler._take_batch(priority)]
+
+
+def test_backlogged_tenant_does_not_starve_a_newcomer(loop):
+    scheduler = make(tenant_weights={})
+    for i in range(3):
+        enqueue(scheduler, loop, "heavy", f"h{i}")
+    enqueue(scheduler, loop, "light", "l0")
+    assert drain(scheduler) == ["h0", "l0", "h1", "h2"]
+
+
+def test_weights_split_service_in_proportion(loop):
+    scheduler = make(tenant_weights={"gold": 2.0})
+    for i in range(4):
+        enqueue(scheduler, loop, "gold", f"g{i}")
+        enqueue(scheduler, loop, "free", f"f{i}")
+    assert drain(scheduler)[:6] == ["g0", "f0", "g1", "g2", "f1", "g3"]
+
+
+def test_cost_orders_jobs_across_tenants(loop):
+    scheduler = make(tenant_weights={})
+    enqueue(scheduler, loop, "a", "long", cost=1000)
+    enqueue(scheduler, loop, "b", "short", cost=10)
+    assert drain(scheduler) == ["short", "long"]
+
+
+def test_bulk_gets_its_share_while_interactive_is_backlogged(loop):
+    scheduler = make(tenant_weights={}, bulk_share=0.2)
+    for i in range(6):
+        enqueue(scheduler, loop, f"t{i}", f"i{i}")
+    enqueue(scheduler, loop, "book", "b0", priority=PRIORITY_BULK)
+    assert drain(scheduler) == ["i0", "i1", "i2", "i3", "b0", "i4", "i5"]
+
+
+def test_cancelled_jobs_are_skipped(loop):
+    scheduler = make(tenant_weights={})
+    enqueue(scheduler, loop, "a", "gone")
+    enqueue(scheduler, loop, "b", "kept")
+    scheduler._queues[PRIORITY_INTERACTIVE].heap[0].future.cancel()
+    assert drain(scheduler) == ["kept"]
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=10, capacity=100)
+    assert bucket.try_consume(100) == 0
+    assert bucket.try_consume(50) == pytest.approx(5.0, abs=0.01)
+    bucket.updated -= 5.0
+    assert bucket.try_consume(50) == 0
+    assert not bucket.full()
+
+
+def test_token_bucket_clamps_requests_larger_than_capacity():
+    bucket = TokenBucket(rate=10, capacity=100)
+    assert bucket.try_consume(500) == 0
+    assert bucket.tokens == pytest.approx(0, abs=0.01)
+
+
+def test_submit_over_budget_raises_with_retry_after():
+    scheduler = FairScheduler(lambda jobs: ["ok"] * len(jobs), tenant_weights={},
+                              tokens_per_minute=60, burst_tokens=100)
+
+    async def scenario():
+        assert await scheduler.submit("", tenant="a", max_tokens=60) == "ok"
+        with pytest.raises(RateLimitExceeded) as exc:
+            await scheduler.submit("", tenant="a", max_tokens=60)
+        # Another tenant has its own bucket
+        assert await scheduler.submit("", tenant="b", max_tokens=60) == "ok"
+        return exc.value
+
+    error = asyncio.run(scenario())
+    assert error.tenant == "a"
+    # Each request costs 61 (1 prompt token minimum + 60); 22 tokens short at 1 token/s
+    assert error.retry_after == pytest.approx(22.0, abs=0.1)
+    assert scheduler.rejected == 1
@@ -0,0 +1,92 @@
+import math
+
+import pytest
+
+from tokenization import BUDGET_OVERHEAD, MIN_SAMPLES, TOKENS_PER_WORD, TokenService
+
+
+class FakeTokenizer:
+    """`per_word` tokens per word; records how many texts each call encoded."""
+
+    def __init__(self, per_word=2):
+        self.per_word = per_word
+        self.calls = []
+
+    def __call__(self, texts, add_special_tokens, return_attention_mask):
+        self.calls.append(len(texts))
+        return {"input_ids": [text.split() * self.per_word for text in texts]}
+
+
+def prose(words):
+    return " ".join(["word"] * words)
+
+
+def test_default_budget_uses_the_starting_ratio_and_margin():
+    tokens = TokenService(model_name=None, margin=0.1)
+    assert tokens.budget(1000) == math.ceil(1000 * TOKENS_PER_WORD * 1.1) + BUDGET_OVERHEAD
+    assert tokens.budget(0) == tokens.budget(1)
+
+
+@pytest.mark.parametrize("words", [50, 999, 2000, 12345])
+def test_words_for_inverts_budget(words):
+    tokens = TokenService(model_name=None)
+    budget = tokens.budget(words)
+    assert tokens.words_for(budget) == words
+    assert tokens.budget(tokens.words_for(budget - 5)) <= budget - 5
+
+
+def test_words_for_never_goes_negative():
+    assert TokenService(model_name=None).words_for(BUDGET_OVERHEAD - 10) == 0
+
+
+def test_genre_ratio_is_learned_after_enough_samples():
+    tokens = TokenService(tokenizer=FakeTokenizer(), margin=0.0)
+    for n in range(MIN_SAMPLES - 1):
+        tokens.observe([prose(100 + n)], ["Romance"], [10_000])
+    assert tokens.ratio("romance") == TOKENS_PER_WORD
+    tokens.observe([prose(200)], ["Romance"], [10_000])
+    assert tokens.ratio(" ROMANCE ") == pytest.approx(2.0)
+    assert tokens.budget(500, "romance") == 1000 + BUDGET_OVERHEAD
+    assert tokens.words_for(1000 + BUDGET_OVERHEAD, "romance") == 500
+    # Unseen genres borrow the all-genre ratio
+    assert tokens.ratio("thriller") == pytest.approx(2.0)
+
+
+def test_short_and_implausible_outputs_are_ignored():
+    tokens = TokenService(tokenizer=FakeTokenizer())
+    tokens.observe([prose(10)] * MIN_SAMPLES, ["poetry"] * MIN_SAMPLES, [10_000] * MIN_SAMPLES)
+    assert tokens.stats()["ratios"] == {}
+
+    tokens = TokenService(tokenizer=FakeTokenizer(per_word=10))
+    tokens.observe([prose(100)], ["code"], [10_000])
+    assert tokens.stats()["ratios"] == {}
+
+
+def test_outputs_at_their_cap_count_as_truncated():
+    tokens = TokenService(tokenizer=FakeTokenizer())
+    tokens.observe([prose(100), prose(100)], ["horror", "horror"], [200, 10_000])
+    assert tokens.stats()["ratios"]["horror"]["truncated"] == 1
+    assert tokens.stats()["ratios"]["horror"]["samples"] == 2
+
+
+def test_counts_are_cached_and_misses_batched():
+    tokenizer = FakeTokenizer()
+    tokens = TokenService(tokenizer=tokenizer)
+    assert tokens.count_many(["one two", "three", "one two"]) == [4, 2, 4]
+    assert tokenizer.calls == [2]
+    assert tokens.count("three") == 2
+    assert tokenizer.calls == [2]
+    assert tokens.stats()["hit_rate"] == pytest.approx(0.5)
+
+
+def test_cache_is_bounded():
+    tokens = TokenService(tokenizer=FakeTokenizer(), cache_size=2)
+    tokens.count_many(["a", "b", "c"])
+    assert tokens.stats()["cached"] == 2
+
+
+def test_fallback_counts_characters():
+    tokens = TokenService(model_name=None)
+    assert tokens.count("x" * 40) == 10
+    assert tokens.count("") == 1
+    assert tokens.stats()["tokenizer"] == "fallback"
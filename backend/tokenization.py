@@ -0,0 +1,171 @@
+"""
+Artisan AI - Tokenization Service
+Token counting for cost estimates and output budgets, shared by every caller of
+the text model's tokenizer.
+
+- Counts come from the fast (Rust) tokenizer; lists of texts are encoded in one
+  call, which the fast tokenizer parallelises outside the GIL.
+- Counts are cached by content hash, so prompts that repeat (batch items, cached
+  agents, re-estimates of the same chapter) are tokenized once.
+- Words-to-tokens ratios are learned per genre from generated prose, so asking
+  for N words budgets max_new_tokens close to what N words actually cost rather
+  than a fixed multiplier: fewer wasted decode steps, fewer truncated chapters.
+
+Without the tokenizer (no download access, the mock) counts fall back to
+~4 chars/token and budgets use the default ratio.
+"""
+
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+TOKENS_PER_WORD = 1.35         # starting ratio until a genre has enough samples
+CHARS_PER_TOKEN = 4            # fallback when the tokenizer is unavailable
+CACHE_SIZE = int(os.getenv("ARTISAN_TOKEN_CACHE", "8192"))
+BUDGET_MARGIN = float(os.getenv("ARTISAN_WORD_BUDGET_MARGIN", "0.1"))
+BUDGET_OVERHEAD = 32           # closing lines, headings and end-of-turn tokens
+RATIO_ALPHA = 0.1              # EWMA weight of each new sample
+MIN_SAMPLES = 5                # samples before a genre's own ratio is used
+MIN_WORDS = 50                 # shorter outputs say little about the ratio
+RATIO_BOUNDS = (0.8, 4.0)      # anything outside is a refusal, code or garbage
+
+
+def _key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def word_count(text: str) -> int:
+    return len(text.split())
+
+
+class _Ratio:
+    __slots__ = ("value", "samples", "truncated")
+
+    def __init__(self, value: float):
+        self.value = value
+        self.samples = 0
+        self.truncated = 0
+
+
+class TokenService:
+    def __init__(self, model_name: Optional[str] = "meta-llama/Llama-3-8B-Instruct", tokenizer: Any = None,
+                 cache_size: int = CACHE_SIZE, margin: float = BUDGET_MARGIN):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.margin = margin
+        self._tokenizer = tokenizer
+        self._tokenizer_failed = model_name is None and tokenizer is None
+        self._load_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._ratios: Dict[str, _Ratio] = {}
+        self.hits = 0
+        self.misses = 0
+
+    # --- COUNTING ---
+    def tokenizer(self):
+        # Only the tokenizer files are needed, not the model weights
+        with self._load_lock:
+            if self._tokenizer is None and not self._tokenizer_failed:
+                try:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
+                    if not getattr(self._tokenizer, "is_fast", True):
+                        print(f"⚠️ No fast tokenizer for {self.model_name}, token counting will be slow")
+                except Exception as e:
+                    print(f"⚠️ Tokenizer unavailable ({e}), counting ~{CHARS_PER_TOKEN} chars/token")
+                    self._tokenizer_failed = True
+        return self._tokenizer
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """Token counts (no special tokens) for each text; cache misses are encoded in one batch."""
+        keys = [_key(t) for t in texts]
+        counts: List[Optional[int]] = [None] * len(texts)
+        missing: Dict[bytes, List[int]] = {}
+        with self._lock:
+            for i, k in enumerate(keys):
+                cached = self._cache.get(k)
+                if cached is None:
+                    missing.setdefault(k, []).append(i)
+                else:
+                    self._cache.move_to_end(k)
+                    counts[i] = cached
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            rows = [rows[0] for rows in missing.values()]
+            fresh = self._encode([texts[i] for i in rows])
+            with self._lock:
+                for (k, indexes), n in zip(missing.items(), fresh):
+                    for i in indexes:
+                        counts[i] = n
+                    self._cache[k] = n
+                    self._cache.move_to_end(k)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return counts
+
+    def _encode(self, texts: List[str]) -> List[int]:
+        tokenizer = self.tokenizer()
+        if tokenizer is None:
+            return [max(1, len(t) // CHARS_PER_TOKEN) for t in texts]
+        encoded = tokenizer(texts, add_special_tokens=False, return_attention_mask=False)["input_ids"]
+        return [len(ids) for ids in encoded]
+
+    # --- WORD BUDGETS ---
+    def ratio(self, genre: Optional[str] = None) -> float:
+        """Tokens per word for prose in this genre, falling back to all genres, then the default."""
+        with self._lock:
+            for key in (genre or "").strip().lower(), "*":
+                r = self._ratios.get(key)
+                if r is not None and r.samples >= MIN_SAMPLES:
+                    return r.value
+        return TOKENS_PER_WORD
+
+    def budget(self, words: int, genre: Optional[str] = None) -> int:
+        """max_new_tokens for `words` words of prose: the learned ratio plus a small margin."""
+        return int(math.ceil(max(1, words) * self.ratio(genre) * (1 + self.margin))) + BUDGET_OVERHEAD
+
+    def words_for(self, tokens: int, genre: Optional[str] = None) -> int:
+        """Inverse of budget: the most words that fit in `tokens`."""
+        return max(0, int((tokens - BUDGET_OVERHEAD) / (self.ratio(genre) * (1 + self.margin))))
+
+    def observe(self, outputs: Sequence[str], genres: Sequence[Optional[str]], max_tokens: Sequence[int]):
+        """Learn from generated prose. Outputs that hit their token cap are counted as truncated."""
+        counts = self.count_many(outputs)
+        with self._lock:
+            for text, genre, tokens, cap in zip(outputs, genres, counts, max_tokens):
+                words = word_count(text)
+                if words < MIN_WORDS:
+                    continue
+                value = tokens / words
+                if not RATIO_BOUNDS[0] <= value <= RATIO_BOUNDS[1]:
+                    continue
+                for key in {(genre or "").strip().lower() or "*", "*"}:
+                    r = self._ratios.get(key)
+                    if r is None:
+                        r = self._ratios[key] = _Ratio(value)
+                    else:
+                        r.value += RATIO_ALPHA * (value - r.value)
+                    r.samples += 1
+                    if tokens >= cap:
+                        r.truncated += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "tokenizer": "fallback" if self._tokenizer_failed else ("loaded" if self._tokenizer else "lazy"),
+                "cached": len(self._cache),
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "margin": self.margin,
+                "ratios": {k: {"tokens_per_word": round(r.value, 3), "samples": r.samples, "truncated": r.truncated,
+                               "active": r.samples >= MIN_SAMPLES}
+                           for k, r in sorted(self._ratios.items())},
+            }
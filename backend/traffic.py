@@ -0,0 +1,369 @@
+"""
+Artisan AI - Traffic Record & Replay
+Records the shape of production traffic and re-issues it against any backend,
+so a performance change can be checked against real load patterns.
+
+Recording (app.py middleware, off unless ARTISAN_TRAFFIC_LOG is set): one compact
+JSON line per request with arrival time, method, path, a salted tenant hash, the
+payload shape, prompt length, status, latency to the last byte and output
+tokens. Free text never leaves the process: strings are kept as their length,
+except short categorical fields (genre, format, type, ...) that change what the
+backend does. A `.gz` path is written gzip-compressed. ARTISAN_TRAFFIC_SAMPLE
+records a fraction of requests.
+
+Replay re-issues a recording with synthetic text of the recorded lengths:
+
+    python traffic.py replay traffic.jsonl.gz --target http://localhost:7860 --speed 1 --out base.jsonl
+    python traffic.py replay traffic.jsonl.gz --target http://mock:7860 --speed 20 --max-gap 5 --out mock.jsonl
+    python traffic.py replay traffic.jsonl.gz --target https://space.hf.space --gradio --out gradio.jsonl
+    python traffic.py compare base.jsonl candidate.jsonl
+    python traffic.py convert traffic.jsonl.gz traffic.parquet
+
+--speed divides every inter-arrival gap; --max-gap caps idle gaps (time compression)
+without touching bursts. --gradio maps LLM agents to /api/text and coloring to
+/api/image/batch. The mock (app_mock.py) serves every recorded route.
+
+The live recording is always JSONL: it is appended line by line and readable
+while still open, which a Parquet file is not until its footer is written.
+`convert` compacts a finished recording to Parquet, and replay results can be
+written as Parquet with `--out *.parquet`. Every command reads either format.
+Parquet needs pyarrow.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from tenancy import tenant_of
+
+# Strings under these keys are categorical and kept verbatim; all other text is reduced to its length
+KEEP_KEYS = {"format", "type", "difficulty", "action", "genre", "audience", "trim_size", "reading_direction",
+             "platforms", "agent", "line_art", "incremental", "narrate"}
+MAX_KEPT_CHARS = 64
+SKIP_PREFIXES = ("/api/admin/", "/api/export/files/", "/docs", "/openapi.json")
+STREAMING_PATHS = {"/api/puzzle-generate", "/api/batch"}
+LLM_PATHS = {"/api/niche-analysis", "/api/amazon-seo", "/api/brand-intel", "/api/trend-analysis",
+             "/api/kdp-generate", "/api/expand-chapter", "/api/aplus-generate", "/api/humanize"}
+
+# Output token counts of the current request, appended to by run_agent
+request_outputs: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("request_outputs", default=None)
+
+
+def count_output(text: Any):
+    outputs = request_outputs.get()
+    if outputs is not None and isinstance(text, str):
+        outputs.append(max(1, len(text) // 4))
+
+
+def shape(value: Any, key: Optional[str] = None) -> Any:
+    """Payload with free text replaced by {"$str": length}; numbers, booleans and structure kept."""
+    if isinstance(value, str):
+        if key in KEEP_KEYS and len(value) <= MAX_KEPT_CHARS:
+            return value
+        return {"$str": len(value)}
+    if isinstance(value, dict):
+        return {k: shape(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [shape(v, key) for v in value]
+    return value
+
+
+def text_chars(value: Any) -> int:
+    if isinstance(value, dict):
+        if set(value) == {"$str"}:
+            return value["$str"]
+        return sum(text_chars(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(text_chars(v) for v in value)
+    return len(value) if isinstance(value, str) else 0
+
+
+class TrafficRecorder:
+    def __init__(self, path: Optional[str] = None, sample: Optional[float] = None, salt: Optional[str] = None):
+        self.path = path if path is not None else os.getenv("ARTISAN_TRAFFIC_LOG")
+        self.sample = sample if sample is not None else float(os.getenv("ARTISAN_TRAFFIC_SAMPLE", "1"))
+        # Without a configured salt, tenant hashes are only linkable within one process lifetime
+        self.salt = (salt or os.getenv("ARTISAN_TRAFFIC_SALT") or os.urandom(16).hex()).encode()
+        self.started = time.time()
+        self.recorded = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def wants(self, path: str) -> bool:
+        return (self.enabled and not path.startswith(SKIP_PREFIXES)
+                and (self.sample >= 1 or random.random() < self.sample))
+
+    def tenant(self, tenant: Optional[str]) -> Optional[str]:
+        return hmac.new(self.salt, tenant.encode(), hashlib.sha256).hexdigest()[:12] if tenant else None
+
+    async def begin(self, request) -> Optional[Dict[str, Any]]:
+        """Start recording a Starlette request, or None when it is not being recorded."""
+        path = request.url.path
+        if not self.wants(path):
+            return None
+        entry: Dict[str, Any] = {"t": round(time.time() - self.started, 4), "method": request.method, "path": path,
+                                 "tenant": self.tenant(tenant_of(request.headers))}
+        content_type = request.headers.get("content-type", "")
+        if "json" in content_type and "ndjson" not in content_type:
+            try:
+                payload = shape(json.loads(await request.body() or b"null"))
+            except ValueError:
+                payload = None
+            entry["payload"] = payload
+            entry["prompt_chars"] = text_chars(payload)
+        elif request.headers.get("content-length") or "ndjson" in content_type:
+            # Streamed uploads are not buffered; only their size is kept and they are not replayed
+            entry["body_bytes"] = int(request.headers.get("content-length") or 0)
+        entry["_arrived"] = time.monotonic()
+        entry["_outputs"] = []
+        request_outputs.set(entry["_outputs"])
+        return entry
+
+    def finish(self, entry: Dict[str, Any], response):
+        """Write the entry once the last byte of the response has been sent."""
+        body = response.body_iterator
+
+        async def timed():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                outputs = entry.pop("_outputs")
+                entry["latency_s"] = round(time.monotonic() - entry.pop("_arrived"), 4)
+                entry["status"] = response.status_code
+                entry["output_tokens"] = sum(outputs)
+                entry["generations"] = len(outputs)
+                self.write(entry)
+
+        response.body_iterator = timed()
+
+    def write(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, "at") if self.path.endswith(".gz") else open(self.path, "a")
+            self._file.write(line)
+            self._file.flush()
+            self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "path": self.path, "sample": self.sample, "recorded": self.recorded}
+
+
+# --- REPLAY ---
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        rows = pq.read_table(path).to_pylist()
+        for row in rows:
+            if isinstance(row.get("payload"), str):
+                row["payload"] = json.loads(row["payload"])
+        return rows
+    opener = gzip.open if path.endswith(".gz") else open
+    rows = []
+    with opener(path, "rt") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+        except EOFError:
+            pass   # recording still open (or the process died): keep every complete line
+    return rows
+
+
+def write_trace(path: str, rows: List[Dict[str, Any]]):
+    """Write rows as Parquet (payloads as JSON strings), gzipped JSONL or JSONL, by extension."""
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        columns = sorted({k for row in rows for k in row})
+        table = pa.Table.from_pylist([
+            {k: json.dumps(row[k], separators=(",", ":")) if k == "payload" and k in row else row.get(k)
+             for k in columns} for row in rows
+        ])
+        pq.write_table(table, path, compression="zstd")
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt") as f:
+        for row in rows:
+            f.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+
+WORDS = ("harbor lantern mystery garden river stone shadow promise winter letter journey cottage "
+         "whisper orchard meadow secret compass ember willow tide").split()
+
+
+def synthesize(value: Any, rng: random.Random) -> Any:
+    """Inverse of shape(): random words of the recorded length, so caches do not see repeats."""
+    if isinstance(value, dict):
+        if set(value) == {"$str"}:
+            text = ""
+            while len(text) < value["$str"]:
+                text += rng.choice(WORDS) + " "
+            return text[:value["$str"]]
+        return {k: synthesize(v, rng) for k, v in value.items()}
+    if isinstance(value, list):
+        return [synthesize(v, rng) for v in value]
+    return value
+
+
+def to_gradio(entry: Dict[str, Any], payload: Any) -> Optional[Dict[str, Any]]:
+    """Map an agent call onto the Gradio REST API with the same prompt and output size."""
+    if entry["path"] in LLM_PATHS:
+        prompt = synthesize({"$str": max(1, entry.get("prompt_chars") or 200)}, random.Random(entry["t"]))
+        max_tokens = max(1, min(8192, entry.get("output_tokens") or 512))
+        return {"path": "/api/text", "payload": {"prompt": prompt, "max_tokens": max_tokens}}
+    if entry["path"] == "/api/coloring-generate":
+        pages = int((payload or {}).get("pages") or 1)
+        return {"path": "/api/image/batch", "payload": {"prompts": ["coloring page"] * min(8, pages)}}
+    return None
+
+
+async def replay(entries: List[Dict[str, Any]], target: str, speed: float = 1.0, max_gap: Optional[float] = None,
+                 gradio: bool = False, concurrency: int = 256, seed: int = 0) -> List[Dict[str, Any]]:
+    import httpx
+    from artisan_client import ArtisanClient, ArtisanError
+    entries = sorted(entries, key=lambda e: e["t"])
+    # Schedule: gaps divided by speed, idle gaps capped at max_gap
+    offsets, clock, previous = [], 0.0, entries[0]["t"] if entries else 0.0
+    for e in entries:
+        gap = (e["t"] - previous) / speed
+        clock += min(gap, max_gap) if max_gap is not None else gap
+        previous = e["t"]
+        offsets.append(clock)
+
+    results: List[Dict[str, Any]] = []
+    client = ArtisanClient(target, retries=0, max_connections=concurrency, max_concurrency=concurrency)
+
+    async def issue(index: int, entry: Dict[str, Any], at: float, started: float):
+        await asyncio.sleep(max(0.0, started + at - time.monotonic()))
+        payload = synthesize(entry.get("payload"), random.Random(seed * 1_000_003 + index))
+        path = entry["path"]
+        if gradio:
+            mapped = to_gradio(entry, payload)
+            if mapped is None:
+                return
+            path, payload = mapped["path"], mapped["payload"]
+        sent = time.monotonic()
+        status = 200
+        try:
+            if entry["method"] == "GET":
+                await client.request("GET", path, gradio=gradio)
+            elif path in STREAMING_PATHS:
+                async for _ in client.stream(path, payload):
+                    pass
+            else:
+                await client.request("POST", path, payload, gradio=gradio)
+        except ArtisanError as e:
+            status = e.status
+        except httpx.HTTPError:
+            # Read timeouts and dropped connections are failures to record, not reasons to stop
+            status = 0
+        results.append({"t": round(at, 4), "path": path, "recorded_path": entry["path"], "status": status,
+                        "latency_s": round(time.monotonic() - sent, 4),
+                        "lag_s": round(sent - started - at, 4)})
+
+    try:
+        started = time.monotonic()
+        await asyncio.gather(*(issue(i, e, at, started) for i, (e, at) in enumerate(zip(entries, offsets))
+                               if "body_bytes" not in e))
+    finally:
+        await client.aclose()
+    return sorted(results, key=lambda r: r["t"])
+
+
+# --- COMPARISON ---
+def percentiles(latencies: Iterable[float]) -> Dict[str, Optional[float]]:
+    lat = sorted(latencies)
+
+    def pct(p: float) -> Optional[float]:
+        return round(lat[min(len(lat) - 1, int(p * len(lat)))], 3) if lat else None
+
+    return {"n": len(lat), "p50": pct(0.50), "p90": pct(0.90), "p95": pct(0.95), "p99": pct(0.99)}
+
+
+def _failed(row: Dict[str, Any]) -> bool:
+    # Status 0 is a connection failure on replay
+    return not 0 < row.get("status", 200) < 400
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-path latency percentiles and error rate; works on recordings and replay results alike."""
+    by_path: Dict[str, List[Dict[str, Any]]] = {"ALL": rows}
+    for r in rows:
+        by_path.setdefault(r.get("recorded_path") or r["path"], []).append(r)
+    out = {}
+    for path, group in sorted(by_path.items()):
+        ok = [r["latency_s"] for r in group if not _failed(r) and r.get("latency_s") is not None]
+        out[path] = {**percentiles(ok), "errors": sum(1 for r in group if _failed(r))}
+    return out
+
+
+def compare(base: List[Dict[str, Any]], candidate: List[Dict[str, Any]]) -> str:
+    a, b = summarize(base), summarize(candidate)
+    lines = [f"{'path':<26}{'n':>7}{'p50':>16}{'p95':>16}{'p99':>16}{'errors':>10}"]
+
+    def cell(x: Optional[float], y: Optional[float]) -> str:
+        if x is None or y is None:
+            return "-"
+        delta = f"{(y - x) / x * 100:+.0f}%" if x else ""
+        return f"{y:.2f} {delta}"
+
+    for path in sorted(set(a) | set(b)):
+        x, y = a.get(path, {}), b.get(path, {})
+        lines.append(f"{path:<26}{y.get('n', 0):>7}"
+                     + "".join(f"{cell(x.get(p), y.get(p)):>16}" for p in ("p50", "p95", "p99"))
+                     + f"{str(x.get('errors', 0)) + '->' + str(y.get('errors', 0)):>10}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded agent traffic and compare latency distributions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("replay")
+    r.add_argument("trace")
+    r.add_argument("--target", required=True)
+    r.add_argument("--speed", type=float, default=1.0, help="divide inter-arrival gaps by this factor")
+    r.add_argument("--max-gap", type=float, default=None, help="cap idle gaps at this many seconds")
+    r.add_argument("--gradio", action="store_true", help="map agent calls onto the Gradio REST API")
+    r.add_argument("--concurrency", type=int, default=256)
+    r.add_argument("--out", default=None)
+    c = sub.add_parser("compare")
+    c.add_argument("base")
+    c.add_argument("candidate")
+    v = sub.add_parser("convert", help="rewrite a recording or result file, e.g. JSONL to Parquet")
+    v.add_argument("source")
+    v.add_argument("dest")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        print(compare(load_trace(args.base), load_trace(args.candidate)))
+        return
+    if args.command == "convert":
+        rows = load_trace(args.source)
+        write_trace(args.dest, rows)
+        print(f"Wrote {len(rows)} rows to {args.dest}")
+        return
+    entries = load_trace(args.trace)
+    results = asyncio.run(replay(entries, args.target, args.speed, args.max_gap, args.gradio, args.concurrency))
+    if args.out:
+        write_trace(args.out, results)
+    print(f"Replayed {len(results)} of {len(entries)} requests against {args.target}")
+    print(compare(entries, results))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ export interface UsageStats {
     manuscriptsThisMonth: number;
 }
 
+// Monthly subscription-tier quotas (books/images/manuscripts per plan), recorded in Supabase and
+// shown by the tool views. This is billing, not rate limiting: burst and fairness limits are
+// enforced per tenant on the backend (backend/scheduler.py) and apply whether or not this passes.
 export class UsageGuard {
     /**
      * Records a generation event to Supabase.